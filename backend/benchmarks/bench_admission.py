@@ -0,0 +1,93 @@
+"""流量制御（admission control）の過負荷ベンチマーク
+
+プロバイダー側の同時実行上限（超えると429）を持つモックに、上限を大きく超える同時リクエストを投げる。
+流量制御なし（上限を超えた分は429→SDKの再試行→モックで代替）と、流量制御あり
+（上限までに絞り、溢れた分は即座に503）で、成功した応答の所要時間と503までの時間を比べる。
+
+使い方（backend/ で実行）:
+    python -m benchmarks.bench_admission --requests 300 --provider-limit 20 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.bench_generate import percentile
+from benchmarks.fake_anthropic import FakeAnthropicServer
+from src.config import settings
+from src.services import claude_service
+
+
+def describe(samples: list[float]) -> str:
+    if not samples:
+        return "n=0"
+    return (
+        f"n={len(samples):<4} p50={percentile(samples, 50) * 1000:7.1f}ms "
+        f"p99={percentile(samples, 99) * 1000:7.1f}ms"
+    )
+
+
+async def burst(requests: int) -> dict[str, list[float]]:
+    from main import app
+
+    results: dict[str, list[float]] = {}
+
+    async def one(client: httpx.AsyncClient, i: int) -> None:
+        start = time.perf_counter()
+        response = await client.post(
+            "/api/generate", json={"category": "notion", "target": f"副業初心者{i}", "fresh": True}
+        )
+        elapsed = time.perf_counter() - start
+        if response.status_code == 503:
+            kind = "503"
+        else:
+            response.raise_for_status()
+            # モックの商品名はターゲットを含むので、代替した応答と見分けられる
+            kind = "fallback" if f"副業初心者{i}" in response.json()["productNames"][0] else "ok"
+        results.setdefault(kind, []).append(elapsed)
+
+    await claude_service.close_client()
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            await asyncio.gather(*(one(client, i) for i in range(requests)))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--provider-limit", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--queue-size", type=int, default=50)
+    parser.add_argument("--queue-timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    with FakeAnthropicServer(latency=args.latency, max_concurrency=args.provider_limit) as server:
+        settings.anthropic_api_key = "bench"
+        settings.anthropic_base_url = server.url
+        settings.gemini_api_key = ""
+        settings.anthropic_requests_per_minute = 0
+        settings.anthropic_tokens_per_minute = 0
+
+        scenarios = {
+            "unbounded": (args.requests, args.requests, args.queue_timeout),
+            "admission": (args.provider_limit, args.queue_size, args.queue_timeout),
+        }
+        for name, (concurrency, queue_size, queue_timeout) in scenarios.items():
+            settings.llm_max_concurrency = concurrency
+            settings.llm_queue_size = queue_size
+            settings.llm_queue_timeout = queue_timeout
+            server.rate_limited = 0
+            started = time.perf_counter()
+            results = asyncio.run(burst(args.requests))
+            elapsed = time.perf_counter() - started
+            print(f"{name:<10} total={elapsed:5.1f}s upstream429={server.rate_limited}")
+            for kind in ("ok", "fallback", "503"):
+                print(f"  {kind:<9} {describe(results.get(kind, []))}")
+
+
+if __name__ == "__main__":
+    main()
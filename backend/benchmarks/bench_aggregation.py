@@ -0,0 +1,90 @@
+"""売上集計のマイクロベンチマーク: 従来の1件ずつのループと列形式の集計を比較する
+
+使い方（backend/ で実行）:
+    python -m benchmarks.bench_aggregation --sizes 10000 100000 1000000
+"""
+
+import argparse
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from src.services.aggregation import SalesColumns
+
+
+def make_sales(size: int) -> list[dict]:
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "product_name": f"商品{random.randrange(200)}",
+            "price": f"{random.randrange(100, 5000) / 100:.2f}",
+            "created_at": (start + timedelta(seconds=random.randrange(3 * 365 * 86400))).isoformat() + "Z",
+        }
+        for _ in range(size)
+    ]
+
+
+def loop_aggregate(sales: list[dict]) -> tuple[int, int, int]:
+    """fetch_sales にあった従来の集計ループ"""
+    total_revenue = 0
+    product_sales: dict[str, dict] = defaultdict(lambda: {"count": 0, "revenue": 0})
+    daily_sales: dict[str, int] = defaultdict(int)
+    weekly_sales: dict[str, int] = defaultdict(int)
+    monthly_sales: dict[str, int] = defaultdict(int)
+
+    for sale in sales:
+        price = int(float(sale.get("price", 0)) * 100)
+        product_name = sale.get("product_name", "Unknown")
+        created_at = sale.get("created_at", "")
+        sale_date = created_at[:10]
+        day = datetime.strptime(sale_date, "%Y-%m-%d")
+
+        total_revenue += price
+        product_sales[product_name]["count"] += 1
+        product_sales[product_name]["revenue"] += price
+        daily_sales[sale_date] += price
+        weekly_sales[(day - timedelta(days=day.weekday())).strftime("%Y-%m-%d")] += price
+        monthly_sales[sale_date[:7]] += price
+
+    return total_revenue, len(product_sales), len(daily_sales)
+
+
+def columnar_aggregate(columns: SalesColumns) -> tuple[int, int, int]:
+    by_product = columns.by_product()
+    daily = columns.by_period("day")
+    columns.by_period("week")
+    columns.by_period("month")
+    return columns.total_revenue, len(by_product), len(daily)
+
+
+def timed(fn, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'sales':>9}  {'loop':>9}  {'load':>9}  {'columnar':>9}  speedup")
+    for size in args.sizes:
+        sales = make_sales(size)
+        # ストアには価格を銭単位の整数で保存済み
+        rows = [(s["product_name"], int(float(s["price"]) * 100), s["created_at"]) for s in sales]
+
+        loop_time, expected = timed(loop_aggregate, sales)
+        load_time, columns = timed(SalesColumns.from_rows, rows)
+        columnar_time, actual = timed(columnar_aggregate, columns)
+        assert expected == actual, (expected, actual)
+
+        print(
+            f"{size:>9}  {loop_time * 1000:7.1f}ms  {load_time * 1000:7.1f}ms  "
+            f"{columnar_time * 1000:7.1f}ms  {loop_time / (load_time + columnar_time):6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
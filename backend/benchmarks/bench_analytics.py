@@ -0,0 +1,95 @@
+"""/api/sales/analytics の集計: 日・商品ごとの集計表（sales_daily）と、売上を読み直して集計する場合の比較
+
+--years 年分に --sales 件の売上をストアに追加し（集計表の更新を含む追加の時間も計る）、
+1か月・1年・全期間をそれぞれ週単位で集計する時間を比べる。
+
+使い方（backend/ で実行）:
+    python -m benchmarks.bench_analytics --sales 1000000 --years 3 --products 50
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from src.services.aggregation import SalesColumns
+from src.services.sales_analytics import summarize
+from src.services.sales_store import SalesStore
+
+ACCOUNT = "bench"
+
+
+def generate_sales(count: int, years: int, products: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1) - timedelta(days=365 * years)
+    seconds = 365 * years * 86400
+    return [
+        {
+            "id": str(i),
+            "product_name": f"商品{rng.randrange(products)}",
+            "price": f"{rng.randrange(5, 100) * 100}",
+            "created_at": (start + timedelta(seconds=rng.randrange(seconds))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+        for i in range(count)
+    ]
+
+
+def scan(store: SalesStore, start: date, end: date) -> tuple[int, int]:
+    """集計表を使わずに、期間の売上を読んで週ごと・商品ごとに集計する"""
+    rows = store.sales_between(ACCOUNT, start.isoformat(), (end + timedelta(days=1)).isoformat(), 2**62)
+    columns = SalesColumns.from_rows(rows)
+    columns.by_period("week")
+    columns.by_product()
+    return len(columns), columns.total_revenue
+
+
+def timed(function, repeat: int) -> tuple[float, object]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sales", type=int, default=1_000_000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=1000, help="1回の追加の件数（Pull APIの1ページ相当）")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    sales = generate_sales(args.sales, args.years, args.products, seed=0)
+    with tempfile.TemporaryDirectory() as directory:
+        store = SalesStore(os.path.join(directory, "sales.db"))
+        started = time.perf_counter()
+        after = 0
+        for i in range(0, len(sales), args.batch):
+            _, added = store.add_sales(ACCOUNT, sales[i:i + args.batch], after)
+            after = added[-1][0]
+        elapsed = time.perf_counter() - started
+        print(f"add {args.sales} sales (with rollup trigger): {elapsed:.2f}s  {args.sales / elapsed:.0f} sales/s")
+
+        last = date(2025, 12, 31)
+        ranges = [
+            ("1 month", last.replace(day=1)),
+            ("1 year", last - timedelta(days=364)),
+            (f"{args.years} years", last - timedelta(days=365 * args.years - 1)),
+        ]
+        for label, first in ranges:
+            rollup_time, summary = timed(lambda: summarize(store, ACCOUNT, first, last, "week"), args.repeat)
+            scan_time, (count, revenue) = timed(lambda: scan(store, first, last), args.repeat)
+            status = "ok" if (summary.totalSales, summary.totalRevenue) == (count, revenue) else "MISMATCH"
+            print(
+                f"{label:<9} sales={count:>8}  rollup={rollup_time * 1000:8.2f}ms  "
+                f"scan={scan_time * 1000:8.2f}ms  x{scan_time / rollup_time:6.1f}  {status}"
+            )
+
+
+if __name__ == "__main__":
+    main()
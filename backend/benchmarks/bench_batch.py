@@ -0,0 +1,87 @@
+"""一括生成のスループット比較: 1件ずつの /api/generate と /api/generate/batch
+
+使い方（backend/ で実行）:
+    python -m benchmarks.bench_batch --ideas 240 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.fake_anthropic import FakeAnthropicServer
+from src.config import settings
+
+CATEGORIES = ["prompt", "notion", "canva", "ebook"]
+
+
+def make_requests(count: int, tag: str) -> list[dict]:
+    # キャッシュに当たらないよう実行ごとにターゲットを変える
+    return [
+        {"category": CATEGORIES[i % len(CATEGORIES)], "target": f"{tag}ペルソナ{i}"}
+        for i in range(count)
+    ]
+
+
+async def one_at_a_time(client: httpx.AsyncClient, requests: list[dict]) -> None:
+    for request in requests:
+        response = await client.post("/api/generate", json=request)
+        response.raise_for_status()
+
+
+async def batch(client: httpx.AsyncClient, requests: list[dict]) -> None:
+    response = await client.post("/api/generate/batch", json={"requests": requests})
+    response.raise_for_status()
+    job_id = response.json()["jobId"]
+    while True:
+        status = (await client.get(f"/api/generate/batch/{job_id}")).json()
+        if status["status"] in ("completed", "failed"):
+            assert status["status"] == "completed" and status["completed"] == len(requests), status
+            return
+        await asyncio.sleep(0.05)
+
+
+async def run(args: argparse.Namespace, server: FakeAnthropicServer) -> None:
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            for label, use_batches, fn in (
+                ("serial", False, one_at_a_time),
+                ("fanout", False, batch),
+                ("batch", True, batch),
+            ):
+                settings.use_message_batches = use_batches
+                server.requests = 0
+                requests = make_requests(args.ideas, label)
+                start = time.perf_counter()
+                await fn(client, requests)
+                elapsed = time.perf_counter() - start
+                print(
+                    f"{label:<7} ideas={args.ideas:<5} {elapsed:7.2f}s  "
+                    f"{args.ideas / elapsed * 60:9.0f} ideas/min  upstream_requests={server.requests}"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ideas", type=int, default=240)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--batch-latency", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with FakeAnthropicServer(latency=args.latency) as server:
+        server.batch_latency = args.batch_latency
+        settings.anthropic_api_key = "bench"
+        settings.anthropic_base_url = server.url
+        # 流量制御で待たせず、生成の経路そのものを測る
+        settings.anthropic_requests_per_minute = 0
+        settings.anthropic_tokens_per_minute = 0
+        settings.batch_poll_interval = 0.5
+        asyncio.run(run(args, server))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""/api/generate の同時実行ベンチマーク
+
+使い方（backend/ で実行）:
+    python -m benchmarks.bench_generate --concurrency 50 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from benchmarks.fake_anthropic import FakeAnthropicServer
+from src.config import settings
+
+
+def percentile(samples: list[float], p: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(label: str, samples: list[float]) -> None:
+    print(
+        f"{label:<10} n={len(samples):<5} "
+        f"p50={percentile(samples, 50) * 1000:8.1f}ms "
+        f"p99={percentile(samples, 99) * 1000:8.1f}ms "
+        f"mean={statistics.mean(samples) * 1000:8.1f}ms"
+    )
+
+
+async def timed(client: httpx.AsyncClient, method: str, path: str, **kwargs) -> float:
+    start = time.perf_counter()
+    response = await client.request(method, path, **kwargs)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def run(concurrency: int, rounds: int) -> None:
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            generate_samples: list[float] = []
+            health_samples: list[float] = []
+            started = time.perf_counter()
+
+            for i in range(rounds):
+                # キャッシュや重複排除に当たらないよう、リクエストごとにターゲットを変える
+                bodies = [{"category": "notion", "target": f"副業初心者{i}-{j}"} for j in range(concurrency)]
+                load = asyncio.gather(
+                    *(timed(client, "POST", "/api/generate", json=body) for body in bodies)
+                )
+                probes = asyncio.gather(*(timed(client, "GET", "/api/health") for _ in range(10)))
+                generate_samples.extend(await load)
+                health_samples.extend(await probes)
+
+            elapsed = time.perf_counter() - started
+
+    report("generate", generate_samples)
+    report("health", health_samples)
+    print(f"throughput {len(generate_samples) / elapsed:.1f} req/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    with FakeAnthropicServer(latency=args.latency) as server:
+        settings.anthropic_api_key = "bench"
+        settings.anthropic_base_url = server.url
+        # 流量制御で待たせず、生成の経路そのものを測る
+        settings.anthropic_requests_per_minute = 0
+        settings.anthropic_tokens_per_minute = 0
+        settings.llm_max_concurrency = args.concurrency
+        asyncio.run(run(args.concurrency, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""商品案のJSON解析: find/rfindによる旧実装と逐次抽出の比較（出力コーパス使用）
+
+コーパス（benchmarks/corpus/generate_outputs.jsonl）の各出力を、ストリーミングと同じように
+少しずつ渡して解析する。正しく解析できた件数と、壊れた出力を何文字目で打ち切れたかを表示する。
+
+使い方（backend/ で実行）:
+    python -m benchmarks.bench_json_extract --chunk-size 20 --tokens-per-second 60
+"""
+
+import argparse
+import json
+import os
+import time
+
+from src.services.claude_service import PRODUCT_FIELDS
+from src.services.json_extract import ExtractionError, JSONObjectExtractor
+from src.types import GenerateResponse
+
+CORPUS = os.path.join(os.path.dirname(__file__), "corpus", "generate_outputs.jsonl")
+
+
+def parse_find_rfind(text: str) -> GenerateResponse | None:
+    """以前の parse_generate_response と同じ方法"""
+    try:
+        start = text.find("{")
+        end = text.rfind("}") + 1
+        return GenerateResponse(**json.loads(text[start:end]))
+    except (json.JSONDecodeError, ValueError):
+        return None
+
+
+def parse_incremental(text: str, chunk_size: int) -> tuple[GenerateResponse | None, int]:
+    """(解析結果, 読んだ文字数) を返す"""
+    extractor = JSONObjectExtractor(PRODUCT_FIELDS)
+    read = 0
+    try:
+        for i in range(0, len(text), chunk_size):
+            read = min(len(text), i + chunk_size)
+            if extractor.feed(text[i:i + chunk_size]):
+                break
+        return GenerateResponse(**extractor.finish()), read
+    except ExtractionError:
+        return None, read
+
+
+def per_call_us(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunk-size", type=int, default=20)
+    # 日本語は概ね1トークン1〜2文字。打ち切りで短縮できる時間の目安に使う
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--chars-per-token", type=float, default=1.5)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(CORPUS, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f]
+
+    old_correct = new_correct = 0
+    saved_chars = malformed_chars = 0
+    print(f"{'case':<28} {'valid':<6} {'find/rfind':<11} {'incremental':<12} read")
+    for case in corpus:
+        text = case["text"]
+        old = parse_find_rfind(text) is not None
+        new_result, read = parse_incremental(text, args.chunk_size)
+        new = new_result is not None
+        old_correct += old == case["valid"]
+        new_correct += new == case["valid"]
+        if not case["valid"]:
+            malformed_chars += len(text)
+            saved_chars += len(text) - read
+        print(
+            f"{case['name']:<28} {str(case['valid']):<6} {'ok' if old else 'fail':<11} "
+            f"{'ok' if new else 'abort':<12} {read}/{len(text)}"
+        )
+
+    print()
+    print(f"correct      find/rfind={old_correct}/{len(corpus)}  incremental={new_correct}/{len(corpus)}")
+    if malformed_chars:
+        seconds = saved_chars / args.chars_per_token / args.tokens_per_second
+        print(
+            f"malformed    {saved_chars / malformed_chars:.0%} of output skipped by early abort "
+            f"(~{seconds / sum(not case['valid'] for case in corpus):.1f}s per malformed response "
+            f"at {args.tokens_per_second:.0f} tok/s)"
+        )
+
+    old_us = per_call_us(lambda: [parse_find_rfind(case["text"]) for case in corpus], args.repeat) / len(corpus)
+    new_us = per_call_us(
+        lambda: [parse_incremental(case["text"], args.chunk_size) for case in corpus], args.repeat
+    ) / len(corpus)
+    print(f"cpu          find/rfind={old_us:.1f}us  incremental={new_us:.1f}us per response")
+
+
+if __name__ == "__main__":
+    main()
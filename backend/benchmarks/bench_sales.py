@@ -0,0 +1,51 @@
+"""fetch_sales の全ページ取得ベンチマーク
+
+使い方（backend/ で実行）:
+    python -m benchmarks.bench_sales --sizes 10000 100000 1000000 --page-size 1000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.fake_gumroad import FakeGumroadServer
+from src.config import settings
+from src.services.gumroad_service import fetch_sales
+
+
+async def run(args: argparse.Namespace) -> None:
+    for size in args.sizes:
+        with FakeGumroadServer(size, args.page_size, args.latency, args.error_rate) as server:
+            settings.gumroad_api_base = server.url
+            token = f"bench-token-{size}-{time.time()}"
+            # 1回目は全件同期、2回目は同期位置以降だけを取得する
+            for label in ("initial", "resync"):
+                server.requests = 0
+                start = time.perf_counter()
+                summary = await fetch_sales(token)
+                elapsed = time.perf_counter() - start
+
+                status = "ok" if summary.totalSales == size else f"MISMATCH ({summary.totalSales})"
+                print(
+                    f"sales={size:>8}  {label:<8} requests={server.requests:>5}  {elapsed:7.2f}s  "
+                    f"{size / elapsed:>10.0f} sales/s  {status}"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        settings.sales_db_path = os.path.join(directory, "sales.db")
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""売上の差分配信（/api/sales/stream）のファンアウトベンチマーク
+
+uvicornで起動したアプリに--viewers本のSSE接続を張り、Pingを--rate件/秒で--pings件送る。
+Pingを送ってから各ダッシュボードに差分が届くまでの時間と、Gumroad（モック）への問い合わせ数、
+読むのが遅いクライアント（--slow本）が受け取った差分と送り直し（snapshot）の回数を計測する。
+遅いクライアントの分はまずソケットのバッファに溜まり、それも詰まってから送信待ちの差分が
+SALES_STREAM_QUEUE_SIZEを超えると送り直しになる（他のダッシュボードの遅延には影響しない）。
+
+使い方（backend/ で実行）:
+    python -m benchmarks.bench_sales_stream --viewers 500 --pings 200 --rate 50 --slow 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+import httpx
+import uvicorn
+
+from benchmarks.bench_generate import percentile
+from benchmarks.fake_gumroad import FakeGumroadServer
+from src.config import settings
+
+
+class Viewer:
+    def __init__(self, slow: bool):
+        self.slow = slow
+        self.snapshots = 0
+        self.deltas = 0
+        self.latencies: list[float] = []
+        self.connected = asyncio.Event()
+
+
+async def watch(client: httpx.AsyncClient, viewer: Viewer, sent_at: dict[int, float]) -> None:
+    async with client.stream("GET", "/api/sales/stream") as response:
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "snapshot":
+                    viewer.snapshots += 1
+                    viewer.connected.set()
+                elif event == "delta":
+                    viewer.deltas += 1
+                    if data["totalSales"] in sent_at:
+                        viewer.latencies.append(time.perf_counter() - sent_at[data["totalSales"]])
+                if viewer.slow:
+                    await asyncio.sleep(0.2)
+
+
+async def run(args: argparse.Namespace, base_url: str) -> list[Viewer]:
+    viewers = [Viewer(slow=i < args.slow) for i in range(args.viewers)]
+    sent_at: dict[int, float] = {}
+    limits = httpx.Limits(max_connections=args.viewers + 10)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        tasks = [asyncio.create_task(watch(client, viewer, sent_at)) for viewer in viewers]
+        await asyncio.gather(*(viewer.connected.wait() for viewer in viewers))
+
+        day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        for i in range(args.pings):
+            ping = {
+                "sale_id": f"bench-{i}",
+                "product_name": f"商品{i % 20}",
+                "price": "980",
+                "sale_timestamp": f"{day}T00:00:{i % 60:02d}Z",
+            }
+            sent_at[i + 1] = time.perf_counter()
+            response = await client.post(
+                "/api/gumroad/ping",
+                params={"secret": settings.gumroad_ping_secret},
+                content=urlencode(ping),
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+            )
+            response.raise_for_status()
+            await asyncio.sleep(1 / args.rate)
+
+        # 最後の差分が届くまで少し待つ
+        await asyncio.sleep(1.0)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return viewers
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--viewers", type=int, default=500)
+    parser.add_argument("--pings", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=50.0)
+    parser.add_argument("--slow", type=int, default=5)
+    parser.add_argument("--reconcile", type=float, default=2.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, FakeGumroadServer(0, latency=0.02, sales=[]) as gumroad:
+        settings.sales_db_path = os.path.join(directory, "sales.db")
+        settings.tenant_db_path = os.path.join(directory, "tenants.db")
+        settings.gumroad_api_base = gumroad.url
+        settings.gumroad_access_token = "bench"
+        settings.gumroad_ping_secret = "bench"
+        settings.sales_reconcile_seconds = args.reconcile
+
+        from main import app
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+
+        started = time.perf_counter()
+        viewers = asyncio.run(run(args, f"http://127.0.0.1:{port}"))
+        elapsed = time.perf_counter() - started
+        server.should_exit = True
+        thread.join()
+
+    fast = [viewer for viewer in viewers if not viewer.slow]
+    latencies = [latency for viewer in fast for latency in viewer.latencies]
+    complete = sum(viewer.deltas >= args.pings for viewer in fast)
+    print(
+        f"viewers={args.viewers} pings={args.pings} elapsed={elapsed:.1f}s gumroad_requests={gumroad.requests} "
+        f"(reconcile every {args.reconcile:g}s)"
+    )
+    print(
+        f"  fast viewers: {complete}/{len(fast)} received every delta  "
+        f"latency p50={percentile(latencies, 50) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms"
+    )
+    for viewer in viewers:
+        if viewer.slow:
+            print(f"  slow viewer: deltas={viewer.deltas} snapshots={viewer.snapshots}")
+
+
+if __name__ == "__main__":
+    main()
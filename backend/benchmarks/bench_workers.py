@@ -0,0 +1,131 @@
+"""ワーカー数ごとのスループット（python main.py を WEB_CONCURRENCY=1..N で起動して比べる）
+
+GET /api/sales（月の累計をJSONにする。ほぼCPUだけ）と、20通りの条件を繰り返す POST /api/generate
+（共有のSQLiteキャッシュに当たる）を、負荷をかける側も複数のプロセスに分けて一定時間叩き続ける。
+あわせて、LLM（モック）とGumroad（モック）への呼び出し数がワーカー数によらず増えないことを確かめる。
+負荷をかける側も同じマシンで動くので、CPU数の半分程度までのワーカー数で比べるとよい。
+
+使い方（backend/ で実行）:
+    python -m benchmarks.bench_workers --workers 1 2 4 --duration 10 --clients 4
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_generate import percentile
+from benchmarks.fake_anthropic import FakeAnthropicServer
+from benchmarks.fake_gumroad import FakeGumroadServer
+from src.workers import available_cpus
+
+TARGETS = [f"ベンチマーク{i}の読者" for i in range(20)]
+
+
+def request_for(index: int) -> tuple[str, str, dict | None]:
+    if index % 2:
+        return "GET", "/api/sales", None
+    return "POST", "/api/generate", {"category": "notion", "target": TARGETS[index // 2 % len(TARGETS)]}
+
+
+async def load(url: str, concurrency: int, duration: float) -> list[float]:
+    latencies: list[float] = []
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=30, limits=limits) as client:
+
+        async def worker(offset: int) -> None:
+            index = offset
+            while time.perf_counter() < deadline:
+                method, path, body = request_for(index)
+                start = time.perf_counter()
+                response = await client.request(method, path, json=body)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+                index += concurrency
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return latencies
+
+
+def load_process(args: tuple[str, int, float]) -> list[float]:
+    return asyncio.run(load(*args))
+
+
+def start_server(workers: int, env: dict[str, str]) -> tuple[subprocess.Popen, str]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, "main.py"],
+        env={**os.environ, **env, "WEB_CONCURRENCY": str(workers), "PORT": str(port)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/api/health").status_code == 200:
+                return process, url
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("server did not start")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=4, help="負荷をかけるプロセス数")
+    parser.add_argument("--concurrency", type=int, default=16, help="プロセスあたりの同時リクエスト数")
+    parser.add_argument("--sales", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"available cpus: {available_cpus():g}")
+    for workers in args.workers:
+        with (
+            tempfile.TemporaryDirectory() as directory,
+            FakeAnthropicServer(latency=0.2) as llm,
+            FakeGumroadServer(args.sales, latency=0.0) as gumroad,
+        ):
+            env = {
+                "ANTHROPIC_API_KEY": "bench",
+                "ANTHROPIC_BASE_URL": llm.url,
+                "ANTHROPIC_REQUESTS_PER_MINUTE": "0",
+                "ANTHROPIC_TOKENS_PER_MINUTE": "0",
+                "LLM_PROVIDERS": "claude",
+                "GUMROAD_API_BASE": gumroad.url,
+                "GUMROAD_ACCESS_TOKEN": "bench",
+                "CACHE_DIR": directory,
+                "SALES_DB_PATH": os.path.join(directory, "sales.db"),
+                "TENANT_DB_PATH": os.path.join(directory, "tenants.db"),
+            }
+            process, url = start_server(workers, env)
+            try:
+                # 起動直後の同期とキャッシュの作成は計測に含めない
+                asyncio.run(load(url, 8, 2.0))
+                with multiprocessing.Pool(args.clients) as pool:
+                    results = pool.map(load_process, [(url, args.concurrency, args.duration)] * args.clients)
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+        latencies = [latency for result in results for latency in result]
+        print(
+            f"workers={workers}  {len(latencies) / args.duration:8.0f} req/s  "
+            f"p50={percentile(latencies, 50) * 1000:6.1f}ms p99={percentile(latencies, 99) * 1000:6.1f}ms  "
+            f"llm_calls={llm.requests} gumroad_requests={gumroad.requests}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""ベンチマーク用のローカルMessages APIモックサーバー"""
+
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_PRODUCT = {
+    "productNames": ["30日で身につく時短術", "今日から使えるテンプレート集", "初心者向け完全ガイド"],
+    "description": "忙しいあなたのための実践テンプレートです。" * 8,
+    "suggestedPrice": 1480,
+    "tags": ["時短", "テンプレート", "初心者", "副業", "効率化"],
+}
+
+
+class BenchHTTPServer(ThreadingHTTPServer):
+    # 既定の5では同時接続が溢れ、SYNの再送で1秒以上の遅延が混ざる
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class FakeAnthropicServer:
+    """error_rateの割合で529（overloaded）を返し、slow_rateの割合で応答をslow_factor倍遅くする
+
+    max_concurrencyを指定すると、それを超える同時リクエストには429（rate_limit_error）を返す。
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        port: int = 0,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_factor: float = 10.0,
+        max_concurrency: int = 0,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.rate_limited = 0
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.batch_latency = latency
+        self.requests = 0
+        # 指定があれば先頭から順にMessages APIの出力として返す（壊れた出力の再現用）
+        self.outputs: list[str] = []
+        self._batches: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._server = BenchHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeAnthropicServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _create_batch(self, payload: dict) -> dict:
+        """バッチは batch_latency 秒後に全件完了したものとして扱う"""
+        batch_id = f"msgbatch_{uuid.uuid4().hex}"
+        batch = {
+            "id": batch_id,
+            "created_at": time.time(),
+            "results": [
+                {
+                    "custom_id": request["custom_id"],
+                    "result": {
+                        "type": "succeeded",
+                        "message": _message(json.dumps(FAKE_PRODUCT, ensure_ascii=False), request["params"]),
+                    },
+                }
+                for request in payload.get("requests", [])
+            ],
+        }
+        with self._lock:
+            self._batches[batch_id] = batch
+        return self._batch_status(batch)
+
+    def _batch_status(self, batch: dict) -> dict:
+        ended = time.time() - batch["created_at"] >= self.batch_latency
+        count = len(batch["results"])
+        created_at = datetime.fromtimestamp(batch["created_at"], timezone.utc)
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "created_at": created_at.isoformat(),
+            "expires_at": (created_at + timedelta(days=1)).isoformat(),
+            "ended_at": datetime.now(timezone.utc).isoformat() if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{self.url}/v1/messages/batches/{batch['id']}/results" if ended else None,
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                payload = json.loads(body or b"{}")
+                with server._lock:
+                    server.requests += 1
+                if self.path.startswith("/v1/messages/batches"):
+                    self._send_json(200, server._create_batch(payload))
+                    return
+                with server._lock:
+                    limited = 0 < server.max_concurrency <= server.in_flight
+                    if limited:
+                        server.rate_limited += 1
+                    else:
+                        server.in_flight += 1
+                if limited:
+                    self._send_json(429, {"type": "error", "error": {"type": "rate_limit_error", "message": "Rate limited"}})
+                    return
+                try:
+                    self._send_message(payload)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def _send_message(self, payload: dict):
+                if random.random() < server.error_rate:
+                    time.sleep(server.latency / 10)
+                    try:
+                        self._send_json(529, {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+                    except (BrokenPipeError, ConnectionResetError):
+                        self.close_connection = True
+                    return
+                with server._lock:
+                    text = server.outputs.pop(0) if server.outputs else json.dumps(FAKE_PRODUCT, ensure_ascii=False)
+                latency = server.latency * (server.slow_factor if random.random() < server.slow_rate else 1)
+                if payload.get("stream"):
+                    self._send_stream(text, payload, latency)
+                    return
+                time.sleep(latency)
+                self._send_json(200, _message(text, payload))
+
+            def do_GET(self):
+                # /v1/messages/batches/{id} と /v1/messages/batches/{id}/results
+                parts = self.path.split("?")[0].strip("/").split("/")
+                batch = server._batches.get(parts[3]) if len(parts) >= 4 else None
+                if batch is None:
+                    self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": "not found"}})
+                    return
+                if parts[-1] == "results":
+                    lines = "\n".join(json.dumps(result) for result in batch["results"])
+                    encoded = lines.encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/binary")
+                    self.send_header("Content-Length", str(len(encoded)))
+                    self.end_headers()
+                    self.wfile.write(encoded)
+                    return
+                self._send_json(200, server._batch_status(batch))
+
+            def _send_stream(self, text: str, payload: dict, latency: float):
+                """latencyの半分で最初のトークンを返し、残りの半分で本文を流す"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(latency / 2)
+                message = {**_message("", payload), "content": [], "stop_reason": None}
+                chunks = [text[i:i + 20] for i in range(0, len(text), 20)]
+                try:
+                    self._send_event("message_start", {"type": "message_start", "message": message})
+                    self._send_event(
+                        "content_block_start",
+                        {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+                    )
+                    for chunk in chunks:
+                        self._send_event(
+                            "content_block_delta",
+                            {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}},
+                        )
+                        time.sleep(latency / 2 / len(chunks))
+                    self._send_event("content_block_stop", {"type": "content_block_stop", "index": 0})
+                    self._send_event(
+                        "message_delta",
+                        {
+                            "type": "message_delta",
+                            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                            "usage": {"output_tokens": 200},
+                        },
+                    )
+                    self._send_event("message_stop", {"type": "message_stop"})
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # クライアントが途中で打ち切った
+                    self.close_connection = True
+
+            def _send_event(self, event: str, data: dict):
+                encoded = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+                self.wfile.write(f"{len(encoded):x}\r\n".encode() + encoded + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, status: int, data: dict):
+                encoded = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+        return Handler
+
+
+def _message(text: str, payload: dict) -> dict:
+    return {
+        "id": "msg_fake",
+        "type": "message",
+        "role": "assistant",
+        "model": payload.get("model", "fake"),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": 100, "output_tokens": 200},
+    }
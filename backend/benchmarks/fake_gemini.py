@@ -0,0 +1,91 @@
+"""ベンチマーク用のローカルGemini API（streamGenerateContent）モックサーバー"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+from benchmarks.fake_anthropic import FAKE_PRODUCT, BenchHTTPServer
+
+
+class FakeGeminiServer:
+    """error_rateの割合で503を返し、slow_rateの割合で応答をslow_factor倍遅くする"""
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        port: int = 0,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_factor: float = 10.0,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = BenchHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeGeminiServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with server._lock:
+                    server.requests += 1
+                if random.random() < server.error_rate:
+                    time.sleep(server.latency / 10)
+                    encoded = json.dumps({"error": {"code": 503, "status": "UNAVAILABLE"}}).encode()
+                    try:
+                        self.send_response(503)
+                        self.send_header("Content-Type", "application/json")
+                        self.send_header("Content-Length", str(len(encoded)))
+                        self.end_headers()
+                        self.wfile.write(encoded)
+                    except (BrokenPipeError, ConnectionResetError):
+                        self.close_connection = True
+                    return
+
+                latency = server.latency * (server.slow_factor if random.random() < server.slow_rate else 1)
+                text = json.dumps(FAKE_PRODUCT, ensure_ascii=False)
+                chunks = [text[i:i + 40] for i in range(0, len(text), 40)]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    time.sleep(latency / 2)
+                    for chunk in chunks:
+                        data = {"candidates": [{"content": {"parts": [{"text": chunk}], "role": "model"}}]}
+                        encoded = f"data: {json.dumps(data, ensure_ascii=False)}\r\n\r\n".encode()
+                        self.wfile.write(f"{len(encoded):x}\r\n".encode() + encoded + b"\r\n")
+                        self.wfile.flush()
+                        time.sleep(latency / 2 / len(chunks))
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # クライアントが途中で打ち切った
+                    self.close_connection = True
+
+        return Handler
@@ -0,0 +1,110 @@
+"""ベンチマーク用のローカルGumroad /v2/sales スタブ"""
+
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeGumroadServer:
+    def __init__(
+        self,
+        total_sales: int,
+        page_size: int = 1000,
+        latency: float = 0.02,
+        error_rate: float = 0.0,
+        sales: list[dict] | None = None,
+    ):
+        # salesを渡すと生成する代わりにその売上（created_atの昇順）を返す。後から追加してもよい
+        self.sales = sales
+        self.total_sales = total_sales
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v2"
+
+    def __enter__(self) -> "FakeGumroadServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def sale(self, index: int) -> dict:
+        if self.sales is not None:
+            return self.sales[index]
+        created_at = self.start + timedelta(seconds=index * 2_000_000 // max(self.total_sales, 1))
+        return {
+            "id": f"sale_{index}",
+            "product_name": f"商品{index % 50}",
+            "price": f"{(index % 40 + 5) * 1.25:.2f}",
+            "created_at": created_at.isoformat() + "Z",
+        }
+
+    def first_index_after(self, after: str | None) -> int:
+        if not after:
+            return 0
+        if self.sales is not None:
+            return next((i for i, sale in enumerate(self.sales) if sale["created_at"] >= after), len(self.sales))
+        seconds = (datetime.fromisoformat(after) - self.start).total_seconds()
+        index = -(-int(seconds) * self.total_sales // 2_000_000)
+        return min(max(index, 0), self.total_sales)
+
+    def page(self, offset: int) -> dict:
+        if self.sales is not None:
+            self.total_sales = len(self.sales)
+        end = min(offset + self.page_size, self.total_sales)
+        data: dict = {"success": True, "sales": [self.sale(i) for i in range(offset, end)]}
+        if end < self.total_sales:
+            data["next_page_key"] = str(end)
+            data["next_page_url"] = f"/v2/sales?page_key={end}"
+        return data
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                time.sleep(server.latency)
+                if random.random() < server.error_rate:
+                    self._send(429, {"success": False}, {"Retry-After": "0"})
+                    return
+                query = parse_qs(urlparse(self.path).query)
+                if "page_key" in query:
+                    offset = int(query["page_key"][0])
+                else:
+                    offset = server.first_index_after(query.get("after", [None])[0])
+                self._send(200, server.page(offset))
+
+            def _send(self, status: int, data: dict, headers: dict | None = None):
+                encoded = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(encoded)
+
+        return Handler
@@ -1,18 +1,39 @@
+import asyncio
+import contextlib
 import signal
 import sys
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from src.config import settings
 from src.routers import generate, sales
+from src.services import claude_service, gumroad_service, metrics
+from src.services.admission import Overloaded
+from src.services.metrics_store import publish_metrics, render_all_workers
+from src.services.sales_ledger import get_sales_ledger
+from src.services.sales_stream import sales_broadcaster
+from src.services.sales_sync import sales_sync
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    claude_service.init_client()
+    sales_broadcaster.attach(get_sales_ledger())
+    sales_sync.start()
+    # メトリクスはワーカーごとなので、全ワーカーの値を返せるよう共有する
+    publisher = asyncio.create_task(publish_metrics()) if settings.workers > 1 else None
     yield
     print("Shutting down gracefully...")
+    if publisher is not None:
+        publisher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await publisher
+    await sales_sync.stop()
+    await gumroad_service.gumroad_clients.aclose()
+    await claude_service.close_client()
 
 
 app = FastAPI(
@@ -29,16 +50,32 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(generate.router, prefix="/api", tags=["generate"])
 app.include_router(sales.router, prefix="/api", tags=["sales"])
 
 
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "混雑しています。しばらくしてから再試行してください", "retryAfter": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    text = await render_all_workers() if settings.workers > 1 else metrics.registry.render()
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
 def handle_sigterm(signum, frame):
     print("Received SIGTERM, initiating graceful shutdown...")
     sys.exit(0)
@@ -48,6 +85,16 @@ signal.signal(signal.SIGTERM, handle_sigterm)
 
 
 if __name__ == "__main__":
+    import os
+
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8291)
+    from src.workers import worker_count, worker_environ
+
+    workers = worker_count()
+    if workers == 1:
+        uvicorn.run(app, host="0.0.0.0", port=settings.port)
+    else:
+        os.environ.update(worker_environ(workers))
+        print(f"Starting {workers} workers (cache: {os.environ.get('CACHE_BACKEND', settings.cache_backend)})")
+        uvicorn.run("main:app", host="0.0.0.0", port=settings.port, workers=workers)
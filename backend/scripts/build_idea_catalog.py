@@ -0,0 +1,102 @@
+"""よく使われる (カテゴリ, ターゲット) の商品案を事前に生成し、カタログ（JSON）に書き出す
+
+既存のカタログに追記し、同じターゲットの案は新しいもので置き換える。
+生成は /api/generate と同じ経路（キャッシュ・流量制御・プロバイダーの切り替え）を通り、
+モックや代替の応答はカタログに入れない。
+
+使い方（backend/ で実行）:
+    python -m scripts.build_idea_catalog
+    python -m scripts.build_idea_catalog --categories notion,canva --targets 副業初心者,主婦
+
+Vercel版で使う場合は --output ../frontend/api/_idea_catalog.json で書き出し、
+frontend/vercel.json の api/index.py に "includeFiles": "api/_idea_catalog.json" を足してからデプロイする
+（カタログはリポジトリに含めていないので、そのままでは /api/generate/instant は常に404）。
+"""
+
+import argparse
+import asyncio
+import time
+from typing import get_args
+
+from src.config import settings
+from src.services import claude_service
+from src.services.idea_catalog import IdeaCatalog
+from src.types import GenerateRequest, ProductCategory
+
+POPULAR_TARGETS = [
+    "副業初心者",
+    "主婦",
+    "会社員",
+    "大学生",
+    "フリーランス",
+    "個人事業主",
+    "ブロガー",
+    "YouTuber",
+    "営業職",
+    "エンジニア",
+    "デザイナー",
+    "子育て中のママ",
+    "シニア",
+    "転職活動中の人",
+    "資格勉強中の人",
+    "小さなお店のオーナー",
+]
+
+
+async def build(catalog: IdeaCatalog, pairs: list[tuple[str, str]], concurrency: int) -> tuple[int, int]:
+    semaphore = asyncio.Semaphore(concurrency)
+    added = 0
+    skipped = 0
+
+    async def one(category: str, target: str) -> None:
+        nonlocal added, skipped
+        request = GenerateRequest(category=category, target=target)
+        async with semaphore:
+            try:
+                result, source = await claude_service.generate_product_with_source(request)
+            except Exception as e:
+                print(f"{category}/{target}: {e!r}")
+                skipped += 1
+                return
+        # LLMの生成結果（キャッシュ済みを含む）だけを入れる
+        if source not in ("llm", "cache"):
+            skipped += 1
+            return
+        catalog.add(category, target, result)
+        added += 1
+
+    try:
+        await asyncio.gather(*(one(category, target) for category, target in pairs))
+    finally:
+        await claude_service.close_client()
+    return added, skipped
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--categories", default="", help="カンマ区切り（省略時はすべて）")
+    parser.add_argument("--targets", default="", help="カンマ区切り（省略時はPOPULAR_TARGETS）")
+    parser.add_argument("--output", default=settings.idea_catalog_path)
+    parser.add_argument("--concurrency", type=int, default=settings.batch_concurrency)
+    args = parser.parse_args()
+
+    categories = [c for c in args.categories.split(",") if c] or list(get_args(ProductCategory))
+    targets = [t for t in args.targets.split(",") if t] or POPULAR_TARGETS
+    pairs = [(category, target) for category in categories for target in targets]
+
+    if not claude_service.get_router().providers:
+        raise SystemExit("ANTHROPIC_API_KEY か GEMINI_API_KEY を設定してください")
+
+    catalog = IdeaCatalog(args.output)
+    catalog.load()
+    started = time.perf_counter()
+    added, skipped = asyncio.run(build(catalog, pairs, args.concurrency))
+    catalog.save()
+    print(
+        f"{added} ideas added, {skipped} skipped in {time.perf_counter() - started:.1f}s "
+        f"-> {args.output} ({catalog.stats()['entries']} entries)"
+    )
+
+
+if __name__ == "__main__":
+    main()
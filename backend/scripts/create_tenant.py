@@ -0,0 +1,29 @@
+"""テナントのAPIキーを発行する（既にあれば置き換え、古いキーは使えなくなる）
+
+キーはハッシュだけを保存するので、表示されたキーを控えておく。ダッシュボードでは設定画面で入力する。
+X-Tenant-Id を付けるリクエストには Authorization: Bearer <キー> が要る。
+
+使い方（backend/ で実行）:
+    python -m scripts.create_tenant shop-a
+"""
+
+import argparse
+import re
+
+from src.services.tenant_store import DEFAULT_TENANT, TENANT_PATTERN, get_tenant_store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("tenant", help="X-Tenant-Id に使う名前（英数字・_・-、64文字まで）")
+    args = parser.parse_args()
+
+    if args.tenant == DEFAULT_TENANT or not re.match(TENANT_PATTERN, args.tenant):
+        raise SystemExit(f"テナント名に使えない値です: {args.tenant}")
+
+    key = get_tenant_store().issue_key(args.tenant)
+    print(f"tenant: {args.tenant}\napi key: {key}")
+
+
+if __name__ == "__main__":
+    main()
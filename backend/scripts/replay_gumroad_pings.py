@@ -0,0 +1,148 @@
+"""記録したGumroadのPing（フォームの各項目をJSON Linesにしたもの）を /api/gumroad/ping に送り直す
+
+既定ではアプリをプロセス内で動かし、Pull APIはモック（benchmarks.fake_gumroad）に向ける。
+Pingの一部を落とし（--drop）、再送を混ぜ（--repeat）て送ったあと、Pull APIとの突き合わせで
+落とした分が補われ、累計がフィクスチャから直接計算した値と一致するかを確かめる。
+--url を指定すると起動中のサーバーにPingを送るだけにする。
+
+使い方（backend/ で実行）:
+    python -m scripts.replay_gumroad_pings
+    python -m scripts.replay_gumroad_pings --drop 0.3 --repeat 3 --shuffle
+    python -m scripts.replay_gumroad_pings --url http://localhost:8291 --secret <GUMROAD_PING_SECRET>
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+from collections import Counter
+from urllib.parse import urlencode
+
+import httpx
+
+from src.config import settings
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "gumroad_pings.jsonl")
+
+
+def load_pings(path: str) -> list[dict[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def send_pings(
+    client: httpx.AsyncClient, pings: list[dict[str, str]], secret: str, concurrency: int
+) -> Counter:
+    semaphore = asyncio.Semaphore(concurrency)
+    outcomes: Counter = Counter()
+
+    async def one(ping: dict[str, str]) -> None:
+        async with semaphore:
+            response = await client.post(
+                "/api/gumroad/ping",
+                params={"secret": secret},
+                content=urlencode(ping),
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+            )
+        outcomes[response.json()["status"] if response.is_success else f"HTTP {response.status_code}"] += 1
+
+    await asyncio.gather(*(one(ping) for ping in pings))
+    return outcomes
+
+
+def expected_totals(pings: list[dict[str, str]]) -> tuple[int, int]:
+    """フィクスチャから直接計算した (件数, 金額)。テスト送信を除き、sale_idで重複を除く"""
+    from src.services.gumroad_service import parse_ping
+
+    sales = {ping["sale_id"]: parse_ping(ping) for ping in pings if ping.get("test") != "true"}
+    return len(sales), sum(sale["price_cents"] for sale in sales.values())
+
+
+def build_schedule(pings: list[dict[str, str]], drop: float, repeat: int, shuffle: bool, rng: random.Random):
+    """(送るPing, 落としたPing) を返す。落とさなかったPingはrepeat回ずつ送る"""
+    sent = []
+    dropped = []
+    for ping in pings:
+        if ping.get("test") != "true" and rng.random() < drop:
+            dropped.append(ping)
+        else:
+            sent.extend([ping] * repeat)
+    if shuffle:
+        rng.shuffle(sent)
+    return sent, dropped
+
+
+async def replay_in_process(args: argparse.Namespace, pings: list[dict[str, str]]) -> None:
+    from benchmarks.fake_gumroad import FakeGumroadServer
+    from src.services.gumroad_service import parse_ping
+    from src.services.sales_store import SalesStore
+    from src.services.sales_sync import sales_sync
+
+    sent, dropped = build_schedule(pings, args.drop, args.repeat, args.shuffle, random.Random(args.seed))
+    month = min(ping["sale_timestamp"] for ping in pings)[:7]
+    expected_count, expected_revenue = expected_totals(pings)
+
+    # Pull APIには最初は何も無く、突き合わせの直前にすべての売上が載る
+    with FakeGumroadServer(0, latency=0, sales=[]) as gumroad:
+        settings.gumroad_api_base = gumroad.url
+        settings.gumroad_access_token = "replay"
+        settings.sales_reconcile_seconds = 0
+
+        from main import app
+
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+                await client.get("/api/sales", params={"month": month})
+                outcomes = await send_pings(client, sent, args.secret, args.concurrency)
+                print(f"sent {len(sent)} pings ({len(dropped)} dropped): {dict(outcomes)}")
+                before = (await client.get("/api/sales", params={"month": month})).json()
+                print(f"after pings:     totalSales={before['totalSales']:>4} totalRevenue={before['totalRevenue']}")
+
+                unique = {ping["sale_id"]: ping for ping in pings if ping.get("test") != "true"}
+                gumroad.sales.extend(sorted((parse_ping(ping) for ping in unique.values()), key=lambda sale: sale["created_at"]))
+                await sales_sync.reconcile(SalesStore.account_key(settings.gumroad_access_token))
+                after = (await client.get("/api/sales", params={"month": month})).json()
+                print(f"after reconcile: totalSales={after['totalSales']:>4} totalRevenue={after['totalRevenue']}")
+
+    ok = (after["totalSales"], after["totalRevenue"]) == (expected_count, expected_revenue)
+    print(f"expected:        totalSales={expected_count:>4} totalRevenue={expected_revenue}  {'ok' if ok else 'MISMATCH'}")
+    if not ok:
+        raise SystemExit(1)
+
+
+async def replay_remote(args: argparse.Namespace, pings: list[dict[str, str]]) -> None:
+    sent, _ = build_schedule(pings, 0.0, args.repeat, args.shuffle, random.Random(args.seed))
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+        outcomes = await send_pings(client, sent, args.secret, args.concurrency)
+    print(f"sent {len(sent)} pings: {dict(outcomes)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--url", default="", help="省略時はプロセス内のアプリに送る")
+    parser.add_argument("--secret", default=settings.gumroad_ping_secret or "replay")
+    parser.add_argument("--drop", type=float, default=0.2, help="送らずに落とすPingの割合（プロセス内のみ）")
+    parser.add_argument("--repeat", type=int, default=2, help="同じPingを送る回数（再送の再現）")
+    parser.add_argument("--shuffle", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pings = load_pings(args.fixtures)
+    if args.url:
+        asyncio.run(replay_remote(args, pings))
+        return
+
+    settings.gumroad_ping_secret = args.secret
+    with tempfile.TemporaryDirectory() as directory:
+        settings.sales_db_path = os.path.join(directory, "sales.db")
+        settings.tenant_db_path = os.path.join(directory, "tenants.db")
+        asyncio.run(replay_in_process(args, pings))
+
+
+if __name__ == "__main__":
+    main()
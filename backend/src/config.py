@@ -3,8 +3,67 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     anthropic_api_key: str = ""
+    anthropic_base_url: str = ""
+    anthropic_timeout: float = 60.0
+    anthropic_max_connections: int = 100
+    anthropic_max_keepalive_connections: int = 20
+    anthropic_max_retries: int = 2
+    generate_max_retries: int = 1
+    gemini_api_key: str = ""
+    gemini_base_url: str = "https://generativelanguage.googleapis.com"
+    gemini_model: str = "gemini-2.5-flash"
+    gemini_timeout: float = 60.0
+    gemini_max_connections: int = 100
+    gemini_max_keepalive_connections: int = 20
+    llm_providers: str = "claude,gemini"  # 統計が溜まるまではこの順に使う
+    llm_hedge: bool = False
+    llm_hedge_min_delay: float = 1.0
+    llm_hedge_max_delay: float = 10.0
+    llm_stats_window: int = 100
+    llm_unhealthy_error_rate: float = 0.5
+    llm_unhealthy_cooldown: float = 30.0
+    # 流量制御（プロバイダーごと。分あたりの値は0なら制限しない）
+    llm_max_concurrency: int = 20
+    llm_queue_size: int = 50
+    llm_queue_timeout: float = 10.0
+    anthropic_requests_per_minute: float = 50
+    anthropic_tokens_per_minute: float = 50000
+    gemini_requests_per_minute: float = 1000
+    gemini_tokens_per_minute: float = 1000000
+    idea_catalog_path: str = "data/idea_catalog.json"
+    idea_catalog_min_similarity: float = 0.5
+    use_message_batches: bool = True
+    batch_concurrency: int = 8
+    batch_poll_interval: float = 10.0
+    batch_job_ttl_seconds: float = 86400.0
     gumroad_access_token: str = ""
+    gumroad_api_base: str = "https://api.gumroad.com/v2"
+    gumroad_max_in_flight: int = 4
+    gumroad_max_retries: int = 5
+    gumroad_max_clients: int = 256  # 接続プールを残しておくアカウント数
+    gumroad_ping_secret: str = ""  # 空ならPingを受け付けない
+    gumroad_seller_id: str = ""  # 設定すると他のseller_idのPingを拒否する
+    sales_db_path: str = "data/sales.db"
+    tenant_db_path: str = "data/tenants.db"
+    admin_api_key: str = ""  # 既定のテナントの設定を保存するためのキー（空なら保存できない）
+    sales_reconcile_seconds: float = 60.0  # 0なら定期の突き合わせをしない
+    sales_watch_seconds: float = 1.0  # 他のワーカーが追加した売上を読み込む間隔（0なら読み込まない）
+    sales_stream_queue_size: int = 64  # ダッシュボード1つあたりの未送信の差分の上限
+    sales_stream_keepalive_seconds: float = 15.0
+    cache_backend: str = "memory"  # memory / sqlite / none
+    cache_dir: str = "data"
+    cache_ttl_seconds: float = 86400.0
+    cache_max_entries: int = 1024
     frontend_url: str = "https://rakumane.vercel.app"
+    port: int = 8291
+    # ワーカー数（0ならCPU数とメモリから決める。python main.py で起動したときに使う）
+    web_concurrency: int = 0
+    web_max_workers: int = 8
+    worker_memory_mb: int = 256  # ワーカー1つに見込むメモリ
+    workers: int = 1  # 起動したワーカー数（main.pyが設定する。分あたりの上限はワーカーで分け合う）
+    # 複数のワーカーで動かすとき、/api/metrics で全ワーカーの値を返すための共有先と、各ワーカーが書く間隔（秒）
+    metrics_db_path: str = "data/metrics.db"
+    metrics_publish_seconds: float = 5.0
 
     class Config:
         env_file = ".env"
@@ -1,6 +1,8 @@
-from fastapi import APIRouter
-from src.types import GenerateRequest, GenerateResponse
-from src.services.claude_service import generate_product
+from fastapi import APIRouter, HTTPException
+from src.types import BatchGenerateRequest, BatchJobStatus, GenerateRequest, GenerateResponse, InstantGenerateResponse
+from src.services import batch_service
+from src.services.claude_service import generate_product, generation_cache, generation_flight, get_router
+from src.services.idea_catalog import idea_catalog
 
 router = APIRouter()
 
@@ -8,3 +10,43 @@ router = APIRouter()
 @router.post("/generate", response_model=GenerateResponse)
 async def generate(request: GenerateRequest) -> GenerateResponse:
     return await generate_product(request)
+
+
+@router.post("/generate/instant", response_model=InstantGenerateResponse)
+async def generate_instant(request: GenerateRequest) -> InstantGenerateResponse:
+    """事前生成したカタログから近い条件の案を即座に返す。画面は並行して /generate で新しく生成する"""
+    match = idea_catalog.lookup(request.category, request.target)
+    if match is None:
+        raise HTTPException(status_code=404, detail="no similar idea in catalog")
+    return InstantGenerateResponse(
+        **match.entry.result.model_dump(),
+        matchedTarget=match.entry.target,
+        similarity=round(match.similarity, 3),
+        generatedAt=match.entry.generated_at,
+    )
+
+
+@router.post("/generate/batch", response_model=BatchJobStatus, status_code=202)
+async def generate_batch(request: BatchGenerateRequest) -> BatchJobStatus:
+    if not request.requests:
+        raise HTTPException(status_code=400, detail="requests must not be empty")
+    job = await batch_service.submit_batch(request.requests)
+    return job.to_status()
+
+
+@router.get("/generate/batch/{job_id}", response_model=BatchJobStatus)
+async def get_batch(job_id: str) -> BatchJobStatus:
+    status = await batch_service.get_job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return status
+
+
+@router.get("/generate/stats")
+async def generate_stats() -> dict:
+    return {
+        "cache": generation_cache.stats(),
+        "singleflight": generation_flight.stats(),
+        "llm": get_router().to_dict(),
+        "catalog": idea_catalog.stats(),
+    }
@@ -1,32 +1,246 @@
-from fastapi import APIRouter
-from src.types import DashboardSummary, SettingsRequest
-from src.services.gumroad_service import fetch_sales
+import asyncio
+import hmac
+import time
+from datetime import date
+from typing import AsyncIterator
+from urllib.parse import parse_qs
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from src.types import DashboardSummary, SalesAnalytics, SettingsRequest
+from src.services.aggregation import Granularity
+from src.services.gumroad_service import month_key, parse_ping
+from src.services.sales_analytics import CompareTo, build_analytics
+from src.services.sales_ledger import get_sales_ledger
+from src.services.metrics import GUMROAD_PINGS
+from src.services.sales_store import SalesStore
+from src.services.sales_stream import format_event, sales_broadcaster
+from src.services.sales_sync import sales_sync
+from src.services.tenant_store import (
+    DEFAULT_TENANT,
+    TENANT_PATTERN,
+    TenantSettings,
+    get_tenant_store,
+    hash_key,
+    load_key_hash,
+    load_tenant_settings,
+)
 from src.config import settings
 
 router = APIRouter()
 
-_user_settings = {
-    "gumroad_token": "",
-    "monthly_goal": 100000,
-}
+# /api/sales/stream の ?token= の有効期間（接続するときだけ確かめる）
+_STREAM_TOKEN_SECONDS = 60
+
+
+async def get_tenant(
+    x_tenant_id: str | None = Header(None, pattern=TENANT_PATTERN),
+    authorization: str | None = Header(None),
+) -> str:
+    """X-Tenant-Idヘッダーのテナント。無ければ既定のテナント
+
+    既定以外のテナントは、そのテナントのAPIキー（scripts/create_tenant.pyで発行）を
+    Authorization: Bearer <キー> で送ったときだけ使える。
+    """
+    if x_tenant_id is None or x_tenant_id == DEFAULT_TENANT:
+        return DEFAULT_TENANT
+    key_hash = await load_key_hash(x_tenant_id)
+    scheme, _, key = (authorization or "").partition(" ")
+    if key_hash is None or scheme.lower() != "bearer" or not hmac.compare_digest(hash_key(key), key_hash):
+        raise HTTPException(status_code=401, detail="invalid tenant key", headers={"WWW-Authenticate": "Bearer"})
+    return x_tenant_id
+
+
+async def get_stream_tenant(
+    tenant: str | None = Query(None, pattern=TENANT_PATTERN),
+    token: str = Query(""),
+) -> str:
+    """ヘッダーを付けられないEventSource向けに ?tenant= と ?token=（POST /api/sales/stream-token で発行）で確かめる"""
+    if tenant is None or tenant == DEFAULT_TENANT:
+        return DEFAULT_TENANT
+    key_hash = await load_key_hash(tenant)
+    expires, _, signature = token.partition(".")
+    if key_hash is None or not expires.isdigit() or int(expires) < time.time():
+        raise HTTPException(status_code=401, detail="invalid stream token")
+    expected = stream_token_signature(key_hash, tenant, expires)
+    if not hmac.compare_digest(signature.encode("utf-8"), expected.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="invalid stream token")
+    return tenant
+
+
+def stream_token_signature(key_hash: str, tenant: str, expires: str) -> str:
+    # サーバーだけが持つキーのハッシュで署名するので、キーを置き換えると発行済みのトークンも使えなくなる
+    return hmac.new(key_hash.encode("utf-8"), f"{tenant}:{expires}".encode("utf-8"), "sha256").hexdigest()
 
 
 @router.get("/sales", response_model=DashboardSummary)
-async def get_sales() -> DashboardSummary:
-    token = _user_settings["gumroad_token"] or settings.gumroad_access_token
-    return await fetch_sales(token, _user_settings["monthly_goal"])
+async def get_sales(
+    month: str | None = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    tenant: str = Depends(get_tenant),
+) -> DashboardSummary:
+    tenant_settings = await load_tenant_settings(tenant)
+    return await sales_sync.get(tenant_settings.access_token(tenant), tenant_settings.monthly_goal, month)
+
+
+# 日単位で10年分まで（0で埋めた系列が大きくなりすぎないように）
+_MAX_ANALYTICS_DAYS = 3660
+
+
+@router.get("/sales/analytics", response_model=SalesAnalytics)
+async def get_sales_analytics(
+    start: date = Query(alias="from"),
+    end: date = Query(alias="to"),
+    granularity: Granularity = "day",
+    compare_to: CompareTo | None = None,
+    tenant: str = Depends(get_tenant),
+) -> SalesAnalytics:
+    """[from, to]（toを含む）の売上を日・週・月ごとに集計し、指定があれば比較期間と並べる
+
+    売上を追加するたびに更新している日・商品ごとの集計表を読むので、期間が長くても売上を読み直さない。
+    """
+    if start > end:
+        raise HTTPException(status_code=422, detail="from must not be after to")
+    if (end - start).days >= _MAX_ANALYTICS_DAYS:
+        raise HTTPException(status_code=422, detail=f"range must be shorter than {_MAX_ANALYTICS_DAYS} days")
+
+    tenant_settings = await load_tenant_settings(tenant)
+    account = await sales_sync.ensure_synced(tenant_settings.access_token(tenant))
+    store = get_sales_ledger().store if account is not None else None
+    return await asyncio.to_thread(build_analytics, store, account or "", start, end, granularity, compare_to)
+
+
+@router.post("/sales/stream-token")
+async def create_stream_token(tenant: str = Depends(get_tenant)) -> dict:
+    """/api/sales/stream?tenant=<テナント>&token=<token> に付けるトークン（既定のテナントには要らない）"""
+    if tenant == DEFAULT_TENANT:
+        return {"token": "", "expiresIn": 0}
+    expires = str(int(time.time()) + _STREAM_TOKEN_SECONDS)
+    signature = stream_token_signature(await load_key_hash(tenant), tenant, expires)
+    return {"token": f"{expires}.{signature}", "expiresIn": _STREAM_TOKEN_SECONDS}
+
+
+@router.get("/sales/stream")
+async def stream_sales(
+    month: str | None = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    tenant: str = Depends(get_stream_tenant),
+) -> StreamingResponse:
+    """売上の変化をServer-Sent Eventsで送る
+
+    最初に全体（snapshot）を送り、以降は変わった商品・日付の最新の値（delta）だけを送る。
+    送信が追いつかなかったときは、もう一度snapshotを送る。
+    """
+    tenant_settings = await load_tenant_settings(tenant)
+    access_token = tenant_settings.access_token(tenant)
+    monthly_goal = tenant_settings.monthly_goal
+
+    async def events() -> AsyncIterator[bytes]:
+        async with sales_broadcaster.subscribe(SalesStore.account_key(access_token), month_key(month)) as subscriber:
+            # 購読してからsnapshotを読むので、その間の変化も取りこぼさない（deltaは最新の値なので重なってもよい）
+            summary = await sales_sync.get(access_token, monthly_goal, month)
+            yield format_event("snapshot", summary.model_dump(mode="json"))
+            while True:
+                try:
+                    await asyncio.wait_for(subscriber.ready.wait(), settings.sales_stream_keepalive_seconds)
+                except TimeoutError:
+                    # 途中のプロキシに切られないよう、コメント行を送る
+                    yield b": keepalive\n\n"
+                    continue
+                subscriber.ready.clear()
+                if subscriber.resync:
+                    subscriber.resync = False
+                    summary = await sales_sync.get(access_token, monthly_goal, month)
+                    yield format_event("snapshot", summary.model_dump(mode="json"))
+                while subscriber.queue:
+                    yield subscriber.queue.popleft()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def ping_secret(tenant: str) -> str:
+    """Ping URLに付ける秘密。テナントごとに別の値にして、他のテナントの売上として送れないようにする"""
+    if tenant == DEFAULT_TENANT:
+        return settings.gumroad_ping_secret
+    return hmac.new(settings.gumroad_ping_secret.encode("utf-8"), tenant.encode("utf-8"), "sha256").hexdigest()[:32]
+
+
+@router.post("/gumroad/ping")
+async def gumroad_ping(
+    request: Request,
+    secret: str = Query(""),
+    tenant: str = Query(DEFAULT_TENANT, pattern=TENANT_PATTERN),
+) -> dict:
+    """GumroadのPing（売上の通知）を受け取り、テナントの売上の累計に反映する
+
+    GumroadのPingには署名が無いので、Ping URLに秘密とテナントを付けて登録する:
+    https://<ホスト>/api/gumroad/ping?secret=<pingSecret>&tenant=<テナント>
+    秘密は既定のテナントならGUMROAD_PING_SECRET、他のテナントはAPIキー付きの GET /api/settings で確かめる。
+    """
+    if not settings.gumroad_ping_secret:
+        raise HTTPException(status_code=404, detail="ping is not configured")
+    if not hmac.compare_digest(secret.encode("utf-8"), ping_secret(tenant).encode("utf-8")):
+        GUMROAD_PINGS.inc(1, "rejected")
+        raise HTTPException(status_code=403, detail="invalid secret")
+
+    # フォーム形式（python-multipartに依存しないよう自前で読む）
+    fields = {name: values[0] for name, values in parse_qs((await request.body()).decode("utf-8")).items()}
+    if tenant == DEFAULT_TENANT and settings.gumroad_seller_id and fields.get("seller_id") != settings.gumroad_seller_id:
+        GUMROAD_PINGS.inc(1, "rejected")
+        raise HTTPException(status_code=403, detail="unknown seller")
+    if fields.get("test") == "true":
+        GUMROAD_PINGS.inc(1, "test")
+        return {"status": "test"}
+    try:
+        sale = parse_ping(fields)
+    except ValueError as e:
+        GUMROAD_PINGS.inc(1, "rejected")
+        raise HTTPException(status_code=422, detail=str(e))
+
+    tenant_settings = await load_tenant_settings(tenant)
+    access_token = tenant_settings.access_token(tenant)
+    if not access_token:
+        # トークンが無いテナントの売上はダッシュボードに出ないので受け取らない
+        GUMROAD_PINGS.inc(1, "rejected")
+        raise HTTPException(status_code=404, detail="unknown tenant")
+    outcome = "recorded" if await sales_sync.record_ping(access_token, sale) else "duplicate"
+    GUMROAD_PINGS.inc(1, outcome)
+    return {"status": outcome}
+
+
+def require_admin(authorization: str | None) -> None:
+    """既定のテナントはヘッダーだけで誰でも使えるので、その設定の書き込みはADMIN_API_KEYを送ったときだけ受け付ける"""
+    if not settings.admin_api_key:
+        raise HTTPException(status_code=403, detail="ADMIN_API_KEY is not configured")
+    scheme, _, key = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(key.encode("utf-8"), settings.admin_api_key.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="invalid admin key", headers={"WWW-Authenticate": "Bearer"})
 
 
 @router.post("/settings")
-async def save_settings(request: SettingsRequest) -> dict:
-    _user_settings["gumroad_token"] = request.gumroadToken
-    _user_settings["monthly_goal"] = request.monthlyGoal
+async def save_settings(
+    request: SettingsRequest,
+    tenant: str = Depends(get_tenant),
+    authorization: str | None = Header(None),
+) -> dict:
+    if tenant == DEFAULT_TENANT:
+        require_admin(authorization)
+    previous = await load_tenant_settings(tenant)
+    tenant_settings = TenantSettings(gumroad_token=request.gumroadToken, monthly_goal=request.monthlyGoal)
+    await asyncio.to_thread(get_tenant_store().save, tenant, tenant_settings)
+    if previous.access_token(tenant) and previous.access_token(tenant) != tenant_settings.access_token(tenant):
+        sales_sync.forget(previous.access_token(tenant))
     return {"status": "ok"}
 
 
 @router.get("/settings")
-async def get_settings() -> dict:
+async def get_settings(tenant: str = Depends(get_tenant)) -> dict:
+    tenant_settings = await load_tenant_settings(tenant)
     return {
-        "gumroadToken": "***" if _user_settings["gumroad_token"] else "",
-        "monthlyGoal": _user_settings["monthly_goal"],
+        "gumroadToken": "***" if tenant_settings.gumroad_token else "",
+        "monthlyGoal": tenant_settings.monthly_goal,
+        # 既定のテナントの秘密は環境変数そのものなので返さない（認証なしで誰でも読めるため）
+        "pingSecret": ping_secret(tenant) if settings.gumroad_ping_secret and tenant != DEFAULT_TENANT else "",
     }
@@ -0,0 +1,149 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from src.services.metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_WAIT
+
+
+class Overloaded(Exception):
+    """順番待ちが溢れた、または期限までに順番が来なかった（503 Retry-Afterで返す）"""
+
+    def __init__(self, provider: str, reason: str, retry_after: int):
+        super().__init__(f"{provider} is overloaded ({reason})")
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """1分あたりper_minuteずつ補充され、最大per_minuteまで貯まる。0なら制限しない"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        """amountを取り出せるまでの秒数"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # 容量を超える要求は満タンになれば通す
+        return max(0.0, min(amount, self.capacity) - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.rate > 0:
+            self.tokens -= min(amount, self.capacity)
+
+
+class AdmissionController:
+    """プロバイダーごとのLLM呼び出しの流量制御
+
+    同時実行数とリクエスト数・入力トークン数のトークンバケットを満たすまで先着順に待たせる。
+    待ちがmax_queueを超えたとき、期限までにトークンが貯まらないときは即座に、
+    queue_timeout秒以内に順番が来なければその時点でOverloadedを送出する。
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+    ):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self.rejected = 0
+        self._queue: deque[object] = deque()
+        self._cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def admit(self, tokens: int) -> AsyncIterator[None]:
+        start = time.perf_counter()
+        async with self._cond:
+            # 待ちが無く枠も空いていれば並ばずに通す
+            if self._queue or self._delay(tokens) > 0:
+                await self._wait_in_queue(tokens, start)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            self._update_gauges()
+        ADMISSION_WAIT.observe(time.perf_counter() - start, self.provider, "admitted")
+
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.in_flight -= 1
+                self._update_gauges()
+                self._cond.notify_all()
+
+    async def _wait_in_queue(self, tokens: int, start: float) -> None:
+        if len(self._queue) >= self.max_queue:
+            self._reject("queue_full", start)
+        waiter = object()
+        self._queue.append(waiter)
+        self._update_gauges()
+        deadline = time.monotonic() + self.queue_timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                delay = remaining
+                if self._queue[0] is waiter:
+                    delay = self._delay(tokens)
+                    if delay == 0:
+                        return
+                    if math.isfinite(delay) and delay > remaining:
+                        # 期限までにトークンが貯まらないので待たずに断る
+                        self._reject("rate_limited", start, math.ceil(delay))
+                if remaining <= 0:
+                    self._reject("timeout", start)
+                try:
+                    await asyncio.wait_for(self._cond.wait(), min(delay, remaining))
+                except TimeoutError:
+                    pass
+        finally:
+            self._queue.remove(waiter)
+            self._update_gauges()
+            # 先頭が抜けたので次の待ちを起こす
+            self._cond.notify_all()
+
+    def _delay(self, tokens: int) -> float:
+        """今すぐ通せるなら0、同時実行の枠待ちならinf、それ以外はトークンが貯まるまでの秒数"""
+        if self.in_flight >= self.max_concurrency:
+            return math.inf
+        return max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def retry_after(self) -> int:
+        """今の待ちが捌けるまでのおおよその秒数"""
+        return max(1, math.ceil(self.requests.wait_time(len(self._queue) + 1)), math.ceil(self.queue_timeout / 2))
+
+    def to_dict(self) -> dict:
+        return {"inFlight": self.in_flight, "queued": len(self._queue), "rejected": self.rejected}
+
+    def _reject(self, reason: str, start: float, retry_after: int | None = None) -> None:
+        self.rejected += 1
+        ADMISSION_WAIT.observe(time.perf_counter() - start, self.provider, reason)
+        raise Overloaded(self.provider, reason, max(retry_after or 0, self.retry_after()))
+
+    def _update_gauges(self) -> None:
+        ADMISSION_QUEUE_DEPTH.set(len(self._queue), self.provider)
+        ADMISSION_IN_FLIGHT.set(self.in_flight, self.provider)
+
+
+def estimate_tokens(prompt: str) -> int:
+    """入力トークン数の概算。日本語はほぼ1文字1トークンなので文字数で数える"""
+    return len(prompt)
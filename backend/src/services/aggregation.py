@@ -0,0 +1,86 @@
+from typing import Literal
+
+import numpy as np
+
+from src.types import DailySales, ProductSales
+
+Granularity = Literal["day", "week", "month"]
+
+
+class SalesColumns:
+    """売上を列形式（NumPy配列）で保持し、集計をまとめて計算する"""
+
+    def __init__(self, product_names: list[str], product_codes: np.ndarray, prices: np.ndarray, days: np.ndarray):
+        self.product_names = product_names
+        self.product_codes = product_codes
+        self.prices = prices
+        self.days = days
+
+    @classmethod
+    def from_rows(cls, rows: list[tuple[str, int, str]]) -> "SalesColumns":
+        """(product_name, price, created_at) の行から列を組み立てる"""
+        if not rows:
+            return cls([], np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, "datetime64[D]"))
+
+        names, prices, created_at = zip(*rows)
+        # 文字列のソートを避け、出現順に商品コードを振る
+        code_of: dict[str, int] = {}
+        product_codes = np.fromiter(
+            (code_of.setdefault(name, len(code_of)) for name in names), dtype=np.int64, count=len(names)
+        )
+        # U10へのキャストで "YYYY-MM-DDTHH:MM:SSZ" を日付部分に切り詰める
+        days = np.array(created_at, dtype="U10").astype("datetime64[D]")
+        return cls(list(code_of), product_codes, np.array(prices, dtype=np.int64), days)
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    @property
+    def total_revenue(self) -> int:
+        return int(self.prices.sum())
+
+    def by_product(self) -> list[ProductSales]:
+        """売上金額の降順"""
+        size = len(self.product_names)
+        counts = np.bincount(self.product_codes, minlength=size)
+        revenue = _sum_by(self.product_codes, self.prices, size)
+        order = np.argsort(-revenue, kind="stable")
+        return [
+            ProductSales(productName=self.product_names[i], count=int(counts[i]), revenue=int(revenue[i]))
+            for i in order
+        ]
+
+    def by_period(self, granularity: Granularity = "day") -> list[tuple[str, int, int]]:
+        """期間の開始日ごとの (開始日, 件数, 売上金額)。期間の昇順"""
+        if len(self) == 0:
+            return []
+        # 日付を最小日からの日数に変換し、ソートせずにbincountで集計する
+        day_numbers = period_start(self.days, granularity).astype(np.int64)
+        first_day = day_numbers.min()
+        codes = day_numbers - first_day
+        counts = np.bincount(codes)
+        revenue = _sum_by(codes, self.prices, len(counts))
+        present = np.flatnonzero(counts)
+        keys = (present + first_day).astype("datetime64[D]")
+        return [
+            (str(key), int(count), int(amount))
+            for key, count, amount in zip(keys, counts[present], revenue[present])
+        ]
+
+    def daily_sales(self) -> list[DailySales]:
+        return [DailySales(date=day, revenue=revenue) for day, _, revenue in self.by_period("day")]
+
+
+def period_start(days: np.ndarray, granularity: Granularity) -> np.ndarray:
+    if granularity == "month":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    if granularity == "week":
+        # 1970-01-01は木曜日。月曜始まりの週に揃える
+        day_numbers = days.astype(np.int64)
+        return (day_numbers - (day_numbers + 3) % 7).astype("datetime64[D]")
+    return days
+
+
+def _sum_by(codes: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    # bincountはfloat64で合計する。2**53未満（約90兆円）までは整数として正確
+    return np.rint(np.bincount(codes, weights=values, minlength=size)).astype(np.int64)
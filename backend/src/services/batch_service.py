@@ -0,0 +1,201 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timezone
+
+from src.config import settings
+from src.services import claude_service
+from src.services.admission import Overloaded
+from src.services.cache import SQLiteCache
+from src.services.metrics import upstream_call
+from src.types import BatchJobStatus, GenerateRequest, GenerateResponse
+
+
+class BatchJob:
+    def __init__(self, requests: list[GenerateRequest], mode: str):
+        self.id = uuid.uuid4().hex
+        self.requests = requests
+        self.mode = mode
+        self.status = "queued"
+        self.results: list[GenerateResponse | None] = [None] * len(requests)
+        self.errors: list[str | None] = [None] * len(requests)
+        self.failed = 0
+        self.created_at = datetime.now(timezone.utc)
+        self.batch_id: str | None = None
+        # 共有する状態の書き込みを順に行う（先に取った古い状態が後から書かれないように）
+        self.publish_lock = asyncio.Lock()
+
+    @property
+    def completed(self) -> int:
+        return sum(result is not None for result in self.results)
+
+    def fail_item(self, index: int, error: str) -> None:
+        self.errors[index] = error
+        self.failed += 1
+
+    def to_status(self) -> BatchJobStatus:
+        finished = self.status in ("completed", "failed")
+        return BatchJobStatus(
+            jobId=self.id,
+            status=self.status,
+            mode=self.mode,
+            total=len(self.requests),
+            completed=self.completed,
+            failed=self.failed,
+            results=self.results if finished else None,
+            errors=self.errors if finished else None,
+            createdAt=self.created_at,
+        )
+
+
+_jobs: dict[str, BatchJob] = {}
+_tasks: set[asyncio.Task] = set()
+
+# 複数のワーカーで動かすと状態の問い合わせが別のワーカーに届くので、キャッシュと同じくSQLiteで共有する
+_shared_jobs = (
+    SQLiteCache(os.path.join(settings.cache_dir, "batch_jobs.db"), settings.cache_max_entries)
+    if settings.cache_backend == "sqlite"
+    else None
+)
+
+
+async def submit_batch(requests: list[GenerateRequest]) -> BatchJob:
+    """一括生成ジョブを登録し、バックグラウンドで実行する"""
+    _prune_jobs()
+    use_batches = bool(settings.anthropic_api_key) and settings.use_message_batches
+    job = BatchJob(requests, "batch" if use_batches else "fanout")
+    _jobs[job.id] = job
+    await _publish(job)
+
+    task = asyncio.create_task(_run(job))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job
+
+
+async def get_job_status(job_id: str) -> BatchJobStatus | None:
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job.to_status()
+    if _shared_jobs is not None:
+        # 他のワーカーが実行しているジョブ（SQLiteはロックを待つことがあるのでスレッドで読む）
+        status = await asyncio.to_thread(_shared_jobs.get, job_id)
+        if status is not None:
+            return BatchJobStatus.model_validate_json(status)
+    return None
+
+
+async def _publish(job: BatchJob) -> None:
+    if _shared_jobs is None:
+        return
+    async with job.publish_lock:
+        status = job.to_status().model_dump_json()
+        await asyncio.to_thread(_shared_jobs.set, job.id, status, settings.batch_job_ttl_seconds)
+
+
+def _prune_jobs() -> None:
+    now = datetime.now(timezone.utc)
+    for job_id, job in list(_jobs.items()):
+        finished = job.status in ("completed", "failed")
+        if finished and (now - job.created_at).total_seconds() > settings.batch_job_ttl_seconds:
+            del _jobs[job_id]
+
+
+async def _run(job: BatchJob) -> None:
+    job.status = "running"
+    await _publish(job)
+    try:
+        if job.mode == "batch":
+            await _run_message_batch(job)
+        else:
+            await _run_fanout(job)
+        job.status = "completed"
+    except Exception as e:
+        print(f"Batch job {job.id} failed: {e!r}")
+        job.status = "failed"
+    await _publish(job)
+
+
+async def _run_fanout(job: BatchJob) -> None:
+    """Message Batchesが使えない場合は、同時実行数を絞って1件ずつ生成する"""
+    semaphore = asyncio.Semaphore(settings.batch_concurrency)
+
+    async def run_one(index: int, request: GenerateRequest) -> None:
+        async with semaphore:
+            while True:
+                try:
+                    result, source = await claude_service.generate_product_with_source(request)
+                    if source in ("fallback", "mock"):
+                        # LLMで生成できなかった（モックの結果）ものは、Message Batchesと同じく失敗として返す
+                        job.fail_item(index, source)
+                    else:
+                        job.results[index] = result
+                    break
+                except Overloaded as e:
+                    # 裏で動くジョブなので、混雑で断られたら待って並び直す
+                    await asyncio.sleep(e.retry_after)
+                except Exception as e:
+                    # 1件の失敗でジョブ全体（と完了済みの結果）を失わないよう、その要素だけ失敗にする
+                    print(f"Batch job {job.id} item {index} failed: {e!r}")
+                    job.fail_item(index, repr(e))
+                    break
+            await _publish(job)
+
+    await asyncio.gather(*(run_one(i, request) for i, request in enumerate(job.requests)))
+
+
+async def _run_message_batch(job: BatchJob) -> None:
+    pending: dict[str, int] = {}
+    batch_requests = []
+    for index, request in enumerate(job.requests):
+        cache_key = claude_service.generation_cache_key(request)
+        cached = None if request.fresh else await claude_service.generation_cache.aget(cache_key)
+        if cached is not None:
+            job.results[index] = GenerateResponse.model_validate_json(cached)
+            continue
+        try:
+            prompt = claude_service.build_prompt(request)
+        except Exception as e:
+            job.fail_item(index, repr(e))
+            continue
+        pending[str(index)] = index
+        batch_requests.append(
+            {
+                "custom_id": str(index),
+                "params": {
+                    "model": claude_service.MODEL,
+                    "max_tokens": 1024,
+                    "messages": [{"role": "user", "content": prompt}],
+                },
+            }
+        )
+    if not batch_requests:
+        return
+
+    batches = claude_service.get_client().beta.messages.batches
+    with upstream_call("anthropic", "batches.create"):
+        batch = await batches.create(requests=batch_requests)
+    job.batch_id = batch.id
+    while batch.processing_status != "ended":
+        await asyncio.sleep(settings.batch_poll_interval)
+        batch = await batches.retrieve(batch.id)
+
+    async for entry in await batches.results(batch.id):
+        index = pending.pop(entry.custom_id, None)
+        if index is None:
+            continue
+        if entry.result.type != "succeeded":
+            job.fail_item(index, entry.result.type)
+            continue
+        result = claude_service.parse_generate_response(entry.result.message.content[0].text)
+        if result is None:
+            job.fail_item(index, "invalid_json")
+            continue
+        await claude_service.generation_cache.aset(
+            claude_service.generation_cache_key(job.requests[index]), result.model_dump_json()
+        )
+        job.results[index] = result
+
+    # 結果が返ってこなかった要素
+    for index in pending.values():
+        job.fail_item(index, "missing")
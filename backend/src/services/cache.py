@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Protocol
+
+from src.config import settings
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> str | None: ...
+
+    def set(self, key: str, value: str, ttl: float) -> None: ...
+
+
+class MemoryCache:
+    """件数上限付きのLRUキャッシュ（TTL付き）"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteCache:
+    """再起動後も残るSQLiteキャッシュ（最終アクセス順で件数上限を維持）
+
+    WALモードで開くので、複数のワーカー（プロセス）で同じファイルを共有できる。
+    読み出しのたびに書き込まないよう、最終アクセス時刻はTOUCH_INTERVAL秒ごとにしか更新しない。
+    """
+
+    TOUCH_INTERVAL = 60.0
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, expires_at, accessed_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            if now - row[2] > self.TOUCH_INTERVAL:
+                self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+
+class ResponseCache:
+    def __init__(self, backend: CacheBackend | None, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(version: str, **fields: str | None) -> str:
+        normalized = {name: _normalize(value) for name, value in sorted(fields.items())}
+        raw = json.dumps([version, normalized], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        if self.backend is None:
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        if self.backend is not None:
+            self.backend.set(key, value, self.ttl)
+
+    async def aget(self, key: str) -> str | None:
+        """イベントループから呼ぶget。SQLiteはロックを待つことがあるのでスレッドで読む"""
+        if isinstance(self.backend, SQLiteCache):
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    async def aset(self, key: str, value: str) -> None:
+        """イベントループから呼ぶset（agetと同じくSQLiteはスレッドで書く）"""
+        if isinstance(self.backend, SQLiteCache):
+            await asyncio.to_thread(self.set, key, value)
+        else:
+            self.set(key, value)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else "disabled",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / total if total else 0.0,
+        }
+
+
+def _normalize(value: str | None) -> str:
+    if not value:
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", value).split()).lower()
+
+
+def build_cache(name: str) -> ResponseCache:
+    backend: CacheBackend | None
+    if settings.cache_backend == "sqlite":
+        path = os.path.join(settings.cache_dir, f"{name}.db")
+        backend = SQLiteCache(path, settings.cache_max_entries)
+    elif settings.cache_backend == "memory":
+        backend = MemoryCache(settings.cache_max_entries)
+    else:
+        backend = None
+    return ResponseCache(backend, settings.cache_ttl_seconds)
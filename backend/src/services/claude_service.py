@@ -1,14 +1,38 @@
-import json
+import time
 import anthropic
+import httpx
 from src.config import settings
+from src.services.admission import AdmissionController, Overloaded, estimate_tokens
+from src.services.cache import build_cache
+from src.services.gemini_service import GeminiProvider
+from src.services.json_extract import ExtractionError, JSONObjectExtractor, extract_json_object, model_validators
+from src.services.llm_router import LLMRouter, Provider
+from src.services.metrics import GENERATION_DURATION, UPSTREAM_TTFT, span, upstream_call
+from src.services.singleflight import SingleFlight
 from src.types import GenerateRequest, GenerateResponse
 
+MODEL = "claude-haiku-4-5-20241022"
+# プロンプトを変更したら更新する（キャッシュキーに含まれる）
+PROMPT_VERSION = "1"
+
+# 出力を解析できなかったときに再試行のプロンプトへ付け足す
+RETRY_INSTRUCTION = """
+
+前回の出力は「{reason}」のため解析できませんでした。上記の形式のJSONのみを出力し直してください。"""
 
 CATEGORY_LABELS = {
     "prompt": "AIプロンプト集",
     "notion": "Notionテンプレート",
     "canva": "Canvaテンプレート",
     "ebook": "電子書籍",
+    "excel": "Excelテンプレート",
+    "spreadsheet": "スプレッドシート",
+    "powerpoint": "PowerPointテンプレート",
+    "figma": "Figmaテンプレート",
+    "checklist": "チェックリスト/ワークシート",
+    "linestamp": "LINEスタンプ",
+    "icon": "アイコンセット",
+    "course": "オンラインコース",
 }
 
 PRICE_RANGES = {
@@ -16,19 +40,154 @@ PRICE_RANGES = {
     "notion": (500, 1500),
     "canva": (800, 2000),
     "ebook": (500, 1980),
+    "excel": (500, 1500),
+    "spreadsheet": (500, 1500),
+    "powerpoint": (800, 2000),
+    "figma": (1500, 5000),
+    "checklist": (300, 980),
+    "linestamp": (120, 480),
+    "icon": (500, 2000),
+    "course": (3000, 30000),
 }
 
+# GenerateResponseの各項目を、値が閉じた時点で検証する
+PRODUCT_FIELDS = model_validators(GenerateResponse)
+
+
+_client: anthropic.AsyncAnthropic | None = None
+_router: LLMRouter | None = None
+
+generation_cache = build_cache("generate")
+generation_flight = SingleFlight()
+
+
+def init_client() -> anthropic.AsyncAnthropic:
+    """プロセス共通のAsyncAnthropicクライアントを生成する（lifespanから呼ばれる）"""
+    global _client
+    if _client is None:
+        _client = anthropic.AsyncAnthropic(
+            api_key=settings.anthropic_api_key,
+            base_url=settings.anthropic_base_url or None,
+            timeout=settings.anthropic_timeout,
+            max_retries=settings.anthropic_max_retries,
+            http_client=anthropic.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=settings.anthropic_max_connections,
+                    max_keepalive_connections=settings.anthropic_max_keepalive_connections,
+                ),
+            ),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client, _router
+    if _router is not None:
+        await _router.aclose()
+        _router = None
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def get_client() -> anthropic.AsyncAnthropic:
+    return _client or init_client()
+
+
+class ClaudeProvider:
+    name = "claude"
+
+    def __init__(self) -> None:
+        self.admission = AdmissionController(
+            self.name,
+            max_concurrency=settings.llm_max_concurrency,
+            max_queue=settings.llm_queue_size,
+            queue_timeout=settings.llm_queue_timeout,
+            requests_per_minute=settings.anthropic_requests_per_minute / settings.workers,
+            tokens_per_minute=settings.anthropic_tokens_per_minute / settings.workers,
+        )
+
+    async def generate(self, prompt: str) -> GenerateResponse:
+        async with self.admission.admit(estimate_tokens(prompt)):
+            return await _stream_product(get_client(), prompt)
+
+    async def aclose(self) -> None:
+        # クライアントはclose_clientで閉じる
+        pass
+
+
+def get_router() -> LLMRouter:
+    """APIキーが設定されているプロバイダーを、LLM_PROVIDERSの順で使うルーター"""
+    global _router
+    if _router is None:
+        available: dict[str, Provider] = {}
+        if settings.anthropic_api_key:
+            available["claude"] = ClaudeProvider()
+        if settings.gemini_api_key:
+            available["gemini"] = GeminiProvider(PRODUCT_FIELDS)
+        names = [name.strip() for name in settings.llm_providers.split(",")]
+        _router = LLMRouter(
+            [available[name] for name in names if name in available],
+            hedge=settings.llm_hedge,
+            hedge_min_delay=settings.llm_hedge_min_delay,
+            hedge_max_delay=settings.llm_hedge_max_delay,
+            window=settings.llm_stats_window,
+            unhealthy_error_rate=settings.llm_unhealthy_error_rate,
+            cooldown=settings.llm_unhealthy_cooldown,
+        )
+    return _router
+
 
 async def generate_product(request: GenerateRequest) -> GenerateResponse:
-    if not settings.anthropic_api_key:
-        return _generate_mock_response(request)
+    result, _ = await generate_product_with_source(request)
+    return result
+
+
+async def generate_product_with_source(request: GenerateRequest) -> tuple[GenerateResponse, str]:
+    """generate_productと同じ経路で生成し、(生成結果, 出どころ) を返す（カタログの作成などで使う）"""
+    start = time.perf_counter()
+    result, source = await _generate_product(request)
+    GENERATION_DURATION.observe(time.perf_counter() - start, request.category, source)
+    return result, source
+
+
+async def _generate_product(request: GenerateRequest) -> tuple[GenerateResponse, str]:
+    """(生成結果, 出どころ) を返す。出どころは llm / cache / mock / fallback"""
+    if not get_router().providers:
+        return _generate_mock_response(request), "mock"
 
-    client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+    cache_key = generation_cache_key(request)
+    if not request.fresh:
+        cached = await generation_cache.aget(cache_key)
+        if cached is not None:
+            return GenerateResponse.model_validate_json(cached), "cache"
 
+    if request.fresh:
+        # 新しく生成したいので、実行中の同じ条件の呼び出し（キャッシュ相当の結果）には相乗りしない
+        result = await _generate_with_llm(request)
+    else:
+        result = await generation_flight.do(cache_key, lambda: _generate_with_llm(request))
+    if result is None:
+        return _generate_mock_response(request), "fallback"
+
+    await generation_cache.aset(cache_key, result.model_dump_json())
+    return result, "llm"
+
+
+def generation_cache_key(request: GenerateRequest) -> str:
+    return generation_cache.make_key(
+        f"{MODEL}:{PROMPT_VERSION}",
+        category=request.category,
+        target=request.target,
+        additionalNotes=request.additionalNotes,
+    )
+
+
+def build_prompt(request: GenerateRequest) -> str:
     category_label = CATEGORY_LABELS[request.category]
     price_min, price_max = PRICE_RANGES[request.category]
 
-    prompt = f"""あなたはデジタル商品販売の専門家です。Gumroadで売れる商品を提案してください。
+    return f"""あなたはデジタル商品販売の専門家です。Gumroadで売れる商品を提案してください。
 
 カテゴリ: {category_label}
 ターゲット: {request.target}
@@ -48,22 +207,60 @@ async def generate_product(request: GenerateRequest) -> GenerateResponse:
 - タグは検索で見つかりやすいキーワードを選ぶ
 - JSONのみを出力し、他の説明は不要"""
 
-    message = client.messages.create(
-        model="claude-haiku-4-5-20241022",
-        max_tokens=1024,
-        messages=[{"role": "user", "content": prompt}],
-    )
 
-    response_text = message.content[0].text
+async def _generate_with_llm(request: GenerateRequest) -> GenerateResponse | None:
+    """解析できない出力は途中で打ち切り、理由を添えて再試行する。全プロバイダーが失敗したらNoneを返す
+
+    全プロバイダーが混雑していればOverloadedを送出する。
+    """
+    with span("prompt_build"):
+        prompt = build_prompt(request)
+
+    for attempt in range(settings.generate_max_retries + 1):
+        try:
+            return await get_router().generate(prompt)
+        except ExtractionError as e:
+            print(f"LLM output could not be parsed (attempt {attempt + 1}): {e}")
+            prompt = build_prompt(request) + RETRY_INSTRUCTION.format(reason=e)
+        except Overloaded:
+            # 混雑時はモックで埋めずに503で再試行を促す
+            raise
+        except Exception as e:
+            print(f"LLM generation failed: {e!r}")
+            return None
+    return None
+
+
+async def _stream_product(client: anthropic.AsyncAnthropic, prompt: str) -> GenerateResponse:
+    extractor = JSONObjectExtractor(PRODUCT_FIELDS)
+    start = time.perf_counter()
+    first_token = True
+    with span("llm"), upstream_call("anthropic", "messages.stream") as call:
+        try:
+            async with client.messages.stream(
+                model=MODEL,
+                max_tokens=1024,
+                messages=[{"role": "user", "content": prompt}],
+            ) as stream:
+                async for text in stream.text_stream:
+                    if first_token:
+                        UPSTREAM_TTFT.observe(time.perf_counter() - start, "anthropic")
+                        first_token = False
+                    # オブジェクトが閉じたら残りの出力は読まずに接続を閉じる
+                    if extractor.feed(text):
+                        break
+            fields = extractor.finish()
+        except ExtractionError:
+            call.outcome = "invalid_json"
+            raise
+    return GenerateResponse(**fields)
+
 
+def parse_generate_response(response_text: str) -> GenerateResponse | None:
     try:
-        start = response_text.find("{")
-        end = response_text.rfind("}") + 1
-        json_str = response_text[start:end]
-        data = json.loads(json_str)
-        return GenerateResponse(**data)
-    except (json.JSONDecodeError, ValueError):
-        return _generate_mock_response(request)
+        return GenerateResponse(**extract_json_object(response_text, PRODUCT_FIELDS))
+    except ExtractionError:
+        return None
 
 
 def _generate_mock_response(request: GenerateRequest) -> GenerateResponse:
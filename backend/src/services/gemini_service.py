@@ -0,0 +1,78 @@
+import json
+import time
+
+import httpx
+
+from src.config import settings
+from src.services.admission import AdmissionController, estimate_tokens
+from src.services.json_extract import ExtractionError, JSONObjectExtractor, Validator
+from src.services.metrics import UPSTREAM_TTFT, span, upstream_call
+from src.types import GenerateResponse
+
+
+class GeminiProvider:
+    """Gemini APIのstreamGenerateContent（SSE）で商品案を生成する"""
+
+    name = "gemini"
+
+    def __init__(self, validators: dict[str, Validator]):
+        self.validators = validators
+        self.admission = AdmissionController(
+            self.name,
+            max_concurrency=settings.llm_max_concurrency,
+            max_queue=settings.llm_queue_size,
+            queue_timeout=settings.llm_queue_timeout,
+            requests_per_minute=settings.gemini_requests_per_minute / settings.workers,
+            tokens_per_minute=settings.gemini_tokens_per_minute / settings.workers,
+        )
+        self._client = httpx.AsyncClient(
+            base_url=settings.gemini_base_url,
+            timeout=settings.gemini_timeout,
+            limits=httpx.Limits(
+                max_connections=settings.gemini_max_connections,
+                max_keepalive_connections=settings.gemini_max_keepalive_connections,
+            ),
+        )
+
+    async def generate(self, prompt: str) -> GenerateResponse:
+        async with self.admission.admit(estimate_tokens(prompt)):
+            return await self._generate(prompt)
+
+    async def _generate(self, prompt: str) -> GenerateResponse:
+        payload = {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {"temperature": 0.9, "maxOutputTokens": 1024},
+        }
+        extractor = JSONObjectExtractor(self.validators)
+        start = time.perf_counter()
+        first_token = True
+        with span("llm"), upstream_call("gemini", "streamGenerateContent") as call:
+            try:
+                async with self._client.stream(
+                    "POST",
+                    f"/v1/models/{settings.gemini_model}:streamGenerateContent",
+                    params={"alt": "sse", "key": settings.gemini_api_key},
+                    json=payload,
+                ) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        if first_token:
+                            UPSTREAM_TTFT.observe(time.perf_counter() - start, "gemini")
+                            first_token = False
+                        chunk = json.loads(line[len("data:"):])
+                        parts = chunk["candidates"][0].get("content", {}).get("parts", [])
+                        # オブジェクトが閉じたら残りの出力は読まずに接続を閉じる
+                        if extractor.feed("".join(part.get("text", "") for part in parts)):
+                            break
+                fields = extractor.finish()
+            except ExtractionError:
+                call.outcome = "invalid_json"
+                raise
+        return GenerateResponse(**fields)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
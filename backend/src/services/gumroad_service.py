@@ -1,71 +1,224 @@
+import asyncio
+import contextlib
+import random
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from collections import defaultdict
+from typing import AsyncIterator
 import httpx
-from src.types import DashboardSummary, ProductSales, DailySales
+from src.config import settings
+from src.services.metrics import span, upstream_call
+from src.services.sales_ledger import SalesLedger, get_sales_ledger
+from src.services.sales_store import SalesStore
+from src.types import DashboardSummary, DailySales
 
 
-GUMROAD_API_BASE = "https://api.gumroad.com/v2"
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
 
+# 全ページ取得で同時に投げるGumroadリクエスト数の上限
+_in_flight = asyncio.Semaphore(settings.gumroad_max_in_flight)
 
-async def fetch_sales(access_token: str, monthly_goal: int = 100000) -> DashboardSummary:
-    if not access_token:
-        return _generate_mock_dashboard(monthly_goal)
-
-    async with httpx.AsyncClient() as client:
-        today = datetime.now()
-        first_of_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-        response = await client.get(
-            f"{GUMROAD_API_BASE}/sales",
-            params={
-                "access_token": access_token,
-                "after": first_of_month.isoformat(),
-            },
-            timeout=30.0,
-        )
-
-        if response.status_code != 200:
-            return _generate_mock_dashboard(monthly_goal)
-
-        data = response.json()
-        sales = data.get("sales", [])
-
-        total_revenue = 0
-        product_sales: dict[str, dict] = defaultdict(lambda: {"count": 0, "revenue": 0})
-        daily_sales: dict[str, int] = defaultdict(int)
-
-        for sale in sales:
-            price = int(float(sale.get("price", 0)) * 100)
-            product_name = sale.get("product_name", "Unknown")
-            sale_date = sale.get("created_at", "")[:10]
-
-            total_revenue += price
-            product_sales[product_name]["count"] += 1
-            product_sales[product_name]["revenue"] += price
-            daily_sales[sale_date] += price
-
-        sales_by_product = [
-            ProductSales(productName=name, count=data["count"], revenue=data["revenue"])
-            for name, data in sorted(
-                product_sales.items(), key=lambda x: x[1]["revenue"], reverse=True
-            )
-        ]
 
-        daily_sales_list = [
-            DailySales(date=date, revenue=revenue)
-            for date, revenue in sorted(daily_sales.items())
-        ]
+class GumroadAPIError(Exception):
+    pass
+
 
-        return DashboardSummary(
-            totalSales=len(sales),
-            totalRevenue=total_revenue,
-            monthlyGoal=monthly_goal,
-            salesByProduct=sales_by_product,
-            dailySales=daily_sales_list,
-        )
+class GumroadClients:
+    """アカウントごとのhttpxクライアント（接続プール）
 
+    同期のたびに接続を張り直さず、アカウントの間で接続を共有しない。
+    使われていないものから閉じて、クライアントの数をmax_clientsまでに保つ（使用中のものは返されてから閉じる）。
+    """
 
-def _generate_mock_dashboard(monthly_goal: int) -> DashboardSummary:
+    def __init__(self, max_clients: int):
+        self.max_clients = max_clients
+        self._clients: OrderedDict[str, httpx.AsyncClient] = OrderedDict()
+        self._in_use: dict[httpx.AsyncClient, int] = {}
+        self._retired: set[httpx.AsyncClient] = set()
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, account: str) -> AsyncIterator[httpx.AsyncClient]:
+        client = self._clients.get(account)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=30.0,
+                limits=httpx.Limits(max_connections=settings.gumroad_max_in_flight, max_keepalive_connections=2),
+            )
+            self._clients[account] = client
+        self._clients.move_to_end(account)
+        self._in_use[client] = self._in_use.get(client, 0) + 1
+        retired = self._evict()
+        try:
+            await asyncio.gather(*(retired_client.aclose() for retired_client in retired))
+            yield client
+        finally:
+            self._in_use[client] -= 1
+            if not self._in_use[client]:
+                del self._in_use[client]
+                if client in self._retired:
+                    self._retired.discard(client)
+                    await client.aclose()
+
+    def _evict(self) -> list[httpx.AsyncClient]:
+        """上限を超えた分を外し、すぐに閉じてよいクライアントを返す"""
+        idle = []
+        for account in list(self._clients):
+            if len(self._clients) <= self.max_clients:
+                break
+            client = self._clients.pop(account)
+            if client in self._in_use:
+                self._retired.add(client)
+            else:
+                idle.append(client)
+        return idle
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    async def aclose(self) -> None:
+        clients = [*self._clients.values(), *self._retired]
+        self._clients.clear()
+        self._retired.clear()
+        await asyncio.gather(*(client.aclose() for client in clients))
+
+
+gumroad_clients = GumroadClients(settings.gumroad_max_clients)
+
+
+async def fetch_sales(
+    access_token: str, monthly_goal: int = 100000, month: str | None = None
+) -> DashboardSummary:
+    if not access_token:
+        return generate_mock_dashboard(monthly_goal)
+
+    ledger = get_sales_ledger()
+    account = SalesStore.account_key(access_token)
+    try:
+        with span("gumroad_sync"):
+            await sync_sales(access_token, ledger, account)
+    except (GumroadAPIError, httpx.HTTPError):
+        # 同期に失敗しても、保存済みの売上があればそれで集計する
+        if await asyncio.to_thread(ledger.store.watermark, account) is None:
+            return generate_mock_dashboard(monthly_goal)
+
+    return await read_summary(ledger, account, monthly_goal, month)
+
+
+async def read_summary(ledger: SalesLedger, account: str, monthly_goal: int, month: str | None) -> DashboardSummary:
+    """月の累計から返す（メモリだけを読む）。その月を初めて読むときだけスレッドでストアから集計する"""
+    start, end = _month_range(month)
+    summary = ledger.cached_summary(account, start[:7], monthly_goal)
+    if summary is None:
+        with span("aggregation"):
+            summary = await asyncio.to_thread(ledger.summary, account, start[:7], start, end, monthly_goal)
+    return summary
+
+
+async def sync_sales(access_token: str, ledger: SalesLedger, account: str) -> int:
+    """前回の同期位置より新しい売上だけを取得して追加し、新規だった件数を返す"""
+    watermark = await asyncio.to_thread(ledger.store.watermark, account)
+    after = None
+    if watermark:
+        # afterは日付単位なので、同日分を取りこぼさないよう1日重ねて取得する（追加は冪等）
+        after = datetime.fromisoformat(watermark[:10]) - timedelta(days=1)
+
+    newest = watermark or ""
+    added = 0
+    async with gumroad_clients.acquire(account) as client:
+        async for sales in iter_sales_pages(client, access_token, after=after):
+            added += await asyncio.to_thread(ledger.record, account, sales)
+            newest = max([newest, *(sale.get("created_at", "") for sale in sales)])
+
+    await asyncio.to_thread(ledger.store.set_watermark, account, newest)
+    return added
+
+
+def month_key(month: str | None) -> str:
+    """"YYYY-MM"（省略時は今月）"""
+    return _month_range(month)[0][:7]
+
+
+def _month_range(month: str | None) -> tuple[str, str]:
+    if month:
+        first = datetime.strptime(month, "%Y-%m")
+    else:
+        first = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    next_month = (first + timedelta(days=32)).replace(day=1)
+    return first.strftime("%Y-%m-%d"), next_month.strftime("%Y-%m-%d")
+
+
+async def iter_sales_pages(
+    client: httpx.AsyncClient, access_token: str, after: datetime | None = None
+) -> AsyncIterator[list[dict]]:
+    """/v2/sales を next_page_key が無くなるまで辿る。呼び出し側が現在のページを処理している間に次のページを先読みする"""
+    params = {"access_token": access_token}
+    if after is not None:
+        params["after"] = after.isoformat()
+
+    pending = asyncio.create_task(_get_sales_page(client, params))
+    try:
+        while pending is not None:
+            data = await pending
+            pending = None
+            next_page_key = data.get("next_page_key")
+            if next_page_key:
+                pending = asyncio.create_task(
+                    _get_sales_page(client, {**params, "page_key": next_page_key})
+                )
+            yield data.get("sales", [])
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def _get_sales_page(client: httpx.AsyncClient, params: dict) -> dict:
+    for attempt in range(settings.gumroad_max_retries + 1):
+        retry_after = None
+        try:
+            async with _in_flight:
+                with upstream_call("gumroad", "sales") as call:
+                    response = await client.get(f"{settings.gumroad_api_base}/sales", params=params)
+                    call.outcome = str(response.status_code)
+        except httpx.TransportError:
+            if attempt == settings.gumroad_max_retries:
+                raise
+        else:
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code not in RETRYABLE_STATUS or attempt == settings.gumroad_max_retries:
+                raise GumroadAPIError(f"Gumroad API returned HTTP {response.status_code}")
+            retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+
+        # 指数バックオフ + フルジッター（Retry-Afterがあればそれを優先）
+        await asyncio.sleep(retry_after if retry_after is not None else random.uniform(0, min(30.0, 0.5 * 2**attempt)))
+
+    raise GumroadAPIError("Gumroad API retries exhausted")
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+def parse_ping(fields: dict[str, str]) -> dict:
+    """GumroadのPing（フォーム形式）を /v2/sales の売上と同じ形にする。Pingのpriceはセント単位"""
+    try:
+        # 日付で集計するので解釈できない日時は受け付けない
+        datetime.fromisoformat(fields["sale_timestamp"].replace("Z", "+00:00"))
+        return {
+            "id": fields["sale_id"],
+            "product_name": fields.get("product_name") or "Unknown",
+            "price": f"{int(fields['price']) / 100:.2f}",
+            # 小数を経由すると丸めでずれるので、ストアにはセントのまま渡す
+            "price_cents": int(fields["price"]),
+            "created_at": fields["sale_timestamp"],
+        }
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"invalid ping: {e!r}") from e
+
+
+def generate_mock_dashboard(monthly_goal: int) -> DashboardSummary:
     today = datetime.now()
     daily_sales = []
 
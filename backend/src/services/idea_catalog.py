@@ -0,0 +1,146 @@
+import json
+import os
+import re
+import tempfile
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from src.config import settings
+from src.types import GenerateResponse
+
+# 空白と記号は比較に使わない
+_IGNORED = re.compile(r"[\s\W_]+")
+
+
+def normalize_target(text: str) -> str:
+    """全角・半角と大文字・小文字をそろえ、空白と記号を取り除く"""
+    return _IGNORED.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def bigrams(text: str) -> set[str]:
+    """文字バイグラム。日本語は分かち書きせずに比べられる（1文字ならその文字だけ）"""
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+@dataclass
+class CatalogEntry:
+    category: str
+    target: str
+    result: GenerateResponse
+    generated_at: str
+    grams: frozenset[str] = frozenset()
+
+
+@dataclass
+class CatalogMatch:
+    entry: CatalogEntry
+    similarity: float
+
+
+class IdeaCatalog:
+    """よく使われる (カテゴリ, ターゲット) について事前に生成した商品案のカタログ
+
+    ターゲットの文字バイグラムの転置インデックスを持ち、類似度が最も高い案を返す。類似度はDice係数と
+    カタログ側のターゲットがリクエストに含まれる割合の平均（「週末起業したい会社員」に「会社員」の案が当たる）。
+    ファイルはscripts/build_idea_catalog.pyで作り、初回の検索時に読み込む。
+    """
+
+    def __init__(self, path: str, min_similarity: float = 0.5):
+        self.path = path
+        self.min_similarity = min_similarity
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[str, list[CatalogEntry]] = {}
+        # カテゴリ -> バイグラム -> そのバイグラムを含むエントリの番号
+        self._postings: dict[str, dict[str, list[int]]] = {}
+        self._positions: dict[tuple[str, frozenset[str]], int] = {}
+        self._loaded = False
+
+    def load(self) -> None:
+        self._entries = {}
+        self._postings = {}
+        self._positions = {}
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        for item in data.get("entries", []):
+            self.add(item["category"], item["target"], GenerateResponse(**item["result"]), item.get("generatedAt", ""))
+
+    def add(self, category: str, target: str, result: GenerateResponse, generated_at: str = "") -> None:
+        grams = frozenset(bigrams(normalize_target(target)))
+        if not grams:
+            return
+        entries = self._entries.setdefault(category, [])
+        postings = self._postings.setdefault(category, {})
+        entry = CatalogEntry(category, target, result, generated_at or _now(), grams)
+        position = self._positions.get((category, grams))
+        if position is not None:
+            # 同じターゲットは新しい案で置き換える（インデックスはそのまま使える）
+            entries[position] = entry
+            return
+        self._positions[category, grams] = len(entries)
+        for gram in grams:
+            postings.setdefault(gram, []).append(len(entries))
+        entries.append(entry)
+
+    def lookup(self, category: str, target: str) -> CatalogMatch | None:
+        if not self._loaded:
+            self.load()
+        grams = bigrams(normalize_target(target))
+        entries = self._entries.get(category)
+        if not grams or not entries:
+            self.misses += 1
+            return None
+
+        postings = self._postings[category]
+        shared = Counter(i for gram in grams for i in postings.get(gram, ()))
+        best: CatalogMatch | None = None
+        for i, count in shared.items():
+            entry = entries[i]
+            similarity = (2 * count / (len(grams) + len(entry.grams)) + count / len(entry.grams)) / 2
+            if best is None or similarity > best.similarity:
+                best = CatalogMatch(entry, similarity)
+        if best is None or best.similarity < self.min_similarity:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return best
+
+    def save(self) -> None:
+        """一時ファイルに書いてから置き換える（読み込み中のプロセスが壊れたファイルを見ない）"""
+        entries = [
+            {
+                "category": entry.category,
+                "target": entry.target,
+                "result": entry.result.model_dump(),
+                "generatedAt": entry.generated_at,
+            }
+            for category in sorted(self._entries)
+            for entry in self._entries[category]
+        ]
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"entries": entries}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def stats(self) -> dict:
+        return {
+            "entries": sum(len(entries) for entries in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+idea_catalog = IdeaCatalog(settings.idea_catalog_path, settings.idea_catalog_min_similarity)
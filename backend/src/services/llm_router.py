@@ -0,0 +1,178 @@
+import asyncio
+import time
+from collections import deque
+from typing import Protocol
+
+from src.services.admission import AdmissionController, Overloaded
+from src.types import GenerateResponse
+
+
+class Provider(Protocol):
+    name: str
+    admission: AdmissionController
+
+    async def generate(self, prompt: str) -> GenerateResponse: ...
+
+    async def aclose(self) -> None: ...
+
+
+class ProviderStats:
+    """プロバイダーごとの直近の所要時間と成否"""
+
+    def __init__(self, window: int, unhealthy_error_rate: float, cooldown: float, min_samples: int = 5):
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        self.unhealthy_error_rate = unhealthy_error_rate
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self.unhealthy_until = 0.0
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+        elif len(self.outcomes) >= self.min_samples and self.error_rate >= self.unhealthy_error_rate:
+            # クールダウンの間は後回しにし、明けたら統計をやり直す
+            self.unhealthy_until = time.monotonic() + self.cooldown
+            self.outcomes.clear()
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def quantile(self, q: float) -> float | None:
+        if len(self.latencies) < self.min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "errorRate": round(self.error_rate, 3),
+            "samples": len(self.outcomes),
+        }
+
+
+class LLMRouter:
+    """直近の統計から速くて健全なプロバイダーを選んで生成する
+
+    失敗したり流量制御で断られたりしたら次のプロバイダーに切り替える。hedgeが有効なら、1つ目の応答が
+    そのプロバイダーのp95を過ぎても返らないときに次のプロバイダーにも投げ、早い方を使う。
+    """
+
+    def __init__(
+        self,
+        providers: list[Provider],
+        hedge: bool = False,
+        hedge_min_delay: float = 1.0,
+        hedge_max_delay: float = 10.0,
+        window: int = 100,
+        unhealthy_error_rate: float = 0.5,
+        cooldown: float = 30.0,
+    ):
+        self.providers = providers
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.stats = {provider.name: ProviderStats(window, unhealthy_error_rate, cooldown) for provider in providers}
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def ranked(self) -> list[Provider]:
+        """健全なものを直近の中央値の速い順に。統計が無いものは設定順で先頭に置く"""
+
+        def score(item: tuple[int, Provider]) -> tuple[bool, float, int]:
+            index, provider = item
+            stats = self.stats[provider.name]
+            return (not stats.healthy, stats.quantile(0.5) or 0.0, index)
+
+        return [provider for _, provider in sorted(enumerate(self.providers), key=score)]
+
+    def hedge_delay(self, provider: Provider) -> float:
+        p95 = self.stats[provider.name].quantile(0.95)
+        if p95 is None:
+            return self.hedge_max_delay
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, p95))
+
+    async def generate(self, prompt: str) -> GenerateResponse:
+        order = self.ranked()
+        if not order:
+            raise RuntimeError("no LLM provider is configured")
+
+        error: Exception | None = None
+        step = 2 if self.hedge else 1
+        for i in range(0, len(order), step):
+            try:
+                return await self._race(order[i], order[i + 1] if i + 1 < len(order) and self.hedge else None, prompt)
+            except Exception as e:
+                error = e
+        assert error is not None
+        raise error
+
+    def to_dict(self) -> dict:
+        return {
+            "providers": {
+                provider.name: {**self.stats[provider.name].to_dict(), **provider.admission.to_dict()}
+                for provider in self.providers
+            },
+            "hedged": self.hedged,
+            "hedgeWins": self.hedge_wins,
+        }
+
+    async def aclose(self) -> None:
+        for provider in self.providers:
+            await provider.aclose()
+
+    async def _race(self, primary: Provider, hedge: Provider | None, prompt: str) -> GenerateResponse:
+        tasks = [asyncio.create_task(self._call(primary, prompt))]
+        hedged = False
+        try:
+            if hedge is not None:
+                await asyncio.wait(tasks, timeout=self.hedge_delay(primary))
+                # 遅延までに返らなければ次のプロバイダーにも投げる。失敗していたら即座に切り替える
+                if not tasks[0].done():
+                    hedged = True
+                    self.hedged += 1
+                if hedged or tasks[0].exception() is not None:
+                    tasks.append(asyncio.create_task(self._call(hedge, prompt)))
+
+            error: BaseException | None = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedged and task is not tasks[0]:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            assert error is not None
+            raise error
+        finally:
+            # 負けた方の呼び出しは打ち切り、ストリームが閉じるのを待つ
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _call(self, provider: Provider, prompt: str) -> GenerateResponse:
+        start = time.perf_counter()
+        try:
+            result = await provider.generate(prompt)
+        except Overloaded:
+            # 流量制御で断ったものはプロバイダーの失敗として数えない
+            raise
+        except Exception as e:
+            print(f"LLM provider {provider.name} failed: {e!r}")
+            self.stats[provider.name].record(time.perf_counter() - start, False)
+            raise
+        self.stats[provider.name].record(time.perf_counter() - start, True)
+        return result
@@ -0,0 +1,260 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# 秒単位。LLM呼び出し（数秒〜数十秒）まで1つの区切りで扱う
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Prometheus形式のヒストグラム。ラベルの値はlabelnamesの順に位置引数で渡す"""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...], buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # ラベル値 -> [各バケットの件数..., +Infの件数, 合計]
+        self._series: dict[tuple[str, ...], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self) -> dict[tuple[str, ...], list[float]]:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    def render(
+        self, snapshot: dict[tuple[str, ...], list[float]] | None = None, labelnames: tuple[str, ...] | None = None
+    ) -> list[str]:
+        """snapshotとlabelnamesを渡すと、自分の値の代わりにそれを出力する（ワーカーをまとめるとき）"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        snapshot = self.snapshot() if snapshot is None else snapshot
+        labelnames = self.labelnames if labelnames is None else labelnames
+        for labels, series in sorted(snapshot.items()):
+            pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series[:-1]):
+                cumulative += count
+                bucket_labels = ",".join([*pairs, f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            label_text = f'{{{",".join(pairs)}}}' if pairs else ""
+            lines.append(f"{self.name}_sum{label_text} {series[-1]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Prometheus形式のゲージ（現在値）。ラベルの値はlabelnamesの順に位置引数で渡す"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def snapshot(self) -> dict[tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(
+        self, snapshot: dict[tuple[str, ...], float] | None = None, labelnames: tuple[str, ...] | None = None
+    ) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        snapshot = self.snapshot() if snapshot is None else snapshot
+        labelnames = self.labelnames if labelnames is None else labelnames
+        for labels, value in sorted(snapshot.items()):
+            pairs = [f'{name}="{_escape(label)}"' for name, label in zip(labelnames, labels)]
+            label_text = f'{{{",".join(pairs)}}}' if pairs else ""
+            lines.append(f"{self.name}{label_text} {value}")
+        return lines
+
+
+class Counter(Gauge):
+    """Prometheus形式のカウンター（累積値）"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[Histogram | Gauge] = []
+
+    def histogram(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Histogram:
+        histogram = Histogram(name, help, labelnames)
+        self._metrics.append(histogram)
+        return histogram
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        gauge = Gauge(name, help, labelnames)
+        self._metrics.append(gauge)
+        return gauge
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        counter = Counter(name, help, labelnames)
+        self._metrics.append(counter)
+        return counter
+
+    def snapshot(self) -> dict[str, list]:
+        """JSONにできる形の現在値（メトリクス名 -> [[ラベルの値...], 値]）"""
+        return {
+            metric.name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+            for metric in self._metrics
+        }
+
+    def render(self, workers: dict[str, dict[str, list]] | None = None) -> str:
+        """workers（ワーカー -> snapshot）を渡すと、自分の値の代わりに全ワーカーの値をworkerラベルを付けて出力する"""
+        if workers is None:
+            return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+        lines = []
+        for metric in self._metrics:
+            series = {
+                (*labels, worker): value
+                for worker, snapshot in workers.items()
+                for labels, value in snapshot.get(metric.name, ())
+            }
+            lines.extend(metric.render(series, (*metric.labelnames, "worker")))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    "rakumane_http_request_duration_seconds", "HTTPリクエストの処理時間", ("route", "method", "status")
+)
+STAGE_DURATION = registry.histogram(
+    "rakumane_stage_duration_seconds", "リクエスト内の処理段階ごとの所要時間", ("route", "stage")
+)
+GENERATION_DURATION = registry.histogram(
+    "rakumane_generation_duration_seconds", "商品案生成の所要時間（結果の出どころ別）", ("category", "source")
+)
+UPSTREAM_DURATION = registry.histogram(
+    "rakumane_upstream_request_duration_seconds", "外部APIの呼び出し時間", ("upstream", "operation", "outcome")
+)
+UPSTREAM_TTFT = registry.histogram(
+    "rakumane_upstream_time_to_first_token_seconds", "LLMの最初のトークンまでの時間", ("upstream",)
+)
+ADMISSION_WAIT = registry.histogram(
+    "rakumane_admission_wait_seconds", "LLM呼び出しの順番待ちの時間（結果別）", ("provider", "outcome")
+)
+ADMISSION_QUEUE_DEPTH = registry.gauge("rakumane_admission_queue_depth", "LLM呼び出しの順番待ちの数", ("provider",))
+ADMISSION_IN_FLIGHT = registry.gauge("rakumane_admission_in_flight", "実行中のLLM呼び出しの数", ("provider",))
+GUMROAD_PINGS = registry.counter(
+    "rakumane_gumroad_pings_total", "受信したGumroadのPing（recorded / duplicate / test / rejected）", ("outcome",)
+)
+SALES_STREAM_SUBSCRIBERS = registry.gauge("rakumane_sales_stream_subscribers", "売上の差分を受信中のダッシュボードの数")
+SALES_STREAM_RESYNCS = registry.counter(
+    "rakumane_sales_stream_resyncs_total", "送信が追いつかず差分を捨てて全体を送り直した回数"
+)
+SALES_RECONCILED = registry.counter(
+    "rakumane_sales_reconciled_total", "定期の突き合わせでPull APIから追加された売上（Pingの取りこぼし）"
+)
+
+# 処理中のリクエストのASGIスコープ。ルーティング後にscope["route"]からルートのパスを引く
+_current_scope: ContextVar[Scope | None] = ContextVar("metrics_scope", default=None)
+
+
+def current_route() -> str:
+    """処理中のリクエストのルート（/api/generate/batch/{job_id} のようなテンプレート）"""
+    scope = _current_scope.get()
+    return "" if scope is None else _route_of(scope)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """処理段階の所要時間を、処理中のルートと合わせて記録する
+
+    ContextVarで引き継ぐため、リクエスト中に作られたバックグラウンドタスクも同じルートで記録される。
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, current_route(), stage)
+
+
+class UpstreamCall:
+    def __init__(self) -> None:
+        # 正常に抜けたときの記録値。HTTPステータスなどで上書きできる
+        self.outcome = "ok"
+
+
+@contextmanager
+def upstream_call(upstream: str, operation: str) -> Iterator[UpstreamCall]:
+    """外部APIの呼び出し時間を、結果（ok / error / 任意の値）と合わせて記録する"""
+    call = UpstreamCall()
+    start = time.perf_counter()
+    try:
+        yield call
+    except asyncio.CancelledError:
+        # ヘッジで負けた呼び出しなど
+        if call.outcome == "ok":
+            call.outcome = "cancelled"
+        raise
+    except BaseException:
+        if call.outcome == "ok":
+            call.outcome = "error"
+        raise
+    finally:
+        UPSTREAM_DURATION.observe(time.perf_counter() - start, upstream, operation, call.outcome)
+
+
+class MetricsMiddleware:
+    """リクエストごとの処理時間をルート・メソッド・ステータス別に記録するASGIミドルウェア"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        token = _current_scope.set(scope)
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_scope.reset(token)
+            REQUEST_DURATION.observe(time.perf_counter() - start, _route_of(scope), scope["method"], str(status))
+
+
+def _route_of(scope: Scope) -> str:
+    # FastAPIはルーティング時にscope["route"]へマッチしたルートを入れる
+    return getattr(scope.get("route"), "path", "unmatched")
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from src.config import settings
+from src.services.metrics import registry
+
+# ワーカーを区別する値。再起動したワーカーは別の系列になる（カウンターが0から始まっても前の系列と混ざらない）
+WORKER_ID = str(os.getpid())
+
+
+class MetricsStore:
+    """ワーカー（プロセス）ごとのメトリクスを共有するSQLiteストア
+
+    メトリクスはプロセスごとに持つので、複数のワーカーで動かすと /api/metrics は答えたワーカーの値だけになる。
+    各ワーカーが自分の値を定期的に書き、/api/metrics に答えたワーカーが全員分をworkerラベルを付けて返す。
+    max_age秒より古い値（止まったワーカー）は読むときに消す。
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS worker_metrics "
+                "(worker TEXT PRIMARY KEY, snapshot TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def publish(self, worker: str, snapshot: dict[str, list]) -> None:
+        """スレッドで呼ぶ"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO worker_metrics (worker, snapshot, updated_at) VALUES (?, ?, ?)",
+                (worker, json.dumps(snapshot), time.time()),
+            )
+
+    def snapshots(self, max_age: float) -> dict[str, dict[str, list]]:
+        """ワーカー -> snapshot（スレッドで呼ぶ）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM worker_metrics WHERE updated_at < ?", (time.time() - max_age,))
+            rows = self._conn.execute("SELECT worker, snapshot FROM worker_metrics ORDER BY worker").fetchall()
+        return {worker: json.loads(snapshot) for worker, snapshot in rows}
+
+    def remove(self, worker: str) -> None:
+        """スレッドで呼ぶ"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM worker_metrics WHERE worker = ?", (worker,))
+
+
+_store: MetricsStore | None = None
+
+
+def get_metrics_store() -> MetricsStore:
+    global _store
+    if _store is None:
+        _store = MetricsStore(settings.metrics_db_path)
+    return _store
+
+
+async def publish_metrics() -> None:
+    """自分の値を定期的に書く（複数のワーカーで動かすときにlifespanから起動する）"""
+    store = get_metrics_store()
+    try:
+        while True:
+            await asyncio.to_thread(store.publish, WORKER_ID, registry.snapshot())
+            await asyncio.sleep(settings.metrics_publish_seconds)
+    finally:
+        # 止まるワーカーの系列は次の読み出しから消える
+        await asyncio.to_thread(store.remove, WORKER_ID)
+
+
+async def render_all_workers() -> str:
+    """全ワーカーの値をworkerラベルを付けて出力する。自分の値は書き直してから読む"""
+    store = get_metrics_store()
+    await asyncio.to_thread(store.publish, WORKER_ID, registry.snapshot())
+    workers = await asyncio.to_thread(store.snapshots, settings.metrics_publish_seconds * 3)
+    return registry.render(workers)
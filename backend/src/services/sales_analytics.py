@@ -0,0 +1,90 @@
+from datetime import date, timedelta
+from typing import Literal
+
+from src.services.aggregation import Granularity
+from src.services.sales_store import SalesStore
+from src.types import PeriodSales, ProductSales, SalesAnalytics, SalesPeriodSummary
+
+CompareTo = Literal["previous_period", "previous_year"]
+
+
+def comparison_range(start: date, end: date, compare_to: CompareTo) -> tuple[date, date]:
+    """直前の同じ長さの期間、または前年の同じ期間"""
+    if compare_to == "previous_period":
+        return start - (end - start) - timedelta(days=1), start - timedelta(days=1)
+    return _year_before(start), _year_before(end)
+
+
+def period_starts(start: date, end: date, granularity: Granularity) -> list[str]:
+    """[start, end] に掛かる期間の開始日（集計表のSQLと同じく週は月曜始まり、月は1日）"""
+    if granularity == "month":
+        current = start.replace(day=1)
+    elif granularity == "week":
+        current = start - timedelta(days=start.weekday())
+    else:
+        current = start
+    starts = []
+    while current <= end:
+        starts.append(current.isoformat())
+        if granularity == "month":
+            current = (current + timedelta(days=32)).replace(day=1)
+        else:
+            current += timedelta(days=7 if granularity == "week" else 1)
+    return starts
+
+
+def summarize(
+    store: SalesStore | None, account: str, start: date, end: date, granularity: Granularity
+) -> SalesPeriodSummary:
+    """集計表から期間の売上をまとめる（storeがNoneなら売上0）"""
+    periods, products = store.rollup(account, start.isoformat(), end.isoformat(), granularity) if store else ([], [])
+    by_start = {period: PeriodSales(start=period, count=count, revenue=revenue) for period, count, revenue in periods}
+    return SalesPeriodSummary(
+        start=start.isoformat(),
+        end=end.isoformat(),
+        totalSales=sum(count for _, count, _ in periods),
+        totalRevenue=sum(revenue for _, _, revenue in periods),
+        series=[
+            by_start.get(period) or PeriodSales(start=period, count=0, revenue=0)
+            for period in period_starts(start, end, granularity)
+        ],
+        salesByProduct=[
+            ProductSales(productName=name, count=count, revenue=revenue) for name, count, revenue in products
+        ],
+    )
+
+
+def build_analytics(
+    store: SalesStore | None,
+    account: str,
+    start: date,
+    end: date,
+    granularity: Granularity,
+    compare_to: CompareTo | None,
+) -> SalesAnalytics:
+    """期間の集計と、指定があれば比較期間の集計・増減率（集計表を読むのでスレッドで呼ぶ）"""
+    current = summarize(store, account, start, end, granularity)
+    if compare_to is None:
+        return SalesAnalytics(granularity=granularity, current=current)
+
+    comparison = summarize(store, account, *comparison_range(start, end, compare_to), granularity)
+    return SalesAnalytics(
+        granularity=granularity,
+        current=current,
+        compareTo=compare_to,
+        comparison=comparison,
+        salesChange=_change(current.totalSales, comparison.totalSales),
+        revenueChange=_change(current.totalRevenue, comparison.totalRevenue),
+    )
+
+
+def _change(current: int, previous: int) -> float | None:
+    return (current - previous) / previous if previous else None
+
+
+def _year_before(day: date) -> date:
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:
+        # 2月29日は前年の2月28日
+        return day.replace(year=day.year - 1, day=28)
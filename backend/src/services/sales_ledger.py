@@ -0,0 +1,175 @@
+import threading
+from collections import Counter
+from typing import Callable
+
+from src.services.aggregation import SalesColumns
+from src.services.sales_store import SaleRow, SalesStore, get_sales_store
+from src.types import DailySales, DashboardSummary, ProductSales
+
+
+class MonthTotals:
+    """1か月分の売上の累計（件数・金額・商品別・日別）"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.revenue = 0
+        # 商品名 -> [件数, 金額]
+        self.products: dict[str, list[int]] = {}
+        # 日付 -> 金額
+        self.days: dict[str, int] = {}
+        self._summary: DashboardSummary | None = None
+
+    @classmethod
+    def from_columns(cls, columns: SalesColumns) -> "MonthTotals":
+        totals = cls()
+        totals.count = len(columns)
+        totals.revenue = columns.total_revenue
+        totals.products = {product.productName: [product.count, product.revenue] for product in columns.by_product()}
+        totals.days = {day: revenue for day, _, revenue in columns.by_period("day")}
+        return totals
+
+    def add(self, product_name: str, price: int, created_at: str) -> None:
+        self.count += 1
+        self.revenue += price
+        product = self.products.setdefault(product_name, [0, 0])
+        product[0] += 1
+        product[1] += price
+        day = created_at[:10]
+        self.days[day] = self.days.get(day, 0) + price
+        self._summary = None
+
+    def delta(self, products: set[str], days: set[str]) -> dict:
+        """指定した商品・日付の現在の値（差分として配る。値は増分ではなく最新の値）"""
+        return {
+            "totalSales": self.count,
+            "totalRevenue": self.revenue,
+            "products": [
+                {"productName": name, "count": self.products[name][0], "revenue": self.products[name][1]}
+                for name in sorted(products)
+            ],
+            "days": [{"date": day, "revenue": self.days[day]} for day in sorted(days)],
+        }
+
+    def summary(self, monthly_goal: int) -> DashboardSummary:
+        """売上が変わるまでは組み立てたものを使い回す"""
+        if self._summary is None or self._summary.monthlyGoal != monthly_goal:
+            # SalesColumnsの集計と同じ並び（商品は金額の降順、日付は昇順）
+            products = sorted(self.products.items(), key=lambda item: -item[1][1])
+            self._summary = DashboardSummary(
+                totalSales=self.count,
+                totalRevenue=self.revenue,
+                monthlyGoal=monthly_goal,
+                salesByProduct=[
+                    ProductSales(productName=name, count=count, revenue=revenue)
+                    for name, (count, revenue) in products
+                ],
+                dailySales=[DailySales(date=day, revenue=self.days[day]) for day in sorted(self.days)],
+            )
+        return self._summary
+
+
+class SalesLedger:
+    """売上の追加（Ping・Pull APIの同期）をストアに書きつつ、アカウント・月ごとの累計に反映する
+
+    累計は月ごとに初めて読まれたときにストアから作り、以降は新規に追加された売上だけを足す
+    （同じ売上が何度届いてもストアの主キーで弾かれるので二重に数えない）。
+    ストアへの書き込み・読み込みは_write_lockで順に行うので、累計の作成中に届いた売上も取りこぼさない。
+    累計そのものは_lockで守り、ストアを待つ間は持たない（イベントループからのcached_summaryが待たない）。
+    累計が変わった月はlistenerに (アカウント, 月, 差分) で知らせる。
+
+    他のワーカーがストアに追加した売上は、反映済みのrowidより後ろを読んで足す（refresh。watchから定期的に呼ぶ）。
+    累計はrowidが反映済みの位置までの売上から作るので、後から足す分と重ならない。
+    """
+
+    def __init__(self, store: SalesStore):
+        self.store = store
+        self._months: dict[tuple[str, str], MonthTotals] = {}
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._listeners: list[Callable[[str, str, dict], None]] = []
+        # 累計に反映済みの売上のrowidと、そのときのストアのdata_version（まだ累計が無いので既存の売上は読まない）
+        self._data_version = store.data_version()
+        self._rowid = store.max_rowid()
+
+    def add_listener(self, listener: Callable[[str, str, dict], None]) -> None:
+        """累計の変化を受け取る関数を登録する（recordを呼んだスレッドで、累計のロックを外してから呼ばれる）"""
+        self._listeners.append(listener)
+
+    def record(self, account: str, sales: list[dict]) -> int:
+        """売上を追加し、新規だった件数を返す（ストアに書くのでスレッドで呼ぶ）"""
+        with self._write_lock:
+            others, added = self.store.add_sales(account, sales, self._rowid)
+            self._notify(self._apply(others + added))
+        return len(added)
+
+    def refresh(self) -> int:
+        """他のワーカーが追加した売上を累計に足し、その件数を返す（ストアを読むのでスレッドで呼ぶ）"""
+        with self._write_lock:
+            data_version = self.store.data_version()
+            if data_version == self._data_version:
+                return 0
+            self._data_version = data_version
+            rows = self.store.sales_after(self._rowid)
+            self._notify(self._apply(rows))
+            return len(rows)
+
+    def _apply(self, rows: list[SaleRow]) -> list[tuple[str, str, dict]]:
+        """累計に足し、変わった月の (アカウント, 月, 差分) を返す"""
+        # (アカウント, 月) -> (変わった商品, 変わった日付)
+        changed: dict[tuple[str, str], tuple[set[str], set[str]]] = {}
+        counts: Counter[tuple[str, str]] = Counter()
+        with self._lock:
+            for rowid, account, product_name, price, created_at in rows:
+                self._rowid = max(self._rowid, rowid)
+                key = (account, created_at[:7])
+                totals = self._months.get(key)
+                if totals is not None:
+                    totals.add(product_name, price, created_at)
+                    products, days = changed.setdefault(key, (set(), set()))
+                    products.add(product_name)
+                    days.add(created_at[:10])
+                    counts[key] += 1
+            deltas = []
+            for (account, month), (products, days) in changed.items():
+                delta = self._months[account, month].delta(products, days)
+                deltas.append((account, month, {**delta, "added": counts[account, month]}))
+            return deltas
+
+    def _notify(self, deltas: list[tuple[str, str, dict]]) -> None:
+        # 値は増分ではなく最新の値なので、届く順序が入れ替わらないよう_write_lockの中（累計のロックの外）で知らせる
+        for account, month, delta in deltas:
+            for listener in self._listeners:
+                listener(account, month, delta)
+
+    def cached_summary(self, account: str, month: str, monthly_goal: int) -> DashboardSummary | None:
+        """累計があればそこから返す（メモリだけを読むのでイベントループから呼べる）。まだ無ければNone
+
+        他のワーカーが追加した売上は、watchのrefreshで反映されるまで含まれない。
+        """
+        with self._lock:
+            totals = self._months.get((account, month))
+            return totals.summary(monthly_goal) if totals is not None else None
+
+    def summary(self, account: str, month: str, start: str, end: str, monthly_goal: int) -> DashboardSummary:
+        """累計が無ければ [start, end) の売上をストアから読んで作る（スレッドで呼ぶ）"""
+        self.refresh()
+        with self._write_lock:
+            summary = self.cached_summary(account, month, monthly_goal)
+            if summary is not None:
+                return summary
+            # _write_lockを持っているので、読み込みの間に反映済みのrowidは進まない
+            rows = self.store.sales_between(account, start, end, self._rowid)
+            totals = MonthTotals.from_columns(SalesColumns.from_rows(rows))
+            with self._lock:
+                self._months[account, month] = totals
+                return totals.summary(monthly_goal)
+
+
+_ledger: SalesLedger | None = None
+
+
+def get_sales_ledger() -> SalesLedger:
+    global _ledger
+    if _ledger is None:
+        _ledger = SalesLedger(get_sales_store())
+    return _ledger
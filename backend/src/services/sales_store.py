@@ -0,0 +1,253 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+from src.config import settings
+
+# (rowid, account, product_name, price, created_at)
+SaleRow = tuple[int, str, str, int, str]
+
+_SALES_AFTER = (
+    "SELECT rowid, account, product_name, price, created_at FROM sales WHERE rowid > ? ORDER BY rowid"
+)
+
+# 集計表: (表, 主キーの列, 売上の列から主キーを作る式。{row}はトリガーでは "NEW."）
+_ROLLUPS = (
+    ("sales_daily", ("day", "product_name"), "substr({row}created_at, 1, 10), {row}product_name"),
+    ("sales_day_totals", ("day",), "substr({row}created_at, 1, 10)"),
+    ("sales_monthly", ("month", "product_name"), "substr({row}created_at, 1, 7), {row}product_name"),
+)
+
+# 期間の開始日（週は月曜始まり: 次の日曜日の6日前）
+_PERIOD_START = {
+    "day": "day",
+    "week": "date(day, 'weekday 0', '-6 days')",
+    "month": "substr(day, 1, 7) || '-01'",
+}
+
+
+def sale_price(sale: dict) -> int:
+    """売上の金額（セント）。Pingはセントの整数をprice_centsで渡すので変換しない"""
+    if "price_cents" in sale:
+        return int(sale["price_cents"])
+    # Pull APIのpriceは小数の文字列。19.99 * 100 は1998.99…になるので切り捨てずに丸める
+    return round(float(sale.get("price", 0)) * 100)
+
+
+class SalesStore:
+    """Gumroadの売上をローカルに保持するSQLiteストア（トークン単位で同期位置を記録する）
+
+    複数のワーカー（プロセス）から同じファイルを使えるよう、WALモードで開く。
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS sales (
+                    account TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    product_name TEXT NOT NULL,
+                    price INTEGER NOT NULL,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (account, id)
+                );
+                CREATE INDEX IF NOT EXISTS sales_created_at ON sales (account, created_at);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    account TEXT PRIMARY KEY,
+                    watermark TEXT
+                );
+                """
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sync_state)")}
+            if "synced_at" not in columns:
+                self._conn.execute("ALTER TABLE sync_state ADD COLUMN synced_at REAL NOT NULL DEFAULT 0")
+        self._create_rollup()
+
+    def _create_rollup(self) -> None:
+        """売上の集計表を作る
+
+        - sales_daily: 日・商品ごと（期間の端の半端な月の商品別に使う）
+        - sales_day_totals: 日ごと（期間ごとの系列に使う）
+        - sales_monthly: 月・商品ごと（期間に丸ごと含まれる月の商品別に使う）
+
+        売上が追加されるとトリガーが同じトランザクションの中で足し込むので、どの経路・どのワーカーで
+        追加しても集計表は売上と食い違わない。表が無かったときは既存の売上から作る。
+        """
+        with self._lock, self._conn:
+            # 複数のワーカーが同時に起動しても、作るのは1回だけ
+            self._conn.execute("BEGIN IMMEDIATE")
+            if self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sales_rollup_insert'").fetchone():
+                return
+            upserts = []
+            for table, key, key_expression in _ROLLUPS:
+                key_columns = ", ".join(key)
+                self._conn.execute(
+                    f"CREATE TABLE {table} (account TEXT NOT NULL, "
+                    + "".join(f"{column} TEXT NOT NULL, " for column in key)
+                    + f"count INTEGER NOT NULL, revenue INTEGER NOT NULL, PRIMARY KEY (account, {key_columns})) "
+                    "WITHOUT ROWID"
+                )
+                self._conn.execute(
+                    f"INSERT INTO {table} (account, {key_columns}, count, revenue) "
+                    f"SELECT account, {key_expression.format(row='')}, COUNT(*), SUM(price) FROM sales "
+                    "GROUP BY " + ", ".join(str(i + 1) for i in range(len(key) + 1))
+                )
+                upserts.append(
+                    f"INSERT INTO {table} (account, {key_columns}, count, revenue) "
+                    f"VALUES (NEW.account, {key_expression.format(row='NEW.')}, 1, NEW.price) "
+                    f"ON CONFLICT (account, {key_columns}) DO UPDATE SET "
+                    "count = count + 1, revenue = revenue + excluded.revenue;"
+                )
+            self._conn.execute(f"CREATE TRIGGER sales_rollup_insert AFTER INSERT ON sales BEGIN {' '.join(upserts)} END")
+
+    @staticmethod
+    def account_key(access_token: str) -> str:
+        # トークンそのものは保存しない
+        return hashlib.sha256(access_token.encode("utf-8")).hexdigest()[:32]
+
+    def watermark(self, account: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT watermark FROM sync_state WHERE account = ?", (account,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, account: str, watermark: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sync_state (account, watermark) VALUES (?, ?) "
+                "ON CONFLICT (account) DO UPDATE SET watermark = excluded.watermark "
+                "WHERE excluded.watermark > COALESCE(sync_state.watermark, '')",
+                (account, watermark),
+            )
+
+    def claim_sync(self, account: str, interval: float) -> bool:
+        """Pull APIとの同期を引き受ける。interval秒以内に他のワーカーが引き受けていればFalse
+
+        まだ一度も同期が終わっていない（同期位置が無い）アカウントは、重なっても引き受ける（追加は冪等）。
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO sync_state (account, watermark, synced_at) VALUES (?, NULL, ?) "
+                "ON CONFLICT (account) DO UPDATE SET synced_at = excluded.synced_at "
+                "WHERE sync_state.watermark IS NULL OR sync_state.synced_at <= ?",
+                (account, now, now - interval),
+            )
+        return cursor.rowcount > 0
+
+    def add_sales(self, account: str, sales: list[dict], after: int) -> tuple[list[SaleRow], list[SaleRow]]:
+        """売上を冪等に追加し、(rowidがafterより大きい他の接続が追加した売上, 新規に追加した売上) を返す
+
+        両方を同じ書き込みトランザクションで読み書きするので、間に他のワーカーの追加が入り込まない。
+        """
+        rows = [
+            (
+                account,
+                str(sale["id"]),
+                sale.get("product_name", "Unknown"),
+                sale_price(sale),
+                sale.get("created_at", ""),
+            )
+            for sale in sales
+            if sale.get("id") is not None
+        ]
+        added = []
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            others = self._conn.execute(_SALES_AFTER, (after,)).fetchall()
+            for row in rows:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO sales (account, id, product_name, price, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    row,
+                )
+                if cursor.rowcount:
+                    added.append((cursor.lastrowid, row[0], *row[2:]))
+        return others, added
+
+    def sales_after(self, after: int) -> list[SaleRow]:
+        """rowidがafterより大きい売上（全アカウント）"""
+        with self._lock:
+            return self._conn.execute(_SALES_AFTER, (after,)).fetchall()
+
+    def max_rowid(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM sales").fetchone()[0]
+
+    def data_version(self) -> int:
+        """他の接続（ワーカー）がコミットするたびに変わる値"""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def sales_between(self, account: str, start: str, end: str, max_rowid: int) -> list[tuple[str, int, str]]:
+        """[start, end) のうちrowidがmax_rowid以下の売上を (product_name, price, created_at) で返す"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT product_name, price, created_at FROM sales "
+                "WHERE account = ? AND created_at >= ? AND created_at < ? AND rowid <= ?",
+                (account, start, end, max_rowid),
+            ).fetchall()
+
+    def rollup(
+        self, account: str, first_day: str, last_day: str, granularity: str
+    ) -> tuple[list[tuple[str, int, int]], list[tuple[str, int, int]]]:
+        """[first_day, last_day] の集計表から (期間ごとの (開始日, 件数, 金額), 商品ごとの (商品名, 件数, 金額)) を返す
+
+        期間は日・月曜始まりの週・月（開始日の昇順）。商品は金額の降順。
+        商品別は丸ごと含まれる月を月ごとの表から、端の半端な日を日ごとの表から読む。
+        """
+        head, months, tail = _split_months(date.fromisoformat(first_day), date.fromisoformat(last_day))
+        period = _PERIOD_START[granularity]
+        with self._lock, self._conn:
+            # 2つの集計を同じスナップショットから読む
+            self._conn.execute("BEGIN")
+            periods = self._conn.execute(
+                f"SELECT {period}, SUM(count), SUM(revenue) FROM sales_day_totals "
+                "WHERE account = ? AND day BETWEEN ? AND ? GROUP BY 1 ORDER BY 1",
+                (account, first_day, last_day),
+            ).fetchall()
+            products = self._conn.execute(
+                "SELECT product_name, SUM(count), SUM(revenue) FROM ("
+                "SELECT product_name, count, revenue FROM sales_monthly "
+                "WHERE account = ? AND month BETWEEN ? AND ? "
+                "UNION ALL "
+                "SELECT product_name, count, revenue FROM sales_daily WHERE account = ? AND day BETWEEN ? AND ? "
+                "UNION ALL "
+                "SELECT product_name, count, revenue FROM sales_daily WHERE account = ? AND day BETWEEN ? AND ?"
+                ") GROUP BY 1 ORDER BY 3 DESC, 1",
+                (account, *months, account, *head, account, *tail),
+            ).fetchall()
+        return periods, products
+
+
+def _split_months(first: date, last: date) -> tuple[tuple[str, str], tuple[str, str], tuple[str, str]]:
+    """[first, last] を (前の半端な日, 丸ごと含まれる月, 後ろの半端な日) に分ける。空の範囲は ("", "")"""
+    month_start = first if first.day == 1 else (first.replace(day=1) + timedelta(days=32)).replace(day=1)
+    after_last = last + timedelta(days=1)
+    month_end = last if after_last.day == 1 else last.replace(day=1) - timedelta(days=1)
+    if month_start > month_end:
+        return (first.isoformat(), last.isoformat()), ("", ""), ("", "")
+    head = (first.isoformat(), (month_start - timedelta(days=1)).isoformat()) if month_start > first else ("", "")
+    tail = ((month_end + timedelta(days=1)).isoformat(), last.isoformat()) if month_end < last else ("", "")
+    return head, (month_start.isoformat()[:7], month_end.isoformat()[:7]), tail
+
+
+_store: SalesStore | None = None
+
+
+def get_sales_store() -> SalesStore:
+    global _store
+    if _store is None:
+        _store = SalesStore(settings.sales_db_path)
+    return _store
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from src.config import settings
+from src.services.metrics import SALES_STREAM_RESYNCS, SALES_STREAM_SUBSCRIBERS
+from src.services.sales_ledger import SalesLedger
+
+
+def format_event(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+class Subscriber:
+    """1つのダッシュボードへの送信待ち。溢れたら溜まった差分を捨て、全体を送り直す印を付ける"""
+
+    def __init__(self, max_queue: int):
+        self.max_queue = max_queue
+        self.queue: deque[bytes] = deque()
+        self.resync = False
+        self.ready = asyncio.Event()
+
+    def push(self, message: bytes) -> None:
+        if self.resync:
+            return
+        if len(self.queue) >= self.max_queue:
+            # 読むのが遅いクライアントのためにメモリを溜め込まない
+            self.queue.clear()
+            self.resync = True
+            SALES_STREAM_RESYNCS.inc()
+        else:
+            self.queue.append(message)
+        self.ready.set()
+
+
+class SalesBroadcaster:
+    """売上の累計の差分を、同じアカウント・月を表示しているダッシュボードに配る
+
+    差分は売上を追加したスレッドで1回だけJSONにし、イベントループで各クライアントのキューに入れる。
+    購読の一覧はそのスレッドからも見るので、_lockの中で読み書きする。
+    何画面開いていても、Gumroadへの問い合わせはSalesSyncの同期（とPing）の分だけになる。
+    """
+
+    def __init__(self, max_queue: int):
+        self.max_queue = max_queue
+        self._topics: dict[tuple[str, str], set[Subscriber]] = {}
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def attach(self, ledger: SalesLedger) -> None:
+        """ledgerの変化を配り始める（lifespanから呼ぶ）"""
+        self._loop = asyncio.get_running_loop()
+        ledger.add_listener(self._on_change)
+
+    @asynccontextmanager
+    async def subscribe(self, account: str, month: str) -> AsyncIterator[Subscriber]:
+        subscriber = Subscriber(self.max_queue)
+        key = (account, month)
+        with self._lock:
+            self._topics.setdefault(key, set()).add(subscriber)
+        SALES_STREAM_SUBSCRIBERS.set(self.subscribers)
+        try:
+            yield subscriber
+        finally:
+            with self._lock:
+                topic = self._topics.get(key)
+                if topic is not None:
+                    topic.discard(subscriber)
+                    if not topic:
+                        del self._topics[key]
+            SALES_STREAM_SUBSCRIBERS.set(self.subscribers)
+
+    @property
+    def subscribers(self) -> int:
+        with self._lock:
+            return sum(len(topic) for topic in self._topics.values())
+
+    def _on_change(self, account: str, month: str, delta: dict) -> None:
+        # 売上を追加したスレッドで呼ばれる。見ている人がいなければJSONにもしない
+        with self._lock:
+            watched = (account, month) in self._topics
+        if self._loop is None or not watched:
+            return
+        message = format_event("delta", {"month": month, **delta, "asOf": datetime.now(timezone.utc).isoformat()})
+        self._loop.call_soon_threadsafe(self._publish, (account, month), message)
+
+    def _publish(self, key: tuple[str, str], message: bytes) -> None:
+        with self._lock:
+            subscribers = list(self._topics.get(key, ()))
+        for subscriber in subscribers:
+            subscriber.push(message)
+
+
+sales_broadcaster = SalesBroadcaster(settings.sales_stream_queue_size)
@@ -0,0 +1,135 @@
+import asyncio
+import contextlib
+from datetime import datetime, timezone
+
+import httpx
+
+from src.config import settings
+from src.services.gumroad_service import GumroadAPIError, generate_mock_dashboard, read_summary, sync_sales
+from src.services.metrics import SALES_RECONCILED, span
+from src.services.sales_ledger import get_sales_ledger
+from src.services.sales_store import SalesStore
+from src.services.tenant_store import get_tenant_store
+from src.types import DashboardSummary
+
+
+class SalesSync:
+    """ダッシュボードの売上を最新に保つ
+
+    売上はGumroadのPingが届いた時点で累計に反映し、/api/sales は累計を読むだけにする。
+    Pingは取りこぼすことがあるので、表示したアカウントはinterval秒ごとにPull APIと突き合わせる。
+    アカウントを初めて表示するときだけ同期の完了を待つ。
+
+    複数のワーカーで動かすときは、突き合わせはinterval秒ごとにどれか1つのワーカーだけが行い、
+    他のワーカーが追加した売上はwatch_interval秒ごとにストアから読んで累計に足す（差分の配信もここから）。
+    ストアはすべてスレッドで読み書きし、/api/sales はメモリ上の累計だけを読む。
+    """
+
+    def __init__(self, interval: float, watch_interval: float):
+        self.interval = interval
+        self.watch_interval = watch_interval
+        # アカウント -> アクセストークン（突き合わせの対象）
+        self._tokens: dict[str, str] = {}
+        # アカウント -> 最後に同期またはPingで更新した時刻
+        self._updated_at: dict[str, datetime] = {}
+        self._synced: set[str] = set()
+        self._syncing: dict[str, asyncio.Task] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    async def get(self, access_token: str, monthly_goal: int, month: str | None = None) -> DashboardSummary:
+        account = await self.ensure_synced(access_token)
+        if account is None:
+            return generate_mock_dashboard(monthly_goal)
+
+        summary = await read_summary(get_sales_ledger(), account, monthly_goal, month)
+        return summary.model_copy(update={"asOf": self._updated_at.get(account)})
+
+    async def ensure_synced(self, access_token: str) -> str | None:
+        """アカウントを突き合わせの対象にし、初めてなら同期を待ってアカウントを返す。読める売上が無ければNone"""
+        if not access_token:
+            return None
+
+        account = SalesStore.account_key(access_token)
+        self._tokens[account] = access_token
+        if account not in self._synced:
+            await asyncio.shield(self.reconcile(account))
+            # 同期に失敗しても、保存済みの売上があればそれで集計する
+            store = get_sales_ledger().store
+            if account not in self._synced and await asyncio.to_thread(store.watermark, account) is None:
+                return None
+        return account
+
+    async def record_ping(self, access_token: str, sale: dict) -> bool:
+        """Pingで届いた売上を追加する。新規ならTrue（再送などで既にあればFalse）"""
+        account = SalesStore.account_key(access_token)
+        added = await asyncio.to_thread(get_sales_ledger().record, account, [sale])
+        if added:
+            self._updated_at[account] = datetime.now(timezone.utc)
+        return added > 0
+
+    def reconcile(self, account: str) -> asyncio.Task:
+        """Pull APIと突き合わせる。同じアカウントの同期は1つのタスクにまとめる"""
+        task = self._syncing.get(account)
+        if task is None:
+            task = asyncio.create_task(self._sync(account))
+            self._syncing[account] = task
+            task.add_done_callback(lambda _: self._syncing.pop(account, None))
+        return task
+
+    def forget(self, access_token: str) -> None:
+        """テナントのトークンが変わったときに古いトークンで呼ぶ。次に表示されるまで突き合わせをやめる"""
+        self._tokens.pop(SalesStore.account_key(access_token), None)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.gather(*(self.reconcile(account) for account in list(self._tokens)), return_exceptions=True)
+
+    async def watch(self) -> None:
+        ledger = get_sales_ledger()
+        tenant_store = get_tenant_store()
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            await asyncio.to_thread(ledger.refresh)
+            # 他のワーカーが保存したテナントの設定も読み直す
+            await asyncio.to_thread(tenant_store.refresh)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        if self.interval > 0:
+            self._tasks.append(asyncio.create_task(self.run()))
+        if self.watch_interval > 0:
+            self._tasks.append(asyncio.create_task(self.watch()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+
+    async def _sync(self, account: str) -> None:
+        token = self._tokens.get(account)
+        if token is None:
+            return
+        ledger = get_sales_ledger()
+        if not await asyncio.to_thread(ledger.store.claim_sync, account, self.interval):
+            # 他のワーカーが突き合わせたばかり。追加された売上はwatchで読み込む
+            self._synced.add(account)
+            return
+        try:
+            with span("gumroad_sync"):
+                added = await sync_sales(token, ledger, account)
+        except (GumroadAPIError, httpx.HTTPError) as e:
+            print(f"Sales reconciliation failed: {e!r}")
+            return
+        if account in self._synced and added:
+            # 初回の同期以降にPull APIで見つかったのは、Pingが届かなかった売上
+            SALES_RECONCILED.inc(added)
+            print(f"Reconciled {added} sales missed by pings")
+        self._synced.add(account)
+        self._updated_at[account] = datetime.now(timezone.utc)
+
+
+sales_sync = SalesSync(settings.sales_reconcile_seconds, settings.sales_watch_seconds)
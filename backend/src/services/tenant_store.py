@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import os
+import secrets
+import sqlite3
+import threading
+from dataclasses import dataclass
+
+from src.config import settings
+
+DEFAULT_TENANT = "default"
+TENANT_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+DEFAULT_MONTHLY_GOAL = 100000
+
+
+@dataclass(frozen=True)
+class TenantSettings:
+    gumroad_token: str = ""
+    monthly_goal: int = DEFAULT_MONTHLY_GOAL
+
+    def access_token(self, tenant: str) -> str:
+        # 環境変数のトークンは既定のテナント（ヘッダーなしの単一利用）にだけ使う。他のテナントに見せない
+        if self.gumroad_token or tenant != DEFAULT_TENANT:
+            return self.gumroad_token
+        return settings.gumroad_access_token
+
+
+class TenantStore:
+    """テナントごとの設定（Gumroadのトークン・月の目標）とAPIキーを保存するSQLiteストア
+
+    APIキーはハッシュだけを持つ（発行したときに一度だけ返す）。
+
+    読み出しはプロセス内にキャッシュし、キャッシュが当たる間はSQLiteに触れない（cachedはイベントループから呼べる）。
+    別のプロセス（ワーカー）の書き込みは、refreshで PRAGMA data_version（他の接続がコミットすると変わる）を
+    確かめてキャッシュを捨てることで反映する（watchから定期的にスレッドで呼ぶ）。
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tenant_settings (
+                    tenant TEXT PRIMARY KEY,
+                    gumroad_token TEXT NOT NULL,
+                    monthly_goal INTEGER NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tenant_keys (tenant TEXT PRIMARY KEY, key_hash TEXT NOT NULL)"
+            )
+        if path != ":memory:":
+            # トークンを平文で持つので所有者だけが読めるようにする
+            os.chmod(path, 0o600)
+        self._cache: dict[str, TenantSettings] = {}
+        self._key_hashes: dict[str, str] = {}
+        self._data_version = self._read_data_version()
+
+    def cached(self, tenant: str) -> TenantSettings | None:
+        """キャッシュにあれば返す（SQLiteを読まない）"""
+        return self._cache.get(tenant)
+
+    def get(self, tenant: str) -> TenantSettings:
+        """キャッシュに無ければテーブルから読む（スレッドで呼ぶ）"""
+        with self._lock:
+            cached = self._cache.get(tenant)
+            if cached is not None:
+                return cached
+            row = self._conn.execute(
+                "SELECT gumroad_token, monthly_goal FROM tenant_settings WHERE tenant = ?", (tenant,)
+            ).fetchone()
+            tenant_settings = TenantSettings(*row) if row else TenantSettings()
+            self._cache[tenant] = tenant_settings
+            return tenant_settings
+
+    def refresh(self) -> bool:
+        """他のプロセスが書き込んでいればキャッシュを捨ててTrueを返す（スレッドで呼ぶ）"""
+        with self._lock:
+            data_version = self._read_data_version()
+            if data_version == self._data_version:
+                return False
+            self._data_version = data_version
+            self._cache.clear()
+            self._key_hashes.clear()
+            return True
+
+    def save(self, tenant: str, tenant_settings: TenantSettings) -> None:
+        """スレッドで呼ぶ"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO tenant_settings (tenant, gumroad_token, monthly_goal) VALUES (?, ?, ?) "
+                "ON CONFLICT (tenant) DO UPDATE SET "
+                "gumroad_token = excluded.gumroad_token, monthly_goal = excluded.monthly_goal",
+                (tenant, tenant_settings.gumroad_token, tenant_settings.monthly_goal),
+            )
+            # 自分の接続での書き込みではdata_versionは変わらないので、キャッシュは直接更新する
+            self._cache[tenant] = tenant_settings
+
+    def cached_key_hash(self, tenant: str) -> str | None:
+        """キャッシュにあればAPIキーのハッシュを返す（SQLiteを読まない）"""
+        return self._key_hashes.get(tenant)
+
+    def key_hash(self, tenant: str) -> str | None:
+        """APIキーのハッシュ。キーが発行されていなければNone（スレッドで呼ぶ）"""
+        with self._lock:
+            cached = self._key_hashes.get(tenant)
+            if cached is not None:
+                return cached
+            row = self._conn.execute("SELECT key_hash FROM tenant_keys WHERE tenant = ?", (tenant,)).fetchone()
+            # キーの無いテナントは覚えない（任意のテナント名でキャッシュを膨らませられないように）
+            if row is None:
+                return None
+            self._key_hashes[tenant] = row[0]
+            return row[0]
+
+    def issue_key(self, tenant: str) -> str:
+        """テナントのAPIキーを発行して返す。既にあれば置き換える（古いキーは使えなくなる）"""
+        key = secrets.token_urlsafe(32)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO tenant_keys (tenant, key_hash) VALUES (?, ?) "
+                "ON CONFLICT (tenant) DO UPDATE SET key_hash = excluded.key_hash",
+                (tenant, hash_key(key)),
+            )
+            self._key_hashes[tenant] = hash_key(key)
+        return key
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def hash_key(key: str) -> str:
+    # キーは十分に長い乱数なので、遅いハッシュでなくてよい
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+_store: TenantStore | None = None
+
+
+def get_tenant_store() -> TenantStore:
+    global _store
+    if _store is None:
+        _store = TenantStore(settings.tenant_db_path)
+    return _store
+
+
+async def load_tenant_settings(tenant: str) -> TenantSettings:
+    """キャッシュにあればそのまま返し、無ければスレッドでテーブルを読む"""
+    store = get_tenant_store()
+    cached = store.cached(tenant)
+    return cached if cached is not None else await asyncio.to_thread(store.get, tenant)
+
+
+async def load_key_hash(tenant: str) -> str | None:
+    """load_tenant_settingsと同じく、キャッシュに無いときだけスレッドで読む"""
+    store = get_tenant_store()
+    cached = store.cached_key_hash(tenant)
+    return cached if cached is not None else await asyncio.to_thread(store.key_hash, tenant)
@@ -25,6 +25,7 @@ class GenerateRequest(BaseModel):
     category: ProductCategory
     target: str
     additionalNotes: str | None = None
+    fresh: bool = False  # Trueならキャッシュを使わず新しく生成する
 
 
 # 商品生成レスポンス
@@ -35,6 +36,31 @@ class GenerateResponse(BaseModel):
     tags: list[str]
 
 
+# 事前生成したカタログから返す近い条件の商品案
+class InstantGenerateResponse(GenerateResponse):
+    matchedTarget: str  # 案を生成したときのターゲット
+    similarity: float  # ターゲットの類似度（0〜1）
+    generatedAt: str
+
+
+# 一括生成リクエスト
+class BatchGenerateRequest(BaseModel):
+    requests: list[GenerateRequest]
+
+
+# 一括生成ジョブの状態
+class BatchJobStatus(BaseModel):
+    jobId: str
+    status: Literal["queued", "running", "completed", "failed"]
+    mode: Literal["batch", "fanout"]  # batch: Message Batches API / fanout: 同時実行数を絞った個別生成
+    total: int
+    completed: int
+    failed: int
+    results: list[GenerateResponse | None] | None = None  # 終了時のみ。失敗した要素はnull
+    errors: list[str | None] | None = None  # 終了時のみ。要素ごとの失敗の理由（成功した要素はnull）
+    createdAt: datetime
+
+
 # 設定
 class SettingsRequest(BaseModel):
     gumroadToken: str
@@ -70,6 +96,35 @@ class DashboardSummary(BaseModel):
     monthlyGoal: int
     salesByProduct: list[ProductSales]
     dailySales: list[DailySales]
+    asOf: datetime | None = None  # 集計時点（キャッシュから返す場合のデータの鮮度）
+
+
+# 期間ごとの売上
+class PeriodSales(BaseModel):
+    start: str  # 期間の開始日（週は月曜日、月は1日）
+    count: int
+    revenue: int
+
+
+# 指定した期間の売上の集計
+class SalesPeriodSummary(BaseModel):
+    start: str
+    end: str  # この日を含む
+    totalSales: int
+    totalRevenue: int
+    series: list[PeriodSales]  # 売上の無い期間も0で含める
+    salesByProduct: list[ProductSales]
+
+
+# 売上分析（/api/sales/analytics）
+class SalesAnalytics(BaseModel):
+    granularity: Literal["day", "week", "month"]
+    current: SalesPeriodSummary
+    compareTo: Literal["previous_period", "previous_year"] | None = None
+    comparison: SalesPeriodSummary | None = None
+    # 比較期間からの増減率（比較期間が0ならNone）
+    salesChange: float | None = None
+    revenueChange: float | None = None
 
 
 # コンテンツ生成リクエスト
@@ -0,0 +1,67 @@
+import os
+
+from src.config import settings
+
+
+def available_cpus() -> float:
+    """このプロセスが使えるCPU数（CPUアフィニティとcgroupのCPU制限を考慮する）"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    return min(cpus, quota) if quota else cpus
+
+
+def available_memory_mb() -> float | None:
+    """cgroupのメモリ上限（無ければ物理メモリ）。分からなければNone"""
+    limit = _read_int("/sys/fs/cgroup/memory.max") or _read_int("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+    try:
+        physical = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        physical = None
+    # cgroup v1は上限が無いと非常に大きな値になる
+    candidates = [value for value in (limit, physical) if value]
+    return min(candidates) / 2**20 if candidates else None
+
+
+def worker_count() -> int:
+    """WEB_CONCURRENCYが指定されていればその数。無ければCPU数とメモリから決める
+
+    処理はほとんどが外部APIの待ちで、待ちの間はイベントループが他のリクエストを進めるので、
+    ワーカーはCPU1つに1つで足りる（2n+1のような同期ワーカー向けの式は使わない）。
+    """
+    if settings.web_concurrency > 0:
+        return settings.web_concurrency
+    by_cpu = int(available_cpus())
+    memory = available_memory_mb()
+    by_memory = int(memory // settings.worker_memory_mb) if memory else by_cpu
+    return max(1, min(by_cpu, by_memory, settings.web_max_workers))
+
+
+def worker_environ(workers: int) -> dict[str, str]:
+    """ワーカーに引き継ぐ環境変数（ワーカーはこのプロセスの環境変数から設定を読み直す）"""
+    environ = {"WORKERS": str(workers)}
+    if settings.cache_backend == "memory":
+        # プロセスごとのキャッシュではワーカーの数だけLLMを呼び直すので、SQLiteのファイルで共有する
+        environ["CACHE_BACKEND"] = "sqlite"
+    return environ
+
+
+def _cgroup_cpu_quota() -> float | None:
+    # cgroup v2: "<quota> <period>"（制限なしは "max <period>"）
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        return int(quota) / int(period) if quota != "max" else None
+    except (OSError, ValueError):
+        pass
+    # cgroup v1（制限なしは -1）
+    quota = _read_int("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+    period = _read_int("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    return quota / period if quota and quota > 0 and period else None
+
+
+def _read_int(path: str) -> int | None:
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
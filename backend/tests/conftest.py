@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# src.config の設定はimport時に読まれるので、先にデータの置き場所を一時ディレクトリにする
+_data_dir = tempfile.mkdtemp(prefix="rakumane-test-")
+os.environ.update(
+    {
+        "ANTHROPIC_API_KEY": "",
+        "GEMINI_API_KEY": "",
+        "GUMROAD_ACCESS_TOKEN": "",
+        "CACHE_BACKEND": "memory",
+        "CACHE_DIR": _data_dir,
+        "SALES_DB_PATH": os.path.join(_data_dir, "sales.db"),
+        "TENANT_DB_PATH": os.path.join(_data_dir, "tenants.db"),
+    }
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
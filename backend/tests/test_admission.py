@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from src.services.admission import AdmissionController, Overloaded, TokenBucket
+
+
+def controller(**overrides) -> AdmissionController:
+    options = {"max_concurrency": 1, "max_queue": 10, "queue_timeout": 1.0, **overrides}
+    return AdmissionController("test", **options)
+
+
+async def hold(admission: AdmissionController, started: asyncio.Event, release: asyncio.Event) -> None:
+    async with admission.admit(1):
+        started.set()
+        await release.wait()
+
+
+def test_waiters_are_admitted_in_order():
+    async def run():
+        admission = controller()
+        order = []
+
+        async def one(i: int) -> None:
+            async with admission.admit(1):
+                order.append(i)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(one(i) for i in range(5)))
+        return order, admission.in_flight
+
+    order, in_flight = asyncio.run(run())
+    assert order == [0, 1, 2, 3, 4]
+    assert in_flight == 0
+
+
+def test_rejects_when_the_queue_is_full():
+    async def run():
+        admission = controller(max_queue=1)
+        started, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(admission, started, release))
+        await started.wait()
+        waiter = asyncio.create_task(hold(admission, asyncio.Event(), release))
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(Overloaded) as rejected:
+                async with admission.admit(1):
+                    pass
+            return rejected.value, admission.to_dict()
+        finally:
+            release.set()
+            await asyncio.gather(holder, waiter)
+
+    error, stats = asyncio.run(run())
+    assert error.reason == "queue_full"
+    assert error.retry_after >= 1
+    assert stats == {"inFlight": 1, "queued": 1, "rejected": 1}
+
+
+def test_rejects_after_the_queue_timeout():
+    async def run():
+        admission = controller(queue_timeout=0.05)
+        started, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(admission, started, release))
+        await started.wait()
+        try:
+            with pytest.raises(Overloaded) as rejected:
+                async with admission.admit(1):
+                    pass
+            return rejected.value, admission.to_dict()
+        finally:
+            release.set()
+            await holder
+
+    error, stats = asyncio.run(run())
+    assert error.reason == "timeout"
+    assert stats["queued"] == 0
+
+
+def test_rejects_at_once_when_tokens_cannot_refill_in_time():
+    async def run():
+        admission = controller(max_concurrency=10, tokens_per_minute=600, queue_timeout=1.0)
+        async with admission.admit(600):
+            pass
+        # 600トークンが貯まるまで60秒かかるので、1秒の期限を待たずに断る
+        with pytest.raises(Overloaded) as rejected:
+            async with admission.admit(600):
+                pass
+        return rejected.value
+
+    error = asyncio.run(run())
+    assert error.reason == "rate_limited"
+    assert error.retry_after >= 59
+
+
+def test_token_bucket():
+    bucket = TokenBucket(60)
+    assert bucket.wait_time(60) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+    # 容量を超える要求は満タンになれば通す
+    assert bucket.wait_time(1000) == pytest.approx(60.0, abs=0.1)
+    assert TokenBucket(0).wait_time(10**9) == 0
@@ -0,0 +1,45 @@
+import numpy as np
+
+from src.services.aggregation import SalesColumns, period_start
+
+ROWS = [
+    ("A", 1000, "2026-10-05T09:00:00Z"),
+    ("B", 3000, "2026-10-05T23:59:59Z"),
+    ("A", 500, "2026-10-07T00:00:00Z"),
+    ("C", 3000, "2026-11-02T12:00:00Z"),
+]
+
+
+def test_by_product_orders_by_revenue_and_keeps_first_seen_order_for_ties():
+    columns = SalesColumns.from_rows(ROWS)
+    assert (len(columns), columns.total_revenue) == (4, 7500)
+    assert [(p.productName, p.count, p.revenue) for p in columns.by_product()] == [
+        ("B", 1, 3000),
+        ("C", 1, 3000),
+        ("A", 2, 1500),
+    ]
+
+
+def test_by_period_groups_by_day_monday_week_and_month():
+    columns = SalesColumns.from_rows(ROWS)
+    assert columns.by_period("day") == [
+        ("2026-10-05", 2, 4000),
+        ("2026-10-07", 1, 500),
+        ("2026-11-02", 1, 3000),
+    ]
+    # 2026-10-05と2026-11-02は月曜日
+    assert columns.by_period("week") == [("2026-10-05", 3, 4500), ("2026-11-02", 1, 3000)]
+    assert columns.by_period("month") == [("2026-10-01", 3, 4500), ("2026-11-01", 1, 3000)]
+
+
+def test_week_starts_on_monday_for_every_weekday():
+    days = np.arange("2026-10-05", "2026-10-12", dtype="datetime64[D]")
+    assert set(period_start(days, "week").astype(str)) == {"2026-10-05"}
+
+
+def test_empty_rows():
+    columns = SalesColumns.from_rows([])
+    assert (len(columns), columns.total_revenue) == (0, 0)
+    assert columns.by_product() == []
+    assert columns.by_period("week") == []
+    assert columns.daily_sales() == []
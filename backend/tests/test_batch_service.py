@@ -0,0 +1,144 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import get_args
+
+import pytest
+
+from benchmarks.fake_anthropic import FakeAnthropicServer
+from src.config import settings
+from src.services import batch_service, claude_service
+from src.services.cache import MemoryCache, ResponseCache, SQLiteCache
+from src.types import GenerateRequest, GenerateResponse, ProductCategory
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(claude_service, "generation_cache", ResponseCache(MemoryCache(100), ttl=60))
+
+
+def run_job(requests: list[GenerateRequest], mode: str) -> batch_service.BatchJob:
+    job = batch_service.BatchJob(requests, mode)
+    asyncio.run(batch_service._run(job))
+    return job
+
+
+def product(name: str) -> GenerateResponse:
+    return GenerateResponse(productNames=[name], description="説明", suggestedPrice=1000, tags=[])
+
+
+def test_fanout_keeps_results_when_one_item_fails(monkeypatch):
+    async def generate(request):
+        if request.target == "壊れる":
+            raise RuntimeError("boom")
+        if request.target == "失敗":
+            # LLMが失敗したときはモックで埋めた結果が返る
+            return claude_service._generate_mock_response(request), "fallback"
+        return product(request.target), "llm"
+
+    monkeypatch.setattr(claude_service, "generate_product_with_source", generate)
+    requests = [GenerateRequest(category="notion", target=target) for target in ("A", "壊れる", "B", "失敗")]
+    status = run_job(requests, "fanout").to_status()
+
+    assert status.status == "completed"
+    assert (status.completed, status.failed) == (2, 2)
+    assert [result and result.productNames[0] for result in status.results] == ["A", None, "B", None]
+    assert status.errors == [None, "RuntimeError('boom')", None, "fallback"]
+
+
+def test_status_is_shared_with_other_workers(monkeypatch, tmp_path):
+    monkeypatch.setattr(batch_service, "_shared_jobs", SQLiteCache(str(tmp_path / "batch_jobs.db")))
+
+    async def generate(request):
+        await asyncio.sleep(0.01 if request.target == "A" else 0)
+        return product(request.target), "llm"
+
+    monkeypatch.setattr(claude_service, "generate_product_with_source", generate)
+    requests = [GenerateRequest(category="notion", target=target) for target in ("A", "B", "C")]
+    job = run_job(requests, "fanout")
+
+    # 別のワーカー（手元にジョブが無い）からは共有された最後の状態が見える
+    batch_service._jobs.pop(job.id, None)
+    status = asyncio.run(batch_service.get_job_status(job.id))
+    assert (status.status, status.completed) == ("completed", 3)
+    assert [result.productNames[0] for result in status.results] == ["A", "B", "C"]
+
+
+def test_fanout_without_providers_reports_mock_results_as_failures(monkeypatch):
+    monkeypatch.setattr(claude_service, "get_router", lambda: SimpleNamespace(providers=[]))
+    status = run_job([GenerateRequest(category="excel", target="会社員")], "fanout").to_status()
+    assert (status.status, status.completed, status.failed) == ("completed", 0, 1)
+    assert status.errors == ["mock"]
+
+
+@pytest.mark.parametrize("category", get_args(ProductCategory))
+def test_every_category_has_a_label_and_price_range(category):
+    request = GenerateRequest(category=category, target="会社員")
+    assert claude_service.CATEGORY_LABELS[category] in claude_service.build_prompt(request)
+    price_min, price_max = claude_service.PRICE_RANGES[category]
+    assert price_min <= claude_service._generate_mock_response(request).suggestedPrice <= price_max
+
+
+def test_message_batch_records_item_errors(monkeypatch):
+    def entry(custom_id: str, text: str | None) -> SimpleNamespace:
+        if text is None:
+            return SimpleNamespace(custom_id=custom_id, result=SimpleNamespace(type="errored"))
+        message = SimpleNamespace(content=[SimpleNamespace(text=text)])
+        return SimpleNamespace(custom_id=custom_id, result=SimpleNamespace(type="succeeded", message=message))
+
+    async def results(batch_id):
+        async def entries():
+            yield entry("0", json.dumps(product("A").model_dump(), ensure_ascii=False))
+            yield entry("1", None)
+            yield entry("2", "JSONではない")
+
+        return entries()
+
+    batches = SimpleNamespace(
+        create=lambda requests: _resolved(SimpleNamespace(id="batch_1", processing_status="ended")),
+        results=results,
+    )
+    client = SimpleNamespace(beta=SimpleNamespace(messages=SimpleNamespace(batches=batches)))
+    monkeypatch.setattr(claude_service, "get_client", lambda: client)
+
+    requests = [GenerateRequest(category="excel", target=target) for target in ("A", "B", "C", "D")]
+    status = run_job(requests, "batch").to_status()
+
+    assert status.status == "completed"
+    assert (status.completed, status.failed) == (1, 3)
+    assert status.results[0].productNames == ["A"]
+    assert status.errors == [None, "errored", "invalid_json", "missing"]
+
+
+def test_message_batch_skips_cached_requests(monkeypatch):
+    requests = [GenerateRequest(category="notion", target=target) for target in ("A", "B", "C")]
+    cache = claude_service.generation_cache
+    cache.set(claude_service.generation_cache_key(requests[1]), product("キャッシュ済み").model_dump_json())
+
+    with FakeAnthropicServer(latency=0) as anthropic:
+        monkeypatch.setattr(settings, "anthropic_api_key", "test")
+        monkeypatch.setattr(settings, "anthropic_base_url", anthropic.url)
+        monkeypatch.setattr(settings, "batch_poll_interval", 0.01)
+        monkeypatch.setattr(claude_service, "_client", None)
+
+        async def run():
+            claude_service.init_client()
+            try:
+                job = batch_service.BatchJob(requests, "batch")
+                await batch_service._run(job)
+                return job
+            finally:
+                await claude_service.close_client()
+
+        status = asyncio.run(run()).to_status()
+        # キャッシュにある1件はバッチに入れない
+        assert [len(batch["results"]) for batch in anthropic._batches.values()] == [2]
+
+    assert (status.status, status.completed, status.failed) == ("completed", 3, 0)
+    assert status.results[1].productNames == ["キャッシュ済み"]
+    # バッチの結果はキャッシュに入り、次からは /api/generate でも使われる
+    assert all(cache.get(claude_service.generation_cache_key(request)) for request in requests)
+
+
+async def _resolved(value):
+    return value
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.services.cache import MemoryCache, ResponseCache, SQLiteCache
+
+
+def test_key_normalizes_width_case_and_spaces():
+    key = ResponseCache.make_key("v1", category="notion", target="ＡＩ 副業　初心者")
+    assert key == ResponseCache.make_key("v1", category="notion", target="ai  副業 初心者 ")
+    assert key != ResponseCache.make_key("v2", category="notion", target="ai 副業 初心者")
+    # 空文字とNoneは同じ
+    assert ResponseCache.make_key("v1", notes=None) == ResponseCache.make_key("v1", notes="")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryCache(max_entries=2)
+    return SQLiteCache(str(tmp_path / "cache.db"), max_entries=2)
+
+
+def test_ttl_and_eviction(backend, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.services.cache.time.time", lambda: now[0])
+    backend.set("a", "1", ttl=10)
+    backend.set("b", "2", ttl=100)
+    assert backend.get("a") == "1"
+
+    now[0] += 20
+    assert backend.get("a") is None
+    backend.set("c", "3", ttl=100)
+    backend.set("d", "4", ttl=100)
+    # 件数上限を超えたら古いものから消える
+    assert backend.get("b") is None
+    assert (backend.get("c"), backend.get("d")) == ("3", "4")
+
+
+def test_sqlite_cache_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "cache.db")
+    SQLiteCache(path).set("key", "value", ttl=60)
+    assert SQLiteCache(path).get("key") == "value"
+
+
+def test_response_cache_stats():
+    cache = ResponseCache(MemoryCache(), ttl=60)
+    cache.get("missing")
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+    assert cache.stats() == {"backend": "MemoryCache", "hits": 1, "misses": 1, "hitRate": 0.5}
+    assert ResponseCache(None, ttl=60).get("key") is None
+
+
+def test_async_access_reads_sqlite_off_the_event_loop(tmp_path):
+    cache = ResponseCache(SQLiteCache(str(tmp_path / "cache.db")), ttl=60)
+    threads = []
+    get = cache.backend.get
+
+    def recording_get(key):
+        threads.append(threading.get_ident())
+        return get(key)
+
+    cache.backend.get = recording_get
+
+    async def run():
+        await cache.aset("key", "value")
+        return await cache.aget("key"), threading.get_ident()
+
+    value, loop_thread = asyncio.run(run())
+    assert value == "value"
+    # 他のワーカーの書き込みでロックを待っても、イベントループは止まらない
+    assert threads and loop_thread not in threads
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_anthropic import FakeAnthropicServer
+from src.config import settings
+from src.services import claude_service
+
+
+@pytest.fixture
+def anthropic(monkeypatch):
+    with FakeAnthropicServer(latency=0) as server:
+        monkeypatch.setattr(settings, "anthropic_api_key", "test")
+        monkeypatch.setattr(settings, "anthropic_base_url", server.url)
+        monkeypatch.setattr(settings, "anthropic_max_connections", 7)
+        monkeypatch.setattr(settings, "anthropic_max_keepalive_connections", 3)
+        monkeypatch.setattr(claude_service, "_client", None)
+        yield server
+
+
+def test_client_is_shared_and_uses_configured_limits(anthropic):
+    async def run():
+        client = claude_service.init_client()
+        try:
+            assert claude_service.get_client() is client
+            pool = client._client._transport._pool
+            assert (pool._max_connections, pool._max_keepalive_connections) == (7, 3)
+            # 同時の呼び出しも同じクライアント（接続プール）を使う
+            await asyncio.gather(*(claude_service._stream_product(claude_service.get_client(), "p") for _ in range(5)))
+            assert claude_service.get_client() is client and not client._client.is_closed
+        finally:
+            await claude_service.close_client()
+        return client
+
+    client = asyncio.run(run())
+    assert anthropic.requests == 5
+    # lifespanの終了で閉じ、次に使うときは作り直す
+    assert client._client.is_closed and claude_service._client is None
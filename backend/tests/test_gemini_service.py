@@ -0,0 +1,11 @@
+from src.config import settings
+from src.services.gemini_service import GeminiProvider
+
+
+def test_pool_uses_gemini_limits(monkeypatch):
+    monkeypatch.setattr(settings, "gemini_max_connections", 7)
+    monkeypatch.setattr(settings, "gemini_max_keepalive_connections", 3)
+    monkeypatch.setattr(settings, "anthropic_max_connections", 100)
+    provider = GeminiProvider({})
+    pool = provider._client._transport._pool
+    assert (pool._max_connections, pool._max_keepalive_connections) == (7, 3)
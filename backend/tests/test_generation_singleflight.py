@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.services import claude_service
+from src.services.cache import MemoryCache, ResponseCache
+from src.types import GenerateRequest, GenerateResponse
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """呼ばれるたびに別の結果を返す、少し待つLLM"""
+    calls = []
+
+    async def generate(request):
+        calls.append(request)
+        number = len(calls)
+        await asyncio.sleep(0.05)
+        return GenerateResponse(productNames=[f"案{number}"], description="説明", suggestedPrice=1000, tags=[])
+
+    monkeypatch.setattr(claude_service, "get_router", lambda: SimpleNamespace(providers=[object()]))
+    monkeypatch.setattr(claude_service, "_generate_with_llm", generate)
+    monkeypatch.setattr(claude_service, "generation_flight", claude_service.SingleFlight())
+    monkeypatch.setattr(claude_service, "generation_cache", ResponseCache(MemoryCache(100), ttl=60))
+    return calls
+
+
+def request(fresh: bool = False) -> GenerateRequest:
+    return GenerateRequest(category="notion", target="忙しい会社員", fresh=fresh)
+
+
+def test_concurrent_requests_share_one_call(llm):
+    async def run():
+        return await asyncio.gather(*(claude_service._generate_product(request()) for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert len(llm) == 1
+    assert {result.productNames[0] for result, _ in results} == {"案1"}
+
+
+def test_fresh_request_does_not_join_in_flight_call(llm):
+    async def run():
+        return await asyncio.gather(
+            claude_service._generate_product(request()), claude_service._generate_product(request(fresh=True))
+        )
+
+    (cached, _), (fresh, source) = asyncio.run(run())
+    assert len(llm) == 2
+    assert source == "llm"
+    assert fresh.productNames != cached.productNames
+
+
+def test_fresh_request_skips_cache(llm):
+    first, _ = asyncio.run(claude_service._generate_product(request()))
+    again, source = asyncio.run(claude_service._generate_product(request()))
+    assert (again, source) == (first, "cache")
+
+    fresh, source = asyncio.run(claude_service._generate_product(request(fresh=True)))
+    assert source == "llm"
+    assert fresh != first
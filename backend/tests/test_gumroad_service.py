@@ -0,0 +1,76 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.services import gumroad_service
+from src.services.gumroad_service import GumroadAPIError, iter_sales_pages, parse_ping
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    async def sleep(seconds):
+        pass
+
+    monkeypatch.setattr(gumroad_service.asyncio, "sleep", sleep)
+
+
+def collect(handler) -> list[list[dict]]:
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return [page async for page in iter_sales_pages(client, "token")]
+
+    return asyncio.run(run())
+
+
+def test_follows_next_page_key_until_the_last_page():
+    page_keys = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        page_key = request.url.params.get("page_key")
+        page_keys.append(page_key)
+        if page_key is None:
+            return httpx.Response(200, json={"sales": [{"id": "1"}], "next_page_key": "2"})
+        return httpx.Response(200, json={"sales": [{"id": page_key}]})
+
+    assert collect(handler) == [[{"id": "1"}], [{"id": "2"}]]
+    assert page_keys == [None, "2"]
+
+
+def test_retries_retryable_status_and_transport_errors():
+    responses = iter([httpx.Response(429, headers={"Retry-After": "1"}), httpx.ConnectError("reset")])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        response = next(responses, None)
+        if isinstance(response, Exception):
+            raise response
+        return response or httpx.Response(200, json={"sales": [{"id": "1"}]})
+
+    assert collect(handler) == [[{"id": "1"}]]
+
+
+def test_non_retryable_status_fails_at_once():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(401)
+
+    with pytest.raises(GumroadAPIError, match="401"):
+        collect(handler)
+    assert len(calls) == 1
+
+
+def test_parse_ping_converts_cents_and_rejects_bad_timestamps():
+    fields = {"sale_id": "s1", "price": "1980", "sale_timestamp": "2026-10-01T09:00:00Z"}
+    assert parse_ping(fields) == {
+        "id": "s1",
+        "product_name": "Unknown",
+        "price": "19.80",
+        "price_cents": 1980,
+        "created_at": "2026-10-01T09:00:00Z",
+    }
+    with pytest.raises(ValueError):
+        parse_ping({**fields, "sale_timestamp": "yesterday"})
+    with pytest.raises(ValueError):
+        parse_ping({"sale_id": "s1"})
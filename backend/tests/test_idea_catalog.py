@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+from typing import get_args
+
+from scripts import build_idea_catalog
+from src.services import claude_service
+from src.services.idea_catalog import IdeaCatalog
+from src.types import GenerateResponse, ProductCategory
+
+
+def product(name: str) -> GenerateResponse:
+    return GenerateResponse(productNames=[name], description="説明", suggestedPrice=1000, tags=[])
+
+
+def test_lookup_matches_contained_target(tmp_path):
+    catalog = IdeaCatalog(str(tmp_path / "catalog.json"))
+    catalog.load()
+    catalog.add("notion", "会社員", product("会社員の案"))
+    catalog.add("notion", "主婦", product("主婦の案"))
+
+    match = catalog.lookup("notion", "週末起業したい会社員")
+    assert match is not None and match.entry.result.productNames == ["会社員の案"]
+    assert catalog.lookup("canva", "会社員") is None
+    assert catalog.lookup("notion", "エンジニア") is None
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "catalog.json")
+    catalog = IdeaCatalog(path)
+    catalog.load()
+    catalog.add("excel", "会社員", product("古い案"))
+    catalog.add("excel", "会社員", product("新しい案"))
+    catalog.save()
+
+    loaded = IdeaCatalog(path)
+    assert loaded.lookup("excel", "会社員").entry.result.productNames == ["新しい案"]
+    assert loaded.stats()["entries"] == 1
+
+
+def test_build_skips_mock_results(tmp_path, monkeypatch):
+    # プロバイダーが無いとモックになるので、カタログには入れない
+    monkeypatch.setattr(claude_service, "get_router", lambda: SimpleNamespace(providers=[]))
+    catalog = IdeaCatalog(str(tmp_path / "catalog.json"))
+    catalog.load()
+    pairs = [(category, "会社員") for category in get_args(ProductCategory)]
+    assert asyncio.run(build_idea_catalog.build(catalog, pairs, 4)) == (0, len(pairs))
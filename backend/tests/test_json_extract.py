@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from src.services.json_extract import ExtractionError, JSONObjectExtractor, extract_json_object, model_validators
+from src.types import GenerateResponse
+
+PRODUCT = {
+    "productNames": ["案1", "案2"],
+    "description": "説明\n2行目",
+    "suggestedPrice": 1980,
+    "tags": ["notion", "副業"],
+}
+VALIDATORS = model_validators(GenerateResponse)
+
+
+def feed_in_chunks(text: str, size: int) -> JSONObjectExtractor:
+    extractor = JSONObjectExtractor(VALIDATORS)
+    for i in range(0, len(text), size):
+        if extractor.feed(text[i:i + size]):
+            break
+    return extractor
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_extracts_object_from_chunks(size):
+    text = "はい、提案です。\n```json\n" + json.dumps(PRODUCT, ensure_ascii=False) + "\n```\n以上です。"
+    extractor = feed_in_chunks(text, size)
+    assert extractor.done
+    assert extractor.finish() == PRODUCT
+
+
+def test_tolerates_trailing_commas_and_raw_newlines():
+    text = (
+        '{"productNames": ["案1", "案2",], "description": "説明\n2行目", '
+        '"suggestedPrice": 1980, "tags": ["notion", "副業"],}'
+    )
+    assert extract_json_object(text, VALIDATORS) == PRODUCT
+
+
+def test_escaped_quotes_and_nested_values():
+    text = r'{"description": "「\"引用\"」と \\", "meta": {"a": [1, {"b": "}"}]}}'
+    assert extract_json_object(text) == {"description": '「"引用"」と \\', "meta": {"a": [1, {"b": "}"}]}}
+
+
+def test_stops_reading_when_the_object_closes():
+    extractor = JSONObjectExtractor()
+    assert extractor.feed('{"a": 1}') is True
+    assert extractor.feed("後ろの文章 {") is True
+    assert extractor.finish() == {"a": 1}
+
+
+def test_fields_are_validated_as_soon_as_they_close():
+    extractor = JSONObjectExtractor(VALIDATORS)
+    extractor.feed('{"productNames": ["案1"], ')
+    assert extractor.fields == {"productNames": ["案1"]}
+    # 型が違う値は、残りを待たずにその時点で失敗する
+    with pytest.raises(ExtractionError, match="suggestedPrice"):
+        extractor.feed('"suggestedPrice": "高い", "descr')
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ("JSONはありません", "見つかりません"),
+        ('{"productNames": ["案1"]', "途中で終わっています"),
+        ('{"productNames": ["案1"]}', "必須の項目がありません"),
+        ('{"a": 1 "b": 2}', "予期しない文字"),
+        ('{"a": nope}', "JSONの値ではありません"),
+        ('{"a": undefined}', "予期しない文字"),
+    ],
+)
+def test_errors(text, message):
+    with pytest.raises(ExtractionError, match=message):
+        extract_json_object(text, VALIDATORS if "productNames" in text else None)
+
+
+def test_gives_up_on_a_long_preamble():
+    extractor = JSONObjectExtractor(max_preamble=10)
+    with pytest.raises(ExtractionError):
+        extractor.feed("前置き" * 10)
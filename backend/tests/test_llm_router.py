@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from src.services.admission import AdmissionController, Overloaded
+from src.services.llm_router import LLMRouter, ProviderStats
+from src.types import GenerateResponse
+
+
+class FakeProvider:
+    def __init__(self, name: str, delay: float = 0.0, fail: bool = False, overloaded: bool = False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.overloaded = overloaded
+        self.admission = AdmissionController(name, max_concurrency=10, max_queue=10, queue_timeout=1)
+        self.calls = 0
+        self.cancelled = 0
+
+    async def generate(self, prompt: str) -> GenerateResponse:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.overloaded:
+            raise Overloaded(self.name, "queue_full", 1)
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        return GenerateResponse(productNames=[self.name], description="説明", suggestedPrice=1000, tags=[])
+
+    async def aclose(self) -> None:
+        pass
+
+
+def generate(router: LLMRouter) -> str:
+    return asyncio.run(router.generate("prompt")).productNames[0]
+
+
+def test_fails_over_to_the_next_provider():
+    first, second = FakeProvider("first", fail=True), FakeProvider("second")
+    router = LLMRouter([first, second])
+    assert generate(router) == "second"
+    assert router.stats["first"].error_rate == 1.0
+
+
+def test_overloaded_is_not_counted_as_a_failure():
+    first, second = FakeProvider("first", overloaded=True), FakeProvider("second")
+    router = LLMRouter([first, second])
+    assert generate(router) == "second"
+    assert router.stats["first"].error_rate == 0.0
+
+
+def test_raises_the_last_error_when_every_provider_fails():
+    router = LLMRouter([FakeProvider("first", fail=True), FakeProvider("second", fail=True)])
+    with pytest.raises(RuntimeError, match="second failed"):
+        generate(router)
+
+
+def test_unhealthy_provider_is_tried_last():
+    first, second = FakeProvider("first", fail=True), FakeProvider("second")
+    router = LLMRouter([first, second], unhealthy_error_rate=0.5, cooldown=60)
+    for _ in range(5):
+        generate(router)
+    assert not router.stats["first"].healthy
+    assert [provider.name for provider in router.ranked()] == ["second", "first"]
+    calls = first.calls
+    generate(router)
+    assert first.calls == calls
+
+
+def test_ranks_by_median_latency():
+    router = LLMRouter([FakeProvider("slow"), FakeProvider("fast")])
+    for _ in range(5):
+        router.stats["slow"].record(2.0, True)
+        router.stats["fast"].record(0.5, True)
+    assert [provider.name for provider in router.ranked()] == ["fast", "slow"]
+
+
+def test_hedge_uses_the_faster_answer_and_cancels_the_other():
+    slow, fast = FakeProvider("slow", delay=5), FakeProvider("fast", delay=0.01)
+    router = LLMRouter([slow, fast], hedge=True, hedge_min_delay=0.05, hedge_max_delay=0.05)
+    assert generate(router) == "fast"
+    assert (router.hedged, router.hedge_wins, slow.cancelled) == (1, 1, 1)
+
+
+def test_hedge_switches_immediately_when_the_first_fails():
+    first, second = FakeProvider("first", fail=True), FakeProvider("second")
+    router = LLMRouter([first, second], hedge=True, hedge_min_delay=5, hedge_max_delay=5)
+    assert generate(router) == "second"
+    # 遅延を待たずに切り替えたのでヘッジには数えない
+    assert router.hedged == 0
+
+
+def test_hedge_delay_follows_p95():
+    router = LLMRouter([FakeProvider("first")], hedge_min_delay=1.0, hedge_max_delay=10.0)
+    assert router.hedge_delay(router.providers[0]) == 10.0
+    stats: ProviderStats = router.stats["first"]
+    for latency in (2.0, 2.0, 3.0, 3.0, 4.0):
+        stats.record(latency, True)
+    assert router.hedge_delay(router.providers[0]) == 4.0
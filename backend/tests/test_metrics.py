@@ -0,0 +1,125 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.services.metrics import MetricsMiddleware, Registry, span, upstream_call
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "説明", ("route",))
+    for value in (0.003, 0.003, 0.2, 100):
+        histogram.observe(value, "/api/generate")
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP latency_seconds 説明", "# TYPE latency_seconds histogram"]
+    assert 'latency_seconds_bucket{route="/api/generate",le="0.001"} 0' in lines
+    assert 'latency_seconds_bucket{route="/api/generate",le="0.005"} 2' in lines
+    assert 'latency_seconds_bucket{route="/api/generate",le="0.25"} 3' in lines
+    assert 'latency_seconds_bucket{route="/api/generate",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/api/generate"} 4' in lines
+    assert any(line.startswith('latency_seconds_sum{route="/api/generate"} 100.2') for line in lines)
+
+
+def test_counter_gauge_and_label_escaping():
+    registry = Registry()
+    counter = registry.counter("pings_total", "Ping", ("outcome",))
+    gauge = registry.gauge("subscribers", "購読数")
+    counter.inc(1, 'a"b\\c')
+    counter.inc(2, 'a"b\\c')
+    gauge.set(3)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE pings_total counter" in lines
+    assert 'pings_total{outcome="a\\"b\\\\c"} 3' in lines
+    assert "# TYPE subscribers gauge" in lines and "subscribers 3" in lines
+
+
+def test_upstream_call_records_outcome(monkeypatch):
+    from src.services import metrics
+
+    registry = Registry()
+    histogram = registry.histogram("upstream", "説明", ("upstream", "operation", "outcome"))
+    monkeypatch.setattr(metrics, "UPSTREAM_DURATION", histogram)
+
+    with upstream_call("gumroad", "sales") as call:
+        call.outcome = "429"
+    with pytest.raises(RuntimeError), upstream_call("anthropic", "messages"):
+        raise RuntimeError
+
+    lines = registry.render().splitlines()
+    assert 'upstream_count{upstream="gumroad",operation="sales",outcome="429"} 1' in lines
+    assert 'upstream_count{upstream="anthropic",operation="messages",outcome="error"} 1' in lines
+
+
+def test_middleware_labels_requests_with_the_route_template(monkeypatch):
+    from fastapi import FastAPI
+
+    from src.services import metrics
+
+    registry = Registry()
+    requests = registry.histogram("requests", "説明", ("route", "method", "status"))
+    stages = registry.histogram("stages", "説明", ("route", "stage"))
+    monkeypatch.setattr(metrics, "REQUEST_DURATION", requests)
+    monkeypatch.setattr(metrics, "STAGE_DURATION", stages)
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/jobs/{job_id}")
+    async def get_job(job_id: str) -> dict:
+        with span("lookup"):
+            return {"id": job_id}
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            await client.get("/jobs/1")
+            await client.get("/jobs/2")
+            await client.get("/missing")
+
+    asyncio.run(run())
+    counts = [line for line in registry.render().splitlines() if "_count" in line]
+    assert counts == [
+        'requests_count{route="/jobs/{job_id}",method="GET",status="200"} 2',
+        'requests_count{route="unmatched",method="GET",status="404"} 1',
+        'stages_count{route="/jobs/{job_id}",stage="lookup"} 2',
+    ]
+
+
+def test_workers_share_metrics_with_a_worker_label(tmp_path, monkeypatch):
+    from src.services import metrics_store
+    from src.services.metrics_store import MetricsStore
+
+    # 2つのワーカーがそれぞれ自分のregistryを持ち、同じファイルに書く
+    registries = [Registry(), Registry()]
+    for registry, pings in zip(registries, (2, 5)):
+        registry.histogram("latency_seconds", "説明", ("route",)).observe(0.2, "/api/sales")
+        registry.counter("pings_total", "Ping", ("outcome",)).inc(pings, "recorded")
+    stores = [MetricsStore(str(tmp_path / "metrics.db")) for _ in registries]
+    stores[0].publish("101", registries[0].snapshot())
+
+    monkeypatch.setattr(metrics_store, "registry", registries[1])
+    monkeypatch.setattr(metrics_store, "WORKER_ID", "102")
+    monkeypatch.setattr(metrics_store, "_store", stores[1])
+    lines = asyncio.run(metrics_store.render_all_workers()).splitlines()
+
+    # 答えたワーカーに関わらず、全ワーカーの系列が（混ざらずに）並ぶ
+    assert lines.count("# TYPE pings_total counter") == 1
+    assert 'pings_total{outcome="recorded",worker="101"} 2' in lines
+    assert 'pings_total{outcome="recorded",worker="102"} 5' in lines
+    assert 'latency_seconds_count{route="/api/sales",worker="101"} 1' in lines
+    assert 'latency_seconds_bucket{route="/api/sales",worker="102",le="0.25"} 1' in lines
+
+
+def test_stopped_workers_expire(tmp_path, monkeypatch):
+    from src.services import metrics_store
+    from src.services.metrics_store import MetricsStore
+
+    store = MetricsStore(str(tmp_path / "metrics.db"))
+    store.publish("101", {})
+    store.publish("102", {})
+    store.remove("102")
+    assert list(store.snapshots(max_age=60)) == ["101"]
+    monkeypatch.setattr(metrics_store.time, "time", lambda: 10**10)
+    assert store.snapshots(max_age=60) == {}
@@ -0,0 +1,213 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from benchmarks.fake_gumroad import FakeGumroadServer
+from src.config import settings
+from src.routers import sales as sales_router
+from src.services import gumroad_service, sales_ledger, tenant_store
+from src.services.sales_ledger import SalesLedger
+from src.services.sales_store import SalesStore
+from src.services.sales_sync import SalesSync
+from src.services.tenant_store import TenantStore
+
+PING_SECRET = "server-secret"
+FORM = {"Content-Type": "application/x-www-form-urlencoded"}
+
+
+@pytest.fixture
+def gumroad():
+    with FakeGumroadServer(0, latency=0, sales=[]) as server:
+        yield server
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch, gumroad):
+    """テストごとに空のストア・同期状態・Gumroadのスタブを使う"""
+    monkeypatch.setattr(settings, "gumroad_api_base", gumroad.url)
+    monkeypatch.setattr(settings, "gumroad_ping_secret", PING_SECRET)
+    monkeypatch.setattr(settings, "gumroad_access_token", "")
+    monkeypatch.setattr(sales_ledger, "_ledger", SalesLedger(SalesStore(str(tmp_path / "sales.db"))))
+    monkeypatch.setattr(sales_router, "sales_sync", SalesSync(0, 0))
+    store = TenantStore(str(tmp_path / "tenants.db"))
+    monkeypatch.setattr(tenant_store, "_store", store)
+    return store
+
+
+def call(requests):
+    """requests(client) をアプリに対して実行する"""
+    from main import app
+
+    async def run():
+        clients = gumroad_service.GumroadClients(8)
+        previous, gumroad_service.gumroad_clients = gumroad_service.gumroad_clients, clients
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                return await requests(client)
+        finally:
+            await clients.aclose()
+            gumroad_service.gumroad_clients = previous
+
+    return asyncio.run(run())
+
+
+def settings_body(gumroad_token: str, monthly_goal: int) -> dict:
+    return {"gumroadToken": gumroad_token, "monthlyGoal": monthly_goal}
+
+
+def tenant(name: str, key: str) -> dict:
+    return {"X-Tenant-Id": name, "Authorization": f"Bearer {key}"}
+
+
+async def send_ping(
+    client: httpx.AsyncClient, name: str, secret: str, sale_id: str, price: int = 1000
+) -> httpx.Response:
+    # Pingのpriceはセント単位
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    body = f"sale_id={sale_id}&product_name=P&price={price}&sale_timestamp={now}"
+    return await client.post("/api/gumroad/ping", params={"secret": secret, "tenant": name}, content=body, headers=FORM)
+
+
+def test_tenant_requests_need_the_tenant_key(store):
+    key_a = store.issue_key("a")
+    key_b = store.issue_key("b")
+
+    async def requests(client):
+        return [
+            (await client.get("/api/settings", headers={"X-Tenant-Id": "a"})).status_code,
+            (await client.get("/api/settings", headers=tenant("a", key_b))).status_code,
+            (await client.get("/api/settings", headers=tenant("unknown", key_a))).status_code,
+            (await client.post("/api/settings", headers={"X-Tenant-Id": "a"}, json=settings_body("x", 1))).status_code,
+            (await client.get("/api/sales", headers={"X-Tenant-Id": "a"})).status_code,
+            (await client.get("/api/sales/stream", params={"tenant": "a"})).status_code,
+            (await client.get("/api/settings", headers=tenant("a", key_a))).status_code,
+        ]
+
+    assert call(requests) == [401, 401, 401, 401, 401, 401, 200]
+    assert store.get("a").gumroad_token == ""
+
+
+def test_default_tenant_settings_need_the_admin_key(store, monkeypatch):
+    async def save(client, headers):
+        return (await client.post("/api/settings", headers=headers, json=settings_body("token", 1))).status_code
+
+    async def requests(client):
+        unconfigured = await save(client, {})
+        monkeypatch.setattr(settings, "admin_api_key", "admin-key")
+        return unconfigured, [
+            await save(client, {}),
+            await save(client, {"Authorization": "Bearer wrong"}),
+            await save(client, {"Authorization": "Bearer admin-key"}),
+        ]
+
+    unconfigured, statuses = call(requests)
+    # 既定のテナントはヘッダー無しで誰でも使えるので、キーを設定していなければ保存できない
+    assert unconfigured == 403
+    assert statuses == [401, 401, 200]
+    assert store.get("default").gumroad_token == "token"
+
+
+def test_ping_secret_is_only_returned_to_the_tenant(store):
+    key = store.issue_key("a")
+
+    async def requests(client):
+        default = (await client.get("/api/settings")).json()
+        own = (await client.get("/api/settings", headers=tenant("a", key))).json()
+        return default, own
+
+    default, own = call(requests)
+    # 既定のテナントの秘密は環境変数そのものなので、認証の無いリクエストには返さない
+    assert default["pingSecret"] == ""
+    assert own["pingSecret"] == sales_router.ping_secret("a") != PING_SECRET
+
+
+def test_tenants_are_isolated(store):
+    key_a, key_b = store.issue_key("a"), store.issue_key("b")
+
+    async def requests(client):
+        await client.post("/api/settings", headers=tenant("a", key_a), json=settings_body("token-a", 5))
+        await client.post("/api/settings", headers=tenant("b", key_b), json=settings_body("token-b", 7))
+        secret_a = (await client.get("/api/settings", headers=tenant("a", key_a))).json()["pingSecret"]
+        statuses = [
+            # aの秘密ではbの売上として送れない
+            (await send_ping(client, "b", secret_a, "1")).status_code,
+            (await send_ping(client, "a", PING_SECRET, "1")).status_code,
+        ]
+        # 再送された売上は数えない
+        outcomes = [(await send_ping(client, "a", secret_a, sale_id)).json()["status"] for sale_id in ("1", "2", "1")]
+        sales_a = (await client.get("/api/sales", headers=tenant("a", key_a))).json()
+        sales_b = (await client.get("/api/sales", headers=tenant("b", key_b))).json()
+        return statuses, outcomes, sales_a, sales_b
+
+    statuses, outcomes, sales_a, sales_b = call(requests)
+    assert statuses == [403, 403]
+    assert outcomes == ["recorded", "recorded", "duplicate"]
+    assert (sales_a["monthlyGoal"], sales_a["totalSales"], sales_a["totalRevenue"]) == (5, 2, 2000)
+    assert (sales_b["monthlyGoal"], sales_b["totalSales"]) == (7, 0)
+
+
+def test_ping_price_is_recorded_in_exact_cents(store):
+    key = store.issue_key("a")
+    store.save("a", tenant_store.TenantSettings(gumroad_token="token-a"))
+
+    async def requests(client):
+        secret = (await client.get("/api/settings", headers=tenant("a", key))).json()["pingSecret"]
+        # 19.99や0.29を100倍すると1998.99…・28.99…になるので、小数を経由すると1セント減る
+        for sale_id, price in (("1", 1999), ("2", 29)):
+            await send_ping(client, "a", secret, sale_id, price)
+        return (await client.get("/api/sales", headers=tenant("a", key))).json()
+
+    summary = call(requests)
+    assert summary["totalRevenue"] == 1999 + 29
+    assert summary["dailySales"][0]["revenue"] == 1999 + 29
+
+
+def test_stream_token(store):
+    key = store.issue_key("a")
+
+    async def requests(client):
+        return (await client.post("/api/sales/stream-token", headers=tenant("a", key))).json()
+
+    token = call(requests)["token"]
+    assert int(token.partition(".")[0]) > time.time()
+    assert asyncio.run(sales_router.get_stream_tenant("a", token)) == "a"
+    for name, value in (("b", token), ("a", "0." + token.partition(".")[2]), ("a", "")):
+        with pytest.raises(sales_router.HTTPException):
+            asyncio.run(sales_router.get_stream_tenant(name, value))
+
+    # キーを発行し直すと、前のキーで発行したトークンも使えなくなる
+    store.issue_key("a")
+    with pytest.raises(sales_router.HTTPException):
+        asyncio.run(sales_router.get_stream_tenant("a", token))
+
+
+def test_analytics_reads_the_rollups(store, gumroad):
+    gumroad.sales = [
+        {"id": "1", "product_name": "A", "price": "10", "created_at": "2026-09-30T10:00:00Z"},
+        {"id": "2", "product_name": "A", "price": "10", "created_at": "2026-10-01T10:00:00Z"},
+        {"id": "3", "product_name": "B", "price": "5", "created_at": "2026-10-08T10:00:00Z"},
+    ]
+    key = store.issue_key("a")
+    store.save("a", tenant_store.TenantSettings(gumroad_token="token-a"))
+
+    async def requests(client):
+        params = {"from": "2026-10-01", "to": "2026-10-14", "granularity": "week", "compare_to": "previous_period"}
+        response = await client.get("/api/sales/analytics", headers=tenant("a", key), params=params)
+        reversed_range = {"from": "2026-10-02", "to": "2026-10-01"}
+        invalid = await client.get("/api/sales/analytics", headers=tenant("a", key), params=reversed_range)
+        return response.json(), invalid.status_code
+
+    analytics, invalid = call(requests)
+    assert invalid == 422
+    current = analytics["current"]
+    assert (current["totalSales"], current["totalRevenue"]) == (2, 1500)
+    assert [(period["start"], period["count"]) for period in current["series"]] == [
+        ("2026-09-28", 1),
+        ("2026-10-05", 1),
+        ("2026-10-12", 0),
+    ]
+    assert analytics["comparison"]["totalSales"] == 1
+    assert analytics["salesChange"] == 1.0
@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+from src.services.sales_ledger import SalesLedger
+from src.services.sales_store import SalesStore
+
+ACCOUNT = "account"
+MONTH = ("2026-10", "2026-10-01", "2026-11-01")
+
+
+def sale(sale_id: str, price: int = 1000, product: str = "テンプレート", day: int = 1) -> dict:
+    # ストアはGumroadのpriceを100倍して持つ
+    created_at = f"2026-10-{day:02d}T09:00:00Z"
+    return {"id": sale_id, "product_name": product, "price": str(price / 100), "created_at": created_at}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "sales.db")
+
+
+def summary(ledger: SalesLedger):
+    return ledger.summary(ACCOUNT, *MONTH, 100000)
+
+
+def test_duplicate_sales_are_counted_once(path):
+    ledger = SalesLedger(SalesStore(path))
+    assert ledger.record(ACCOUNT, [sale("1"), sale("2")]) == 2
+    # Pingの再送とPull APIの同期で同じ売上が何度届いても数えない
+    assert ledger.record(ACCOUNT, [sale("1")]) == 0
+    assert ledger.record(ACCOUNT, [sale("2"), sale("3")]) == 1
+    assert (summary(ledger).totalSales, summary(ledger).totalRevenue) == (3, 3000)
+
+
+def test_totals_follow_new_sales_after_first_read(path):
+    ledger = SalesLedger(SalesStore(path))
+    ledger.record(ACCOUNT, [sale("1", product="A", day=1)])
+    assert summary(ledger).totalSales == 1
+
+    ledger.record(ACCOUNT, [sale("2", price=500, product="B", day=2), sale("3", product="A", day=2)])
+    cached = ledger.cached_summary(ACCOUNT, "2026-10", 100000)
+    assert (cached.totalSales, cached.totalRevenue) == (3, 2500)
+    assert [(p.productName, p.count, p.revenue) for p in cached.salesByProduct] == [("A", 2, 2000), ("B", 1, 500)]
+    assert [(d.date, d.revenue) for d in cached.dailySales] == [("2026-10-01", 1000), ("2026-10-02", 1500)]
+
+
+def test_cached_summary_does_not_touch_the_store(path):
+    ledger = SalesLedger(SalesStore(path))
+    assert ledger.cached_summary(ACCOUNT, "2026-10", 100000) is None
+    ledger.record(ACCOUNT, [sale("1")])
+    summary(ledger)
+
+    def fail(*args):
+        raise AssertionError("store accessed")
+
+    for name in ("data_version", "sales_after", "sales_between"):
+        setattr(ledger.store, name, fail)
+    assert ledger.cached_summary(ACCOUNT, "2026-10", 100000).totalSales == 1
+
+
+def test_listener_gets_latest_values_without_holding_the_lock(path):
+    ledger = SalesLedger(SalesStore(path))
+    summary(ledger)
+    received = []
+
+    def listener(account, month, delta):
+        # 累計のロックの外で呼ばれるので、listenerから累計を読んでも止まらない
+        received.append((account, month, delta, ledger.cached_summary(account, month, 100000).totalSales))
+
+    ledger.add_listener(listener)
+    ledger.record(ACCOUNT, [sale("1", day=3), sale("2", price=500, day=3)])
+    ledger.record(ACCOUNT, [sale("1", day=3)])
+
+    assert len(received) == 1
+    account, month, delta, total = received[0]
+    assert (account, month, total) == (ACCOUNT, "2026-10", 2)
+    assert delta["added"] == 2
+    assert (delta["totalSales"], delta["totalRevenue"]) == (2, 1500)
+    assert delta["days"] == [{"date": "2026-10-03", "revenue": 1500}]
+
+
+def test_refresh_picks_up_sales_from_other_workers(path):
+    first, second = SalesLedger(SalesStore(path)), SalesLedger(SalesStore(path))
+    summary(first), summary(second)
+    deltas = []
+    second.add_listener(lambda account, month, delta: deltas.append(delta["totalSales"]))
+
+    def write(ledger: SalesLedger, prefix: str) -> None:
+        for i in range(100):
+            ledger.record(ACCOUNT, [sale(f"{prefix}{i}", day=i % 28 + 1)])
+            if i % 7 == 0:
+                ledger.refresh()
+
+    threads = [threading.Thread(target=write, args=args) for args in ((first, "a"), (second, "b"))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 同じ売上も両方のワーカーから届く
+    first.record(ACCOUNT, [sale("b0")])
+    first.refresh(), second.refresh()
+
+    assert summary(first).totalSales == summary(second).totalSales == 200
+    assert deltas[-1] == 200
@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from src.services import gumroad_service
+from src.services.sales_ledger import SalesLedger
+from src.services.sales_store import SalesStore
+
+TOKEN = "token"
+ACCOUNT = SalesStore.account_key(TOKEN)
+
+
+def sale(sale_id: str, created_at: str) -> dict:
+    return {"id": sale_id, "product_name": "A", "price": "10", "created_at": created_at}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SalesStore(str(tmp_path / "sales.db"))
+
+
+def fake_pages(monkeypatch, sales: list[dict]) -> list:
+    """Gumroadの代わりに、afterより新しい日付の売上を1ページで返す。受け取ったafterを記録する"""
+    calls = []
+
+    async def iter_sales_pages(client, access_token, after=None):
+        calls.append(after)
+        yield [sale for sale in sales if after is None or sale["created_at"] >= after.isoformat()]
+
+    monkeypatch.setattr(gumroad_service, "iter_sales_pages", iter_sales_pages)
+    return calls
+
+
+def sync(store: SalesStore) -> int:
+    return asyncio.run(gumroad_service.sync_sales(TOKEN, SalesLedger(store), ACCOUNT))
+
+
+def test_account_key_does_not_store_the_token(store):
+    assert TOKEN not in ACCOUNT and len(ACCOUNT) == 32
+    assert SalesStore.account_key("other") != ACCOUNT
+
+
+def test_watermark_only_moves_forward(store):
+    assert store.watermark(ACCOUNT) is None
+    store.set_watermark(ACCOUNT, "2026-10-10T00:00:00Z")
+    # 遅れて終わった古い同期が同期位置を戻さない
+    store.set_watermark(ACCOUNT, "2026-10-01T00:00:00Z")
+    assert store.watermark(ACCOUNT) == "2026-10-10T00:00:00Z"
+
+
+def test_adding_a_sale_twice_keeps_one_row(store):
+    sales = [sale("1", "2026-10-01T10:00:00Z"), sale("2", "2026-10-01T11:00:00Z")]
+    assert len(store.add_sales(ACCOUNT, sales, 0)[1]) == 2
+    others, added = store.add_sales(ACCOUNT, sales[:1], store.max_rowid())
+    assert (others, added) == ([], [])
+    assert len(store.sales_between(ACCOUNT, "2026-10-01", "2026-10-02", store.max_rowid())) == 2
+
+
+def test_resync_only_fetches_after_the_watermark(store, monkeypatch):
+    sales = [sale("1", "2026-10-01T10:00:00Z"), sale("2", "2026-10-10T10:00:00Z")]
+    calls = fake_pages(monkeypatch, sales)
+    assert sync(store) == 2
+    assert store.watermark(ACCOUNT) == "2026-10-10T10:00:00Z"
+
+    # 同期位置の前日より古い売上は取りに行かない。重ねて取得した同日分は数えない
+    sales[:0] = [sale("old", "2026-09-01T10:00:00Z")]
+    sales.append(sale("3", "2026-10-12T10:00:00Z"))
+    assert sync(store) == 1
+    assert calls == [None, datetime(2026, 10, 9)]
+
+    assert store.watermark(ACCOUNT) == "2026-10-12T10:00:00Z"
+    rows = store.sales_between(ACCOUNT, "2026-09-01", "2026-11-01", store.max_rowid())
+    assert sorted(created_at[:10] for _, _, created_at in rows) == ["2026-10-01", "2026-10-10", "2026-10-12"]
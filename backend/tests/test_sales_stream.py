@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+from src.services.sales_ledger import SalesLedger
+from src.services.sales_store import SalesStore
+from src.services.sales_stream import SalesBroadcaster, Subscriber
+
+ACCOUNT = "account"
+
+
+def sale(sale_id: str, product: str = "A") -> dict:
+    return {"id": sale_id, "product_name": product, "price": "10", "created_at": "2026-10-01T09:00:00Z"}
+
+
+def parse(message: bytes) -> tuple[str, dict]:
+    event, data = message.decode("utf-8").strip().split("\n")
+    return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+def test_slow_subscriber_drops_queue_and_asks_for_resync():
+    subscriber = Subscriber(max_queue=2)
+    subscriber.push(b"1")
+    subscriber.push(b"2")
+    assert list(subscriber.queue) == [b"1", b"2"] and not subscriber.resync
+    subscriber.push(b"3")
+    # 溢れたら溜まった差分を捨て、snapshotを送り直すまで差分を受け取らない
+    assert (list(subscriber.queue), subscriber.resync) == ([], True)
+    subscriber.push(b"4")
+    assert list(subscriber.queue) == []
+    assert subscriber.ready.is_set()
+
+
+def test_deltas_reach_only_subscribers_of_the_same_month(tmp_path):
+    async def run():
+        ledger = SalesLedger(SalesStore(str(tmp_path / "sales.db")))
+        broadcaster = SalesBroadcaster(max_queue=10)
+        broadcaster.attach(ledger)
+        # 累計がある月だけ差分が出る
+        ledger.summary(ACCOUNT, "2026-10", "2026-10-01", "2026-11-01", 100000)
+        october_topic = broadcaster.subscribe(ACCOUNT, "2026-10")
+        september_topic = broadcaster.subscribe(ACCOUNT, "2026-09")
+        async with october_topic as october, september_topic as september:
+            assert broadcaster.subscribers == 2
+            await asyncio.to_thread(ledger.record, ACCOUNT, [sale("1"), sale("2", "B")])
+            # readyは_publish（call_soon_threadsafeでイベントループに積まれる）の中で立つ
+            await asyncio.wait_for(october.ready.wait(), 1)
+            assert len(october.queue) == 1 and not september.queue
+            event, data = parse(october.queue[0])
+            assert event == "delta"
+            assert (data["month"], data["totalSales"], data["totalRevenue"], data["added"]) == ("2026-10", 2, 2000, 2)
+            assert [p["productName"] for p in data["products"]] == ["A", "B"]
+        assert broadcaster.subscribers == 0
+
+    asyncio.run(run())
+
+
+def test_changes_without_subscribers_are_not_published(tmp_path):
+    async def run():
+        ledger = SalesLedger(SalesStore(str(tmp_path / "sales.db")))
+        broadcaster = SalesBroadcaster(max_queue=10)
+        broadcaster.attach(ledger)
+        ledger.summary(ACCOUNT, "2026-10", "2026-10-01", "2026-11-01", 100000)
+        async with broadcaster.subscribe(ACCOUNT, "2026-10") as subscriber:
+            pass
+        await asyncio.to_thread(ledger.record, ACCOUNT, [sale("1")])
+        await asyncio.sleep(0)
+        assert not subscriber.queue and not subscriber.ready.is_set()
+
+    asyncio.run(run())
+
+
+def test_subscribing_while_the_ledger_publishes_from_another_thread(tmp_path):
+    async def run():
+        ledger = SalesLedger(SalesStore(str(tmp_path / "sales.db")))
+        broadcaster = SalesBroadcaster(max_queue=1000)
+        broadcaster.attach(ledger)
+        ledger.summary(ACCOUNT, "2026-10", "2026-10-01", "2026-11-01", 100000)
+
+        def record():
+            for i in range(200):
+                ledger.record(ACCOUNT, [sale(str(i))])
+
+        async def churn():
+            # 購読の一覧が増減している間も、売上を追加するスレッドが一覧を読む
+            for i in range(200):
+                async with broadcaster.subscribe(ACCOUNT, f"2026-{i % 12 + 1:02d}"):
+                    await asyncio.sleep(0)
+
+        async with broadcaster.subscribe(ACCOUNT, "2026-10") as subscriber:
+            await asyncio.gather(asyncio.to_thread(record), churn())
+            await asyncio.sleep(0.05)
+            return subscriber
+
+    subscriber = asyncio.run(run())
+    assert len(subscriber.queue) == 200
+    assert parse(subscriber.queue[-1])[1]["totalSales"] == 200
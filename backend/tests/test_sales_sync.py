@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from benchmarks.fake_gumroad import FakeGumroadServer
+from src.config import settings
+from src.services import gumroad_service, sales_ledger
+from src.services.metrics import SALES_RECONCILED
+from src.services.sales_ledger import SalesLedger
+from src.services.sales_store import SalesStore
+from src.services.sales_sync import SalesSync
+
+TOKEN = "token"
+ACCOUNT = SalesStore.account_key(TOKEN)
+
+
+def sale(sale_id: str, price: str = "10") -> dict:
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return {"id": sale_id, "product_name": "A", "price": price, "created_at": now}
+
+
+@pytest.fixture
+def gumroad(tmp_path, monkeypatch):
+    with FakeGumroadServer(0, latency=0, sales=[]) as server:
+        monkeypatch.setattr(settings, "gumroad_api_base", server.url)
+        monkeypatch.setattr(sales_ledger, "_ledger", SalesLedger(SalesStore(str(tmp_path / "sales.db"))))
+        yield server
+
+
+def run(coroutine_function):
+    async def main():
+        clients = gumroad_service.GumroadClients(8)
+        previous, gumroad_service.gumroad_clients = gumroad_service.gumroad_clients, clients
+        try:
+            return await coroutine_function()
+        finally:
+            await clients.aclose()
+            gumroad_service.gumroad_clients = previous
+
+    return asyncio.run(main())
+
+
+def test_first_read_waits_for_sync(gumroad):
+    gumroad.sales = [sale("1"), sale("2", price="5")]
+    sync = SalesSync(0, 0)
+    summary = run(lambda: sync.get(TOKEN, 100000))
+    assert (summary.totalSales, summary.totalRevenue, summary.monthlyGoal) == (2, 1500, 100000)
+    assert summary.asOf is not None
+
+
+def test_reconcile_adds_sales_missed_by_pings(gumroad):
+    gumroad.sales = [sale("1")]
+    sync = SalesSync(0, 0)
+    before = SALES_RECONCILED._values.get((), 0)
+
+    async def scenario():
+        await sync.get(TOKEN, 100000)
+        # Pingで届いた売上と、Pingが届かなかった売上
+        assert await sync.record_ping(TOKEN, sale("2")) is True
+        assert await sync.record_ping(TOKEN, sale("2")) is False
+        gumroad.sales += [sale("2"), sale("3")]
+        await sync.reconcile(ACCOUNT)
+        return await sync.get(TOKEN, 100000)
+
+    summary = run(scenario)
+    assert summary.totalSales == 3
+    assert SALES_RECONCILED._values.get((), 0) - before == 1
+
+
+def test_recent_sync_by_another_worker_is_not_repeated(gumroad):
+    gumroad.sales = [sale("1")]
+    first, second = SalesSync(60, 0), SalesSync(60, 0)
+
+    async def scenario():
+        await first.get(TOKEN, 100000)
+        requests = gumroad.requests
+        summary = await second.get(TOKEN, 100000)
+        return requests, summary
+
+    requests, summary = run(scenario)
+    # 2つ目のワーカーはPull APIを呼ばず、ストアの売上から集計する
+    assert gumroad.requests == requests
+    assert summary.totalSales == 1
+
+
+def test_no_token_returns_mock_dashboard(gumroad):
+    summary = run(lambda: SalesSync(0, 0).get("", 5000))
+    assert summary.monthlyGoal == 5000
+    assert gumroad.requests == 0
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from src.services.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        number = len(calls)
+        await asyncio.sleep(0.01)
+        return number
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)), flight.do("other", fetch))
+
+    assert asyncio.run(run()) == [1, 1, 1, 1, 1, 2]
+    assert flight.stats() == {"calls": 2, "coalesced": 4, "inFlight": 0}
+
+
+def test_error_reaches_every_waiter_and_is_not_kept():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream")
+
+    async def ok():
+        return "ok"
+
+    async def run():
+        results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+        return results, await flight.do("key", ok)
+
+    results, after = asyncio.run(run())
+    assert [str(result) for result in results] == ["upstream", "upstream"]
+    assert after == "ok"
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_call():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        first = asyncio.create_task(flight.do("key", fetch))
+        second = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "done"
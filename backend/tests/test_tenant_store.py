@@ -0,0 +1,45 @@
+import asyncio
+
+from src.services import tenant_store
+from src.services.tenant_store import DEFAULT_TENANT, TenantSettings, TenantStore
+
+
+def test_settings_are_per_tenant(tmp_path):
+    store = TenantStore(str(tmp_path / "tenants.db"))
+    store.save("a", TenantSettings(gumroad_token="token-a", monthly_goal=5000))
+
+    assert store.get("a") == TenantSettings("token-a", 5000)
+    assert store.get("b") == TenantSettings()
+
+
+def test_env_token_is_only_for_default_tenant(monkeypatch):
+    monkeypatch.setattr(tenant_store.settings, "gumroad_access_token", "env-token")
+    assert TenantSettings().access_token(DEFAULT_TENANT) == "env-token"
+    assert TenantSettings().access_token("other") == ""
+    assert TenantSettings(gumroad_token="own").access_token(DEFAULT_TENANT) == "own"
+
+
+def test_cache_is_refreshed_after_other_process_writes(tmp_path):
+    path = str(tmp_path / "tenants.db")
+    first, second = TenantStore(path), TenantStore(path)
+    assert first.get("a") == TenantSettings()
+
+    second.save("a", TenantSettings(gumroad_token="token-a"))
+    # キャッシュはSQLiteを読まないので、refreshまでは古い値
+    assert first.cached("a") == TenantSettings()
+    assert first.refresh() is True
+    assert first.cached("a") is None
+    assert first.get("a").gumroad_token == "token-a"
+    assert first.refresh() is False
+
+
+def test_load_tenant_settings_uses_the_cache(tmp_path, monkeypatch):
+    store = TenantStore(str(tmp_path / "tenants.db"))
+    store.save("a", TenantSettings(gumroad_token="token-a"))
+    monkeypatch.setattr(tenant_store, "_store", store)
+
+    def fail(*args):
+        raise AssertionError("store read")
+
+    monkeypatch.setattr(store, "get", fail)
+    assert asyncio.run(tenant_store.load_tenant_settings("a")).gumroad_token == "token-a"
@@ -0,0 +1,82 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src import workers
+from src.config import settings
+from src.services.claude_service import ClaudeProvider
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def machine(monkeypatch):
+    """CPU数とメモリ（MB）を差し替える"""
+
+    def configure(cpus: float, memory_mb: float | None, **overrides) -> None:
+        monkeypatch.setattr(workers, "available_cpus", lambda: cpus)
+        monkeypatch.setattr(workers, "available_memory_mb", lambda: memory_mb)
+        options = {"web_concurrency": 0, "web_max_workers": 8, "worker_memory_mb": 256, **overrides}
+        for name, value in options.items():
+            monkeypatch.setattr(settings, name, value)
+
+    return configure
+
+
+@pytest.mark.parametrize(
+    "cpus, memory_mb, overrides, expected",
+    [
+        (4, 8192, {}, 4),
+        # cgroupのCPU制限が1.5なら1つ
+        (1.5, 8192, {}, 1),
+        # メモリ512MBにワーカー256MBなら2つまで
+        (4, 512, {}, 2),
+        (4, 100, {}, 1),
+        (4, None, {}, 4),
+        (32, 65536, {}, 8),
+        (32, 65536, {"web_max_workers": 16}, 16),
+        # WEB_CONCURRENCYは他の上限より優先する
+        (1, 100, {"web_concurrency": 6}, 6),
+    ],
+)
+def test_worker_count(machine, cpus, memory_mb, overrides, expected):
+    machine(cpus, memory_mb, **overrides)
+    assert workers.worker_count() == expected
+
+
+def test_cpu_quota_caps_the_affinity(monkeypatch):
+    monkeypatch.setattr(workers, "_cgroup_cpu_quota", lambda: 2.5)
+    assert workers.available_cpus() == min(len(os.sched_getaffinity(0)), 2.5)
+    monkeypatch.setattr(workers, "_cgroup_cpu_quota", lambda: None)
+    assert workers.available_cpus() == len(os.sched_getaffinity(0))
+
+
+def test_worker_environ_shares_the_memory_cache(monkeypatch):
+    monkeypatch.setattr(settings, "cache_backend", "memory")
+    assert workers.worker_environ(3) == {"WORKERS": "3", "CACHE_BACKEND": "sqlite"}
+    monkeypatch.setattr(settings, "cache_backend", "none")
+    assert workers.worker_environ(3) == {"WORKERS": "3"}
+
+
+def test_workers_read_the_environ(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "cache_backend", "memory")
+    env = {**os.environ, "CACHE_DIR": str(tmp_path), **workers.worker_environ(2)}
+    code = (
+        "from src.config import settings; from src.services.claude_service import generation_cache; "
+        "print(settings.workers, type(generation_cache.backend).__name__)"
+    )
+    # ワーカーは別のプロセスとして起動し、引き継いだ環境変数から設定を読む
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.split() == ["2", "SQLiteCache"]
+
+
+def test_per_minute_limits_are_split_across_workers(monkeypatch):
+    monkeypatch.setattr(settings, "anthropic_requests_per_minute", 60)
+    monkeypatch.setattr(settings, "anthropic_tokens_per_minute", 40000)
+    monkeypatch.setattr(settings, "workers", 4)
+    admission = ClaudeProvider().admission
+    assert (admission.requests.capacity, admission.tokens.capacity) == (15, 10000)
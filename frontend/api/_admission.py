@@ -0,0 +1,167 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from _metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_WAIT
+
+
+class Overloaded(Exception):
+    """順番待ちが溢れた、または期限までに順番が来なかった（503 Retry-Afterで返す）"""
+
+    def __init__(self, provider, reason, retry_after):
+        super().__init__(f"{provider} is overloaded ({reason})")
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """1分あたりper_minuteずつ補充され、最大per_minuteまで貯まる。0なら制限しない"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount):
+        """amountを取り出せるまでの秒数"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # 容量を超える要求は満タンになれば通す
+        return max(0.0, min(amount, self.capacity) - self.tokens) / self.rate
+
+    def take(self, amount):
+        if self.rate > 0:
+            self.tokens -= min(amount, self.capacity)
+
+
+class AdmissionController:
+    """プロバイダーごとのLLM呼び出しの流量制御
+
+    同時実行数とリクエスト数・入力トークン数のトークンバケットを満たすまで先着順に待たせる。
+    待ちがmax_queueを超えたとき、期限までにトークンが貯まらないときは即座に、
+    queue_timeout秒以内に順番が来なければその時点でOverloadedを送出する。
+    Vercelではインスタンスごとの制限になる（章ごとの並列生成や非同期ジョブの同時実行を絞る）。
+    """
+
+    def __init__(self, provider, max_concurrency, max_queue, queue_timeout, requests_per_minute=0, tokens_per_minute=0):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self.rejected = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def admit(self, tokens):
+        start = time.perf_counter()
+        with self._cond:
+            # 待ちが無く枠も空いていれば並ばずに通す
+            if self._queue or self._delay(tokens) > 0:
+                self._wait_in_queue(tokens, start)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            self._update_gauges()
+        ADMISSION_WAIT.observe(time.perf_counter() - start, self.provider, "admitted")
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._update_gauges()
+                self._cond.notify_all()
+
+    def retry_after(self):
+        """今の待ちが捌けるまでのおおよその秒数"""
+        return max(1, math.ceil(self.requests.wait_time(len(self._queue) + 1)), math.ceil(self.queue_timeout / 2))
+
+    def to_dict(self):
+        return {"inFlight": self.in_flight, "queued": len(self._queue), "rejected": self.rejected}
+
+    def _wait_in_queue(self, tokens, start):
+        if len(self._queue) >= self.max_queue:
+            self._reject("queue_full", start)
+        waiter = object()
+        self._queue.append(waiter)
+        self._update_gauges()
+        deadline = time.monotonic() + self.queue_timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                delay = remaining
+                if self._queue[0] is waiter:
+                    delay = self._delay(tokens)
+                    if delay == 0:
+                        return
+                    if math.isfinite(delay) and delay > remaining:
+                        # 期限までにトークンが貯まらないので待たずに断る
+                        self._reject("rate_limited", start, math.ceil(delay))
+                if remaining <= 0:
+                    self._reject("timeout", start)
+                self._cond.wait(min(delay, remaining))
+        finally:
+            self._queue.remove(waiter)
+            self._update_gauges()
+            # 先頭が抜けたので次の待ちを起こす
+            self._cond.notify_all()
+
+    def _delay(self, tokens):
+        """今すぐ通せるなら0、同時実行の枠待ちならinf、それ以外はトークンが貯まるまでの秒数"""
+        if self.in_flight >= self.max_concurrency:
+            return math.inf
+        return max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def _reject(self, reason, start, retry_after=None):
+        self.rejected += 1
+        ADMISSION_WAIT.observe(time.perf_counter() - start, self.provider, reason)
+        raise Overloaded(self.provider, reason, max(retry_after or 0, self.retry_after()))
+
+    def _update_gauges(self):
+        ADMISSION_QUEUE_DEPTH.set(len(self._queue), self.provider)
+        ADMISSION_IN_FLIGHT.set(self.in_flight, self.provider)
+
+
+# プロバイダー -> (環境変数の接頭辞, 分あたりのリクエスト数, 分あたりの入力トークン数) の既定値。
+# {接頭辞}_REQUESTS_PER_MINUTE / {接頭辞}_TOKENS_PER_MINUTE で上書きでき、0なら制限しない
+DEFAULT_LIMITS = {
+    "claude": ("ANTHROPIC", 50, 50000),
+    "gemini": ("GEMINI", 1000, 1000000),
+}
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_admission(provider):
+    """プロバイダーごとのAdmissionController（インスタンス内で共有する）"""
+    with _controllers_lock:
+        controller = _controllers.get(provider)
+        if controller is None:
+            prefix, requests_per_minute, tokens_per_minute = DEFAULT_LIMITS.get(provider, (provider.upper(), 0, 0))
+            controller = _controllers[provider] = AdmissionController(
+                provider,
+                max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "20")),
+                max_queue=int(os.environ.get("LLM_QUEUE_SIZE", "50")),
+                queue_timeout=float(os.environ.get("LLM_QUEUE_TIMEOUT", "10")),
+                requests_per_minute=float(os.environ.get(f"{prefix}_REQUESTS_PER_MINUTE", requests_per_minute)),
+                tokens_per_minute=float(os.environ.get(f"{prefix}_TOKENS_PER_MINUTE", tokens_per_minute)),
+            )
+        return controller
+
+
+def estimate_tokens(text):
+    """入力トークン数の概算。日本語はほぼ1文字1トークンなので文字数で数える"""
+    return len(text)
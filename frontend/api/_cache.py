@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+class MemoryCache:
+    """件数上限付きのLRUキャッシュ（ウォームなインスタンス間で共有される）"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteCache:
+    """再起動後も残るSQLiteキャッシュ"""
+
+    def __init__(self, path, max_entries=10000):
+        import sqlite3  # sqliteバックエンドを使うときだけ読み込む（コールドスタート短縮）
+
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(version, **fields):
+        normalized = {name: _normalize(value) for name, value in sorted(fields.items())}
+        raw = json.dumps([version, normalized], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        if self.backend is None:
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value):
+        if self.backend is not None:
+            self.backend.set(key, json.dumps(value, ensure_ascii=False), self.ttl)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else "disabled",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / total if total else 0.0,
+        }
+
+
+def _normalize(value):
+    if not value:
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", value).split()).lower()
+
+
+def build_cache(name):
+    backend_name = os.environ.get("GENERATE_CACHE_BACKEND", "memory")
+    max_entries = int(os.environ.get("GENERATE_CACHE_MAX_ENTRIES", "256"))
+    ttl = float(os.environ.get("GENERATE_CACHE_TTL", "86400"))
+
+    if backend_name == "sqlite":
+        cache_dir = os.environ.get("GENERATE_CACHE_DIR", "/tmp")
+        backend = SQLiteCache(os.path.join(cache_dir, f"rakumane-{name}.db"), max_entries)
+    elif backend_name == "memory":
+        backend = MemoryCache(max_entries)
+    else:
+        backend = None
+    return ResponseCache(backend, ttl)
@@ -0,0 +1,68 @@
+import zlib
+
+try:
+    import brotli  # 任意（requirements.txtに追加したときだけbrを使う）
+except ImportError:
+    brotli = None
+
+# これより小さい応答は圧縮しない（圧縮後のヘッダーと手間の方が大きい）
+MIN_SIZE = 1024
+
+
+def negotiate(accept_encoding):
+    """Accept-Encodingから圧縮方式を選ぶ（br > gzip）。圧縮しないならNone"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        # gzip.compressより速い（レベル6でも日本語の本文は1/3程度になる）
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        return compressor.compress(body) + compressor.flush()
+    return body
+
+
+class StreamCompressor:
+    """書き出すたびにflushする逐次圧縮（届いた分からクライアントで展開できる）"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=5)
+        elif encoding == "gzip":
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        else:
+            self._compressor = None
+
+    def compress(self, chunk):
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        if self.encoding == "gzip":
+            return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return chunk
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._compressor.finish()
+        if self.encoding == "gzip":
+            return self._compressor.flush()
+        return b""
@@ -0,0 +1,140 @@
+import http.client
+import json
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# 再利用した接続がサーバー側で既に閉じられていた場合に出る例外
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class HTTPStatusError(Exception):
+    def __init__(self, code, body):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+        self.body = body
+
+
+class ConnectionPool:
+    """1ホスト分のKeep-Alive接続プール
+
+    モジュールレベルで保持するため、ウォームなサーバーレスインスタンスでは
+    呼び出しをまたいでTCP/TLS接続を使い回せる。
+    """
+
+    def __init__(self, base_url, max_idle=4, ssl_context=None):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip("/")
+        self.max_idle = max_idle
+        self.ssl_context = ssl_context
+        self.connects = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def request(self, method, path, body=None, headers=None, timeout=120):
+        """(status, body) を返す。4xx/5xxはHTTPStatusErrorを送出する"""
+        with self.stream(method, path, body, headers, timeout) as response:
+            return response.status, response.read()
+
+    @contextmanager
+    def stream(self, method, path, body=None, headers=None, timeout=120):
+        """レスポンスを読みながら処理する。読み終えた接続はプールに戻す"""
+        conn, response = self._send(method, path, body, headers or {}, timeout)
+        if response.status >= 400:
+            error_body = response.read()
+            self._release(conn, response)
+            raise HTTPStatusError(response.status, error_body)
+        try:
+            yield response
+        except BaseException:
+            conn.close()
+            raise
+        if not response.isclosed():
+            # 読み切っていないレスポンスの接続は使い回せない
+            conn.close()
+        else:
+            self._release(conn, response)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _send(self, method, path, body, headers, timeout):
+        while True:
+            conn, reused = self._acquire(timeout)
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers)
+                return conn, conn.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                # アイドル中に切られた接続なら新しい接続で1回だけやり直す
+                if not reused:
+                    raise
+            except BaseException:
+                conn.close()
+                raise
+
+    def _acquire(self, timeout):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+
+        self.connects += 1
+        if self.scheme == "https":
+            conn = http.client.HTTPSConnection(self.host, self.port, timeout=timeout, context=self.ssl_context)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        return conn, False
+
+    def _release(self, conn, response):
+        if response.will_close:
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(base_url):
+    with _pools_lock:
+        pool = _pools.get(base_url)
+        if pool is None:
+            pool = _pools[base_url] = ConnectionPool(base_url)
+        return pool
+
+
+def iter_sse(response):
+    """Server-Sent Eventsを (event, data) の順で返す。dataはJSONとして読む"""
+    event = None
+    data_lines = []
+    for raw_line in response:
+        line = raw_line.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event = None
+            data_lines = []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
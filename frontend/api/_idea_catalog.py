@@ -0,0 +1,99 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+# backend/scripts/build_idea_catalog.py --output ../frontend/api/_idea_catalog.json で作る
+# （リポジトリには含めない。無ければカタログは空で、/api/generate/instant は404を返す）
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), "_idea_catalog.json")
+MIN_SIMILARITY = float(os.environ.get("IDEA_CATALOG_MIN_SIMILARITY", "0.5"))
+
+# 空白と記号は比較に使わない
+_IGNORED = re.compile(r"[\s\W_]+")
+
+
+def normalize_target(text):
+    """全角・半角と大文字・小文字をそろえ、空白と記号を取り除く"""
+    return _IGNORED.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def bigrams(text):
+    """文字バイグラム。日本語は分かち書きせずに比べられる（1文字ならその文字だけ）"""
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class IdeaCatalog:
+    """事前に生成した商品案のカタログ（読み取り専用。backend/src/services/idea_catalog.pyと同じ検索）
+
+    初回の検索時に同梱のJSONを読み込み、ターゲットの文字バイグラムの転置インデックスを作る。
+    """
+
+    def __init__(self, path, min_similarity=0.5):
+        self.path = path
+        self.min_similarity = min_similarity
+        self.hits = 0
+        self.misses = 0
+        # カテゴリ -> [(ターゲット, 生成結果, 生成日時, バイグラム)]
+        self._entries = {}
+        # カテゴリ -> バイグラム -> そのバイグラムを含むエントリの番号
+        self._postings = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            if os.path.exists(self.path):
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+                for item in data.get("entries", []):
+                    grams = frozenset(bigrams(normalize_target(item["target"])))
+                    if not grams:
+                        continue
+                    entries = self._entries.setdefault(item["category"], [])
+                    postings = self._postings.setdefault(item["category"], {})
+                    for gram in grams:
+                        postings.setdefault(gram, []).append(len(entries))
+                    entries.append((item["target"], item["result"], item.get("generatedAt", ""), grams))
+            self._loaded = True
+
+    def lookup(self, category, target):
+        """(生成結果, 一致したターゲット, 類似度, 生成日時) を返す。似た案が無ければNone"""
+        if not self._loaded:
+            self._load()
+        grams = bigrams(normalize_target(target))
+        entries = self._entries.get(category)
+        if not grams or not entries:
+            self.misses += 1
+            return None
+
+        postings = self._postings[category]
+        shared = Counter(i for gram in grams for i in postings.get(gram, ()))
+        best = None
+        best_similarity = 0.0
+        for i, count in shared.items():
+            entry_grams = entries[i][3]
+            similarity = (2 * count / (len(grams) + len(entry_grams)) + count / len(entry_grams)) / 2
+            if similarity > best_similarity:
+                best, best_similarity = entries[i], similarity
+        if best is None or best_similarity < self.min_similarity:
+            self.misses += 1
+            return None
+        self.hits += 1
+        matched_target, result, generated_at, _ = best
+        return result, matched_target, best_similarity, generated_at
+
+    def stats(self):
+        return {
+            "entries": sum(len(entries) for entries in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+idea_catalog = IdeaCatalog(CATALOG_PATH, MIN_SIMILARITY)
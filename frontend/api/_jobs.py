@@ -0,0 +1,104 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class JobQueue:
+    """SQLiteのジャーナルに永続化するバックグラウンドジョブキュー
+
+    外部ブローカーは使わない。プロセスが再起動しても、実行中だったジョブと
+    未実行のジョブはジャーナルから読み直して再実行する。
+    """
+
+    def __init__(self, path, runner, workers=2, ttl=86400.0):
+        self.runner = runner
+        self.workers = workers
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._queue = queue.Queue()
+        self._started = False
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT NOT NULL, "
+                "result TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("DELETE FROM jobs WHERE updated_at < ?", (time.time() - ttl,))
+            # 前回のプロセスで実行途中だったジョブはやり直す
+            self._conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+            pending = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at"
+            ).fetchall()
+        for (job_id,) in pending:
+            self._queue.put(job_id)
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(max(1, self.workers)):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def submit(self, params):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, params, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, json.dumps(params, ensure_ascii=False), now, now),
+            )
+        self.start()
+        self._queue.put(job_id)
+        return job_id
+
+    def get(self, job_id, wait=0.0):
+        """ジョブの状態を返す。waitを指定すると完了するまで最大wait秒待つ（ロングポーリング）"""
+        deadline = time.monotonic() + wait
+        with self._changed:
+            while True:
+                job = self._load(job_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job["status"] in ("completed", "failed") or remaining <= 0:
+                    return job
+                self._changed.wait(remaining)
+
+    def _load(self, job_id):
+        row = self._conn.execute(
+            "SELECT id, status, result, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = {"jobId": row[0], "status": row[1], "createdAt": row[3], "updatedAt": row[4]}
+        if row[2] is not None:
+            job["result"] = json.loads(row[2])
+        return job
+
+    def _set_status(self, job_id, status, result=None):
+        with self._changed, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None, time.time(), job_id),
+            )
+            self._changed.notify_all()
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                row = self._conn.execute("SELECT status, params FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row[0] != "queued":
+                continue
+
+            self._set_status(job_id, "running")
+            try:
+                result = self.runner(json.loads(row[1]))
+                self._set_status(job_id, "failed" if result.get("error") else "completed", result)
+            except Exception as e:
+                self._set_status(job_id, "failed", {"error": str(e)})
@@ -0,0 +1,211 @@
+import json
+import re
+
+_NUMBER = re.compile(r"-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?")
+_LITERALS = {"true", "false", "null"}
+_SCALAR_START = frozenset("-0123456789tfn")
+_SCALAR_END = frozenset(",}] \t\r\n")
+_WHITESPACE = frozenset(" \t\r\n")
+
+# 次に来るべきトークン
+_KEY_OR_END, _KEY, _COLON, _VALUE, _VALUE_OR_END, _COMMA_OR_END = range(6)
+
+
+class ExtractionError(ValueError):
+    """出力からJSONオブジェクトを取り出せない（続きを読んでも直らない）"""
+
+
+class JSONObjectExtractor:
+    """LLMの出力を受け取った順に読み、最初のJSONオブジェクトを取り出す
+
+    オブジェクトの前後の文章（前置きやコードフェンス）は読み飛ばし、末尾のカンマと
+    文字列中の改行は許容する。トップレベルの項目は値が閉じた時点でvalidatorsで検証し、
+    構文や型が壊れた時点でExtractionErrorを送出するので、出力の途中で打ち切って再試行できる。
+    """
+
+    def __init__(self, validators=None, max_preamble=1000):
+        self.validators = validators or {}
+        self.max_preamble = max_preamble
+        # 値が閉じたトップレベルの項目（検証済み）
+        self.fields = {}
+        self.done = False
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self._stack = []
+        self._expect = _VALUE
+        self._string_start = -1
+        self._scalar_start = -1
+        self._key = None
+        self._value_start = -1
+        self._comma = -1
+        self._dropped = []
+
+    def feed(self, chunk):
+        """出力の続きを渡す。オブジェクトが閉じたらTrueを返す（以降の入力は無視する）"""
+        if self.done:
+            return True
+        self._text += chunk
+        if not self._started:
+            start = self._text.find("{", self._pos)
+            if start < 0:
+                self._pos = len(self._text)
+                if self._pos > self.max_preamble:
+                    raise ExtractionError("JSONオブジェクトが見つかりません")
+                return False
+            self._started = True
+            self._pos = start
+        self._scan()
+        return self.done
+
+    def finish(self):
+        """出力の終わりで呼ぶ。取り出したオブジェクトを返す"""
+        if not self.done:
+            raise ExtractionError("JSONが途中で終わっています" if self._started else "JSONオブジェクトが見つかりません")
+        missing = [name for name in self.validators if name not in self.fields]
+        if missing:
+            raise ExtractionError(f"必須の項目がありません: {', '.join(missing)}")
+        return dict(self.fields)
+
+    def _scan(self):
+        text = self._text
+        end = len(text)
+        pos = self._pos
+        while pos < end and not self.done:
+            if self._string_start >= 0:
+                # 文字列の中は閉じる引用符までまとめて読み飛ばす
+                quote = text.find('"', pos)
+                while quote >= 0 and _escaped(text, quote):
+                    quote = text.find('"', quote + 1)
+                if quote < 0:
+                    pos = end
+                    break
+                pos = quote + 1
+                self._end_string(pos)
+                continue
+
+            char = text[pos]
+            if self._scalar_start >= 0:
+                if char not in _SCALAR_END:
+                    pos += 1
+                    continue
+                self._end_scalar(pos)
+            if char not in _WHITESPACE:
+                self._token(char, pos)
+            pos += 1
+        self._pos = pos
+
+    def _token(self, char, pos):
+        expect = self._expect
+        container = self._stack[-1] if self._stack else None
+        if expect == _COMMA_OR_END:
+            if char == ",":
+                self._comma = pos
+                self._expect = _KEY if container == "{" else _VALUE
+            elif char == ("}" if container == "{" else "]"):
+                self._close(pos)
+            else:
+                self._unexpected(char, pos)
+        elif expect in (_KEY_OR_END, _KEY):
+            if char == '"':
+                self._string_start = pos
+            elif char == "}":
+                self._close(pos)
+            else:
+                self._unexpected(char, pos)
+        elif expect == _COLON:
+            if char != ":":
+                self._unexpected(char, pos)
+            self._expect = _VALUE
+        elif char == "]" and container == "[":
+            self._close(pos)
+        else:
+            self._start_value(char, pos)
+
+    def _start_value(self, char, pos):
+        if len(self._stack) == 1:
+            self._value_start = pos
+        if char in "{[":
+            self._stack.append(char)
+            self._expect = _KEY_OR_END if char == "{" else _VALUE_OR_END
+        elif char == '"':
+            self._string_start = pos
+        elif char in _SCALAR_START:
+            self._scalar_start = pos
+        else:
+            self._unexpected(char, pos)
+
+    def _end_string(self, end):
+        start, self._string_start = self._string_start, -1
+        if self._expect in (_KEY_OR_END, _KEY):
+            if len(self._stack) == 1:
+                self._key = self._loads(start, end)
+            self._expect = _COLON
+        else:
+            self._end_value(end)
+
+    def _end_scalar(self, end):
+        token = self._text[self._scalar_start:end]
+        self._scalar_start = -1
+        if token not in _LITERALS and not _NUMBER.fullmatch(token):
+            raise ExtractionError(f"{token!r} はJSONの値ではありません")
+        self._end_value(end)
+
+    def _close(self, pos):
+        if self._expect in (_KEY, _VALUE):
+            # 閉じ括弧の直前のカンマは取り除いて扱う
+            self._dropped.append(self._comma)
+        self._stack.pop()
+        if self._stack:
+            self._end_value(pos + 1)
+        else:
+            self.done = True
+            self._pos = pos + 1
+
+    def _end_value(self, end):
+        self._expect = _COMMA_OR_END
+        if len(self._stack) != 1 or self._key is None:
+            return
+        name, self._key = self._key, None
+        value = self._loads(self._value_start, end)
+        validator = self.validators.get(name)
+        if validator is not None:
+            try:
+                value = validator(value)
+            except ValueError as e:
+                raise ExtractionError(f"{name} の値が不正です: {e}") from e
+        self.fields[name] = value
+
+    def _loads(self, start, end):
+        parts = []
+        for i in self._dropped:
+            if start <= i < end:
+                parts.append(self._text[start:i])
+                start = i + 1
+        parts.append(self._text[start:end])
+        try:
+            return json.loads("".join(parts), strict=False)
+        except ValueError as e:
+            raise ExtractionError(f"JSONとして読めません: {e}") from e
+
+    def _unexpected(self, char, pos):
+        raise ExtractionError(f"予期しない文字 {char!r} があります（{_excerpt(self._text, pos)}）")
+
+
+def _escaped(text, quote):
+    # 直前のバックスラッシュが奇数個ならエスケープされた引用符
+    backslashes = 0
+    while text[quote - backslashes - 1] == "\\":
+        backslashes += 1
+    return backslashes % 2 == 1
+
+
+def _excerpt(text, pos):
+    return text[max(0, pos - 20):pos + 1].replace("\n", " ")
+
+
+def extract_json_object(text, validators=None):
+    """出力全体から最初のJSONオブジェクトを取り出す（ストリーミングしない場合用）"""
+    extractor = JSONObjectExtractor(validators, max_preamble=len(text))
+    extractor.feed(text)
+    return extractor.finish()
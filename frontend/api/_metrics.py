@@ -0,0 +1,188 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+# 秒単位。LLM呼び出し（数秒〜数十秒）まで1つの区切りで扱う
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Prometheus形式のヒストグラム。ラベルの値はlabelnamesの順に位置引数で渡す"""
+
+    def __init__(self, name, help, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # ラベル値 -> [各バケットの件数..., +Infの件数, 合計]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)]
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series[:-1]):
+                cumulative += count
+                bucket_labels = ",".join([*pairs, f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            label_text = f'{{{",".join(pairs)}}}' if pairs else ""
+            lines.append(f"{self.name}_sum{label_text} {series[-1]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Prometheus形式のゲージ（現在値）。ラベルの値はlabelnamesの順に位置引数で渡す"""
+
+    def __init__(self, name, help, labelnames):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            pairs = [f'{name}="{_escape(label)}"' for name, label in zip(self.labelnames, labels)]
+            label_text = f'{{{",".join(pairs)}}}' if pairs else ""
+            lines.append(f"{self.name}{label_text} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, help, labelnames=()):
+        histogram = Histogram(name, help, labelnames)
+        self._metrics.append(histogram)
+        return histogram
+
+    def gauge(self, name, help, labelnames=()):
+        gauge = Gauge(name, help, labelnames)
+        self._metrics.append(gauge)
+        return gauge
+
+    def render(self):
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Vercelではインスタンスごとに別プロセスなので、値はそのインスタンスが処理した分だけになる
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    "rakumane_http_request_duration_seconds", "HTTPリクエストの処理時間", ("route", "method", "status")
+)
+STAGE_DURATION = registry.histogram(
+    "rakumane_stage_duration_seconds", "リクエスト内の処理段階ごとの所要時間", ("stage",)
+)
+GENERATION_DURATION = registry.histogram(
+    "rakumane_generation_duration_seconds", "生成の所要時間（カテゴリ・結果の出どころ別）", ("category", "source")
+)
+UPSTREAM_DURATION = registry.histogram(
+    "rakumane_upstream_request_duration_seconds", "外部APIの呼び出し時間", ("upstream", "operation", "outcome")
+)
+UPSTREAM_TTFT = registry.histogram(
+    "rakumane_upstream_time_to_first_token_seconds", "LLMの最初のトークンまでの時間", ("upstream",)
+)
+ADMISSION_WAIT = registry.histogram(
+    "rakumane_admission_wait_seconds", "LLM呼び出しの順番待ちの時間（結果別）", ("provider", "outcome")
+)
+ADMISSION_QUEUE_DEPTH = registry.gauge("rakumane_admission_queue_depth", "LLM呼び出しの順番待ちの数", ("provider",))
+ADMISSION_IN_FLIGHT = registry.gauge("rakumane_admission_in_flight", "実行中のLLM呼び出しの数", ("provider",))
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage)
+
+
+class UpstreamCall:
+    def __init__(self):
+        # 正常に抜けたときの記録値。HTTPステータスなどで上書きできる
+        self.outcome = "ok"
+
+
+@contextmanager
+def upstream_call(upstream, operation):
+    """外部APIの呼び出し時間を、結果（ok / error / 任意の値）と合わせて記録する"""
+    call = UpstreamCall()
+    start = time.perf_counter()
+    try:
+        yield call
+    except BaseException:
+        if call.outcome == "ok":
+            call.outcome = "error"
+        raise
+    finally:
+        UPSTREAM_DURATION.observe(time.perf_counter() - start, upstream, operation, call.outcome)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """リクエストごとの処理時間をルート・メソッド・ステータス別に記録するハンドラーの基底クラス
+
+    ルートのラベルはmetrics_routesのうちパスの末尾が一致したもの（該当なしは "other"）。
+    """
+
+    metrics_routes = ()
+
+    def send_response(self, code, message=None):
+        self._metrics_status = code
+        super().send_response(code, message)
+
+    def handle_one_request(self):
+        self._metrics_status = None
+        start = time.perf_counter()
+        super().handle_one_request()
+        if self._metrics_status is not None:
+            REQUEST_DURATION.observe(
+                time.perf_counter() - start, self._metrics_route(), self.command or "", str(self._metrics_status)
+            )
+
+    def _metrics_route(self):
+        path = urlsplit(self.path or "").path.rstrip("/")
+        for route in self.metrics_routes:
+            if path.endswith(route):
+                return route
+        return "other"
+
+    def send_metrics(self):
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import deque
+
+from _admission import Overloaded
+
+
+class Cancelled(Exception):
+    """ヘッジで負けた呼び出しを打ち切るときに送出する"""
+
+
+class ProviderStats:
+    """プロバイダーごとの直近の所要時間と成否"""
+
+    def __init__(self, window, unhealthy_error_rate, cooldown, min_samples=5):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.unhealthy_error_rate = unhealthy_error_rate
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self.unhealthy_until = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies.append(latency)
+            elif len(self.outcomes) >= self.min_samples and self._error_rate() >= self.unhealthy_error_rate:
+                # クールダウンの間は後回しにし、明けたら統計をやり直す
+                self.unhealthy_until = time.monotonic() + self.cooldown
+                self.outcomes.clear()
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.unhealthy_until
+
+    @property
+    def error_rate(self):
+        with self._lock:
+            return self._error_rate()
+
+    def quantile(self, q):
+        with self._lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self):
+        return {
+            "healthy": self.healthy,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "errorRate": round(self.error_rate, 3),
+            "samples": len(self.outcomes),
+        }
+
+    def _error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+
+class Router:
+    """直近の統計から速くて健全なプロバイダーを選んで生成する
+
+    プロバイダーは name・admission・generate(prompt, cancelled) を持つ。失敗したり流量制御で断られたりしたら次のプロバイダーに
+    切り替え、hedgeが有効なら1つ目の応答がp95を過ぎても返らないときに次のプロバイダーにも投げる。
+    """
+
+    def __init__(self, providers, hedge=False, hedge_min_delay=1.0, hedge_max_delay=10.0, window=100, unhealthy_error_rate=0.5, cooldown=30.0):
+        self.providers = providers
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.stats = {provider.name: ProviderStats(window, unhealthy_error_rate, cooldown) for provider in providers}
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def ranked(self):
+        """健全なものを直近の中央値の速い順に。統計が無いものは設定順で先頭に置く"""
+
+        def score(item):
+            index, provider = item
+            stats = self.stats[provider.name]
+            return (not stats.healthy, stats.quantile(0.5) or 0.0, index)
+
+        return [provider for _, provider in sorted(enumerate(self.providers), key=score)]
+
+    def hedge_delay(self, provider):
+        p95 = self.stats[provider.name].quantile(0.95)
+        if p95 is None:
+            return self.hedge_max_delay
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, p95))
+
+    def generate(self, prompt):
+        order = self.ranked()
+        if not order:
+            raise RuntimeError("no LLM provider is configured")
+
+        error = None
+        step = 2 if self.hedge else 1
+        for i in range(0, len(order), step):
+            try:
+                if self.hedge and i + 1 < len(order):
+                    return self._race(order[i], order[i + 1], prompt)
+                return self._call(order[i], prompt, None)
+            except Exception as e:
+                error = e
+        raise error
+
+    def to_dict(self):
+        return {
+            "providers": {
+                provider.name: {**self.stats[provider.name].to_dict(), **provider.admission.to_dict()}
+                for provider in self.providers
+            },
+            "hedged": self.hedged,
+            "hedgeWins": self.hedge_wins,
+        }
+
+    def _race(self, primary, hedge, prompt):
+        from concurrent.futures import FIRST_COMPLETED, wait  # ヘッジを使うときだけ読み込む（コールドスタート短縮）
+
+        cancelled = threading.Event()
+        executor = self._get_executor()
+        futures = [executor.submit(self._call, primary, prompt, cancelled)]
+        try:
+            wait(futures, timeout=self.hedge_delay(primary))
+            # 遅延までに返らなければ次のプロバイダーにも投げる。失敗していたら即座に切り替える
+            hedged = not futures[0].done()
+            if hedged:
+                with self._lock:
+                    self.hedged += 1
+            if hedged or futures[0].exception() is not None:
+                futures.append(executor.submit(self._call, hedge, prompt, cancelled))
+
+            error = None
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if hedged and future is not futures[0]:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            # 負けた方はストリームの次の行を読んだところで打ち切られる
+            cancelled.set()
+
+    def _call(self, provider, prompt, cancelled):
+        start = time.perf_counter()
+        try:
+            result = provider.generate(prompt, cancelled)
+        except (Cancelled, Overloaded):
+            # 打ち切ったものと流量制御で断ったものはプロバイダーの失敗として数えない
+            raise
+        except Exception as e:
+            print(f"LLM provider {provider.name} failed: {e!r}")
+            self.stats[provider.name].record(time.perf_counter() - start, False)
+            raise
+        self.stats[provider.name].record(time.perf_counter() - start, True)
+        return result
+
+    def _get_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+            return self._executor
@@ -1,8 +1,17 @@
 import json
 import os
-import urllib.request
-import urllib.error
-from http.server import BaseHTTPRequestHandler
+import random
+import threading
+import time
+from functools import lru_cache
+from urllib.parse import parse_qs, quote, urlparse
+
+from _admission import Overloaded, estimate_tokens, get_admission
+from _cache import ResponseCache
+from _content_encoding import MIN_SIZE, StreamCompressor, compress, negotiate
+from _http import HTTPStatusError, get_pool, iter_sse
+from _metrics import GENERATION_DURATION, UPSTREAM_TTFT, MetricsHandler, upstream_call
+from _singleflight import SingleFlight
 
 CATEGORY_LABELS = {
     "prompt": "AIプロンプト集",
@@ -19,847 +28,302 @@ CATEGORY_LABELS = {
     "course": "オンラインコース",
 }
 
-# カテゴリ別のコンテンツ生成プロンプト（高品質版）
-CONTENT_PROMPTS = {
-    "prompt": """あなたは年収1000万円以上を稼ぐトップクラスのAIプロンプトエンジニアです。
-以下の商品情報に基づいて、購入者が「これは買ってよかった」と思える最高品質のプロンプト集を作成してください。
+# カテゴリ別のコンテンツ生成プロンプト（高品質版）は _prompts/<カテゴリ>.txt に置き、使うカテゴリだけ読み込む
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_prompts")
 
-【商品名】{product_name}
-【ターゲット】{target}
-{additional_notes}
-
-【絶対に守るルール】
-・#や*などのマークダウン記号は一切使用禁止
-・見出しは「■」「◆」「◇」を使用
-・箇条書きは「・」を使用
-・区切り線は「━━━━━━━━━━」を使用
-・番号は「1.」「2.」など普通の数字を使用
-
-【必須の品質基準】
-・各プロンプトは実際にChatGPTやClaudeにコピペしてすぐ使える完成形であること
-・抽象的な説明ではなく、具体的な指示文を書くこと
-・「〇〇を入力」のような穴埋め箇所は [ ] で明示すること
-・各プロンプトに期待される出力例を1つ添えること
-
-【構成】
-■ はじめに（このプロンプト集の使い方と効果）
-
-■ 第1章：[テーマに合った章タイトル]
-プロンプト1〜10（各プロンプトに使い方と出力例を添える）
 
-■ 第2章：[テーマに合った章タイトル]
-プロンプト11〜20
+CLAUDE_MODEL = "claude-3-5-sonnet-20241022"
+ANTHROPIC_BASE_URL = os.environ.get("ANTHROPIC_BASE_URL", "https://api.anthropic.com")
 
-■ 第3章：[テーマに合った章タイトル]
-プロンプト21〜30
+# 章ごとの並列生成（mode="chapters"）
+CHAPTER_CONCURRENCY = int(os.environ.get("CONTENT_CHAPTER_CONCURRENCY", "4"))
+CHAPTER_MAX_RETRIES = int(os.environ.get("CONTENT_CHAPTER_MAX_RETRIES", "2"))
+CHAPTER_MAX_TOKENS = 4096
 
-■ 第4章：[テーマに合った章タイトル]
-プロンプト31〜40
-
-■ 第5章：[テーマに合った章タイトル]
-プロンプト41〜50
-
-■ ボーナス：上級者向けプロンプトテクニック
-
-■ おわりに
+# 非同期生成ジョブが混雑で並び直せる時間（秒）。関数の実行時間の上限（vercel.jsonのmaxDuration: 300）より短くし、
+# 打ち切られる前にジョブを失敗にする（打ち切られると完了も失敗も記録されず、クライアントが待ち続ける）
+JOB_DEADLINE_SECONDS = float(os.environ.get("CONTENT_JOB_DEADLINE_SECONDS", "240"))
 
-合計50個以上のプロンプトを含む、8000文字以上の充実した内容を出力してください。""",
-
-    "ebook": """あなたは累計100万部以上を売り上げたベストセラー作家です。
-以下の商品情報に基づいて、読者の人生を変えるほど価値のある電子書籍を執筆してください。
-
-【商品名】{product_name}
+# 商品ごとに変わる部分はuserメッセージに分け、固定のsystemプロンプトはプロンプトキャッシュに載せる
+USER_PROMPT = """【商品名】{product_name}
 【ターゲット】{target}
-{additional_notes}
-
-【絶対に守るルール】
-・#や*などのマークダウン記号は一切使用禁止
-・見出しは「■」「◆」「◇」を使用
-・箇条書きは「・」を使用
-・区切り線は「━━━━━━━━━━」を使用
-
-【必須の品質基準】
-・読者が「これは有料の価値がある」と感じる深い内容
-・具体的な事例、数字、エピソードを豊富に含める
-・各章の最後に「今すぐできるアクション」を3つ以上記載
-・専門用語は使わず、中学生でも理解できる言葉で書く
+{additional_notes}"""
 
-【構成】
-■ はじめに
-・この本を手に取ったあなたへ
-・この本で得られる3つのこと
-・読み方のコツ
-
-■ 第1章：[導入・問題提起]
-（2000文字以上、具体的なエピソードから始める）
+CONTENT_INSTRUCTION = """
 
-■ 第2章：[基礎知識・マインドセット]
-（2000文字以上、なぜそれが重要なのかを徹底解説）
+上記の商品について、指示に従ってコンテンツを作成してください。"""
 
-■ 第3章：[実践方法ステップ1]
-（2000文字以上、具体的な手順を詳細に）
+OUTLINE_INSTRUCTION = """
 
-■ 第4章：[実践方法ステップ2]
-（2000文字以上、よくある失敗と対処法も含める）
+━━━━━━━━━━
+上記の商品について、指示の【構成】にある「■」の見出しを上から順に、この商品向けの具体的な見出しに置き換えてください。
+本文は書かず、見出しのみをJSON配列で出力してください（例: ["■ はじめに", "■ 第1章：〇〇"]）。"""
 
-■ 第5章：[応用・発展]
-（2000文字以上、上級者向けのテクニック）
+CHAPTER_INSTRUCTION = """
 
-■ 第6章：[成功事例・ケーススタディ]
-（2000文字以上、3つ以上の具体的な成功例）
-
-■ おわりに
-・まとめ
-・読者へのメッセージ
-・次のステップ
+━━━━━━━━━━
+上記の商品について、指示に従って作成するコンテンツ全体の見出しは以下の通りです。
+{outline}
 
-合計12000文字以上の充実した内容を出力してください。""",
+今回は「{chapter_title}」の部分のみを、見出しから書き始めて作成してください。
+他の部分は別途作成するため出力しないでください。品質基準とルールはそのまま守ってください。"""
 
-    "checklist": """あなたは世界的に有名な生産性コンサルタントです。
-以下の商品情報に基づいて、使うだけで確実に成果が出るチェックリストを作成してください。
-
-【商品名】{product_name}
-【ターゲット】{target}
-{additional_notes}
-
-【絶対に守るルール】
-・#や*などのマークダウン記号は一切使用禁止
-・見出しは「■」「◆」「◇」を使用
-・チェック項目は「□」を使用
-・区切り線は「━━━━━━━━━━」を使用
-
-【必須の品質基準】
-・各チェック項目は具体的で、すぐに行動できる内容
-・「〇〇する」という動詞で終わる明確なアクション
-・チェックする順番に意味があること（論理的な流れ）
-・各セクションに「なぜこれが重要か」の説明を添える
-
-【構成】
-■ このチェックリストについて
-・対象者
-・使い方
-・期待できる効果
-
-■ 事前準備チェックリスト（10項目）
-□ 具体的なアクション1
-□ 具体的なアクション2
-...
-
-■ メインチェックリスト：[フェーズ1の名前]（15項目）
-◇ このフェーズの目的
-□ 具体的なアクション
-...
-
-■ メインチェックリスト：[フェーズ2の名前]（15項目）
-
-■ メインチェックリスト：[フェーズ3の名前]（15項目）
-
-■ 仕上げチェックリスト（10項目）
-
-■ トラブルシューティング
-・よくある問題と解決策を5つ以上
-
-■ 振り返りシート
-・成果を記録する欄
-・改善点を書く欄
-・次回への申し送り欄
-
-合計60項目以上、6000文字以上の充実した内容を出力してください。""",
-
-    "course": """あなたは受講生の人生を変えてきた伝説的なオンライン講師です。
-受講料10万円でも「安い」と言われるレベルの、圧倒的に価値のあるオンラインコース教材を作成してください。
-
-【商品名】{product_name}
-【ターゲット】{target}
-{additional_notes}
 
-【絶対に守るルール】
-・#や*などのマークダウン記号は一切使用禁止
-・見出しは「■」「◆」「◇」を使用
-・箇条書きは「・」を使用
-・区切り線は「━━━━━━━━━━」を使用
+@lru_cache(maxsize=None)
+def content_system_prompt(category: str):
+    """カテゴリのsystemプロンプトを初回利用時に読み込む。未知のカテゴリはプロンプト集として扱う"""
+    if category not in CATEGORY_LABELS:
+        category = "prompt"
+    with open(os.path.join(PROMPTS_DIR, f"{category}.txt"), encoding="utf-8") as f:
+        return f.read()
 
-【必須の品質基準】
-・受講生が確実にスキルを身につけられる段階的なカリキュラム
-・各レッスンに具体的なワーク・演習を含める
-・実際の事例やケーススタディを豊富に盛り込む
-・つまずきやすいポイントと解決策を先回りして説明
 
-【構成】
+def build_content_messages(category: str, product_name: str, target: str, additional_notes: str = "", instruction: str = CONTENT_INSTRUCTION):
+    """(cache_control付きのsystemブロック, userメッセージ) を返す"""
+    system = [{"type": "text", "text": content_system_prompt(category), "cache_control": {"type": "ephemeral"}}]
 
-■ コース概要
-・このコースで得られる成果（具体的に3つ以上）
-・対象者と前提知識
-・学習の進め方
-・修了までの目安時間
-
-■ モジュール1：[基礎・導入]
-◆ レッスン1-1：[タイトル]
-・学習目標
-・講義内容（1500文字以上の詳細な解説）
-・重要ポイントまとめ
-・実践ワーク
-
-◆ レッスン1-2：[タイトル]
-（同様の構成）
-
-◆ レッスン1-3：[タイトル]
-
-◆ モジュール1確認テスト（5問）
-
-■ モジュール2：[実践・基本スキル]
-◆ レッスン2-1〜2-3
-◆ モジュール2確認テスト
-
-■ モジュール3：[実践・応用スキル]
-◆ レッスン3-1〜3-3
-◆ モジュール3確認テスト
-
-■ モジュール4：[発展・プロレベル]
-◆ レッスン4-1〜4-3
-◆ モジュール4確認テスト
-
-■ モジュール5：[総合演習・実践プロジェクト]
-・課題の説明
-・ステップバイステップのガイド
-・評価基準
-・模範解答例
-
-■ ボーナスコンテンツ
-・よくある質問と回答（10個以上）
-・追加リソース・参考資料
-・修了後の次のステップ
-
-■ 修了証について
-
-合計15レッスン以上、15000文字以上の充実した内容を出力してください。""",
-
-    "notion": """あなたはNotionを使った業務改善で数々の企業を成功に導いたコンサルタントです。
-購入者の生産性を劇的に向上させるNotionテンプレートのガイドを作成してください。
-
-【商品名】{product_name}
-【ターゲット】{target}
-{additional_notes}
-
-【絶対に守るルール】
-・#や*などのマークダウン記号は一切使用禁止
-・見出しは「■」「◆」「◇」を使用
-・箇条書きは「・」を使用
-・区切り線は「━━━━━━━━━━」を使用
-
-【必須の品質基準】
-・実際にNotionで再現できる具体的な設定手順
-・データベースのプロパティは型まで明記
-・ビューの設定方法を詳細に説明
-・活用シーンごとの使い方を具体的に
-
-【構成】
-■ テンプレート概要
-・解決できる課題
-・得られる効果
-・必要な前提知識
-
-■ テンプレート構成図
-・全体の構造を図解的に説明
-
-■ データベース1：[名前]
-◆ 目的と役割
-◆ プロパティ一覧
-・プロパティ名 / 型 / 用途 / 設定値
-（10個以上のプロパティを詳細に）
-◆ ビュー設定
-・ビュー名 / 種類 / フィルター / ソート
-（5つ以上のビューを詳細に）
-
-■ データベース2：[名前]
-（同様の構成）
-
-■ データベース3：[名前]
-（同様の構成）
-
-■ ページ構成
-・トップページの構成と役割
-・各サブページの説明
-
-■ リレーションとロールアップの設定
-・どのDBをどう連携させるか
-・自動計算の設定方法
-
-■ 使い方ガイド
-◆ 初期設定（ステップバイステップ）
-◆ 日常的な使い方
-◆ 週次レビューの方法
-◆ 月次振り返りの方法
-
-■ カスタマイズ例
-・ケース1：〇〇な人向けのカスタマイズ
-・ケース2：△△な人向けのカスタマイズ
-・ケース3：□□な人向けのカスタマイズ
-
-■ よくある質問（10個以上）
-
-■ トラブルシューティング
-
-合計8000文字以上の充実した内容を出力してください。""",
-
-    "excel": """あなたはExcelで業務効率化を実現してきたスペシャリストです。
-購入者の作業時間を半分以下にするExcelテンプレートのガイドを作成してください。
-
-【商品名】{product_name}
-【ターゲット】{target}
-{additional_notes}
-
-【絶対に守るルール】
-・#や*などのマークダウン記号は一切使用禁止
-・見出しは「■」「◆」「◇」を使用
-・箇条書きは「・」を使用
-・区切り線は「━━━━━━━━━━」を使用
-
-【必須の品質基準】
-・実際の関数やセル参照を具体的に記載
-・入力規則やデータ検証の設定方法を詳細に
-・条件付き書式の設定を具体的に
-・ピボットテーブルやグラフの作成手順も含める
-
-【構成】
-■ テンプレート概要
-・このテンプレートで実現できること
-・想定される時間削減効果
-・対応Excelバージョン
-
-■ シート構成
-・シート一覧と各シートの役割
-・シート間の連携図
-
-■ シート1：[名前]
-◆ 目的
-◆ セル構成（A1から順に詳細説明）
-◆ 使用している関数一覧
-・セル番地 / 関数 / 目的 / 具体的な数式
-◆ 入力規則の設定
-◆ 条件付き書式の設定
-
-■ シート2：[名前]
-（同様の構成）
-
-■ シート3：[名前]
-（同様の構成）
-
-■ 主要な関数の解説
-・VLOOKUP/XLOOKUPの使い方
-・IF関数のネスト
-・SUMIFS/COUNTIFSの活用
-・その他使用している関数
-
-■ 使い方ガイド
-◆ 初期設定
-◆ データ入力の手順
-◆ レポート出力の手順
-◆ 月次更新の手順
-
-■ カスタマイズ方法
-・項目の追加方法
-・計算式の変更方法
-・デザインの変更方法
-
-■ よくある質問（10個以上）
-
-■ エラー対処法
-
-合計8000文字以上の充実した内容を出力してください。""",
-
-    "spreadsheet": """あなたはGoogleスプレッドシートの達人として知られるコンサルタントです。
-チームの生産性を飛躍的に向上させるスプレッドシートテンプレートのガイドを作成してください。
-
-【商品名】{product_name}
-【ターゲット】{target}
-{additional_notes}
-
-【絶対に守るルール】
-・#や*などのマークダウン記号は一切使用禁止
-・見出しは「■」「◆」「◇」を使用
-・箇条書きは「・」を使用
-・区切り線は「━━━━━━━━━━」を使用
+    additional_text = f"【追加要望】{additional_notes}" if additional_notes else ""
+    user = USER_PROMPT.format(
+        product_name=product_name,
+        target=target,
+        additional_notes=additional_text
+    ).rstrip() + instruction
+    return system, user
 
-【必須の品質基準】
-・Google スプレッドシート特有の関数も活用
-・共有設定や権限管理の説明を含める
-・Apps Scriptの活用法があれば記載
-・リアルタイム共同編集を活かした使い方
 
-【構成】
-■ テンプレート概要
-・解決できる課題
-・チームでの活用メリット
-・必要なGoogleアカウント設定
+def content_filename(product_name: str):
+    safe_name = product_name.replace(" ", "_").replace("/", "_")[:50]
+    return f"{safe_name}.txt"
 
-■ シート構成と全体像
 
-■ シート1：[名前]
-◆ 目的と役割
-◆ セル構成詳細
-◆ 使用関数一覧（具体的な数式付き）
-◆ データ入力規則
-◆ 条件付き書式
+def _content_payload(system: list, user: str, max_tokens: int, stream: bool = False):
+    payload = {
+        "model": CLAUDE_MODEL,
+        "max_tokens": max_tokens,
+        "system": system,
+        "messages": [{"role": "user", "content": user}]
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def _post_claude(api_key: str, payload: dict, timeout: float = 120):
+    """Anthropicへの接続はウォームなインスタンス間で使い回す"""
+    return get_pool(ANTHROPIC_BASE_URL).stream(
+        "POST",
+        "/v1/messages",
+        body=json.dumps(payload).encode("utf-8"),
+        headers={
+            "Content-Type": "application/json",
+            "x-api-key": api_key,
+            "anthropic-version": "2023-06-01"
+        },
+        timeout=timeout,
+    )
 
-■ シート2：[名前]
-（同様の構成）
 
-■ シート3：[名前]
+def admit_claude(system: list, user: str):
+    """Claudeの呼び出しを流量制御の順番待ちに並べる。溢れたらOverloadedを送出する"""
+    return get_admission("claude").admit(estimate_tokens("".join(block["text"] for block in system) + user))
 
-■ Googleスプレッドシート特有の機能活用
-・IMPORTRANGE関数の設定
-・QUERY関数の活用
-・GOOGLEFINANCE関数（該当する場合）
-・カスタム関数
 
-■ 共有設定ガイド
-・閲覧者/編集者の権限設定
-・特定セルの保護設定
-・共有リンクの発行方法
+def _add_usage(total: dict, usage: dict):
+    for name, value in usage.items():
+        if isinstance(value, int):
+            total[name] = total.get(name, 0) + value
+    return total
 
-■ 使い方ガイド
-◆ 初期設定
-◆ 日常的な使い方
-◆ チームでの運用方法
 
-■ カスタマイズ方法
+content_flight = SingleFlight()
 
-■ よくある質問（10個以上）
 
-合計8000文字以上の充実した内容を出力してください。""",
+def generate_content_with_claude(category: str, product_name: str, target: str, additional_notes: str = "", mode: str = "single"):
+    api_key = os.environ.get("ANTHROPIC_API_KEY")
+    if not api_key:
+        return {"content": "[ERROR] ANTHROPIC_API_KEY not set. Vercelの環境変数に設定してください。", "filename": "error.txt", "error": "NO_API_KEY"}
 
-    "powerpoint": """あなたは大企業の役員プレゼンを数多く手がけてきたプレゼンテーションデザイナーです。
-聴衆の心を動かすPowerPointテンプレートのガイドを作成してください。
+    # 同じ内容の同時リクエストは1回の生成にまとめる
+    key = ResponseCache.make_key(
+        f"{CLAUDE_MODEL}:{mode}",
+        category=category,
+        productName=product_name,
+        target=target,
+        additionalNotes=additional_notes,
+    )
+    start = time.perf_counter()
+    result = content_flight.do(key, lambda: _generate_content(api_key, category, product_name, target, additional_notes, mode))
+    GENERATION_DURATION.observe(time.perf_counter() - start, category, "error" if result.get("error") else mode)
+    return result
 
-【商品名】{product_name}
-【ターゲット】{target}
-{additional_notes}
 
-【絶対に守るルール】
-・#や*などのマークダウン記号は一切使用禁止
-・見出しは「■」「◆」「◇」を使用
-・箇条書きは「・」を使用
-・区切り線は「━━━━━━━━━━」を使用
+def _generate_content(api_key: str, category: str, product_name: str, target: str, additional_notes: str, mode: str):
+    if mode == "chapters":
+        result = generate_content_in_chapters(api_key, category, product_name, target, additional_notes)
+        if result is not None:
+            return result
 
-【必須の品質基準】
-・各スライドの具体的なレイアウト指示
-・フォント、色、サイズの具体的な指定
-・アニメーション設定の推奨
-・プレゼン時の話し方のコツも含める
+    system, user = build_content_messages(category, product_name, target, additional_notes)
 
-【構成】
-■ テンプレート概要
-・このテンプレートの特徴
-・想定する発表シーン
-・所要時間の目安
+    try:
+        content, usage = _claude_message(api_key, system, user, 16384)
+        return {"content": content, "filename": content_filename(product_name), "usage": usage}
+    except Overloaded:
+        raise
+    except HTTPStatusError as e:
+        error_body = e.body.decode("utf-8")
+        return {"content": f"[ERROR] Claude API HTTP {e.code}: {error_body}", "filename": "error.txt", "error": error_body}
+    except Exception as e:
+        error_msg = str(e)
+        return {"content": f"[ERROR] Claude API failed: {error_msg}", "filename": "error.txt", "error": error_msg}
 
-■ デザインコンセプト
-・カラーパレット（RGB値を明記）
-・フォント指定
-・余白とレイアウトの原則
 
-■ スライド構成（全20枚以上）
+def generate_content_in_chapters(api_key: str, category: str, product_name: str, target: str, additional_notes: str = ""):
+    """見出しを先に生成し、各章を並列に生成して順番通りに連結する。見出しが取れなければNoneを返す"""
+    from concurrent.futures import ThreadPoolExecutor  # 章ごとの生成を使うときだけ読み込む（コールドスタート短縮）
 
-◆ スライド1：タイトルスライド
-・レイアウト詳細
-・記載内容
-・デザインのポイント
+    usage = {}
 
-◆ スライド2：アジェンダ
-（同様の詳細）
+    try:
+        system, user = build_content_messages(category, product_name, target, additional_notes, OUTLINE_INSTRUCTION)
+        outline_text, outline_usage = _claude_message_with_retry(api_key, system, user, 1024)
+        _add_usage(usage, outline_usage)
+        start = outline_text.find("[")
+        end = outline_text.rfind("]") + 1
+        outline = [str(title) for title in json.loads(outline_text[start:end])]
+    except Overloaded:
+        # 混雑時に1回で生成する経路へ切り替えると上流への呼び出しが増えるので、503で返す
+        raise
+    except Exception as e:
+        print(f"Outline generation failed: {e}")
+        return None
+    if not outline:
+        return None
 
-◆ スライド3-5：導入・問題提起
+    outline_text = "\n".join(outline)
 
-◆ スライド6-10：本論1
+    def generate_chapter(chapter_title):
+        instruction = CHAPTER_INSTRUCTION.format(outline=outline_text, chapter_title=chapter_title)
+        system, user = build_content_messages(category, product_name, target, additional_notes, instruction)
+        try:
+            return _claude_message_with_retry(api_key, system, user, CHAPTER_MAX_TOKENS)
+        except Overloaded:
+            raise
+        except Exception as e:
+            print(f"Chapter generation failed ({chapter_title}): {e}")
+            return None
 
-◆ スライド11-15：本論2
+    with ThreadPoolExecutor(max_workers=max(1, CHAPTER_CONCURRENCY)) as executor:
+        chapters = list(executor.map(generate_chapter, outline))
 
-◆ スライド16-18：解決策・提案
+    for chapter in chapters:
+        if chapter is not None:
+            _add_usage(usage, chapter[1])
 
-◆ スライド19：まとめ
+    failed = [title for title, chapter in zip(outline, chapters) if chapter is None]
+    content = "\n\n".join(
+        chapter[0] if chapter is not None else f"{title}\n\n[ERROR] この章の生成に失敗しました。再生成してください。"
+        for title, chapter in zip(outline, chapters)
+    )
 
-◆ スライド20：クロージング・CTA
+    result = {"content": content, "filename": content_filename(product_name), "chapters": outline, "usage": usage}
+    if failed:
+        result["failedChapters"] = failed
+    return result
 
-■ 各スライドの原稿テキスト
-・スライドごとの話す内容（1分あたり300文字目安）
 
-■ プレゼンテーションのコツ
-・話し方のポイント
-・質疑応答の準備
-・時間配分の目安
+def _claude_message(api_key: str, system: list, user: str, max_tokens: int):
+    """(本文, usage) を返す。usageにはcache_creation_input_tokens / cache_read_input_tokensが含まれる"""
+    payload = _content_payload(system, user, max_tokens)
+    with admit_claude(system, user), upstream_call("anthropic", "messages"), _post_claude(api_key, payload) as response:
+        result = json.loads(response.read().decode("utf-8"))
+        return result["content"][0]["text"], result.get("usage", {})
 
-■ カスタマイズガイド
-・内容の差し替え方法
-・デザイン変更のポイント
 
-■ よくある質問
+def _claude_message_with_retry(api_key: str, system: list, user: str, max_tokens: int):
+    for attempt in range(CHAPTER_MAX_RETRIES + 1):
+        try:
+            return _claude_message(api_key, system, user, max_tokens)
+        except Overloaded:
+            # 順番待ちが溢れているときは再試行せずに呼び出し元へ返す
+            raise
+        except Exception:
+            if attempt == CHAPTER_MAX_RETRIES:
+                raise
+            time.sleep(min(2 ** attempt, 8) * (0.5 + random.random()))
+
+
+def stream_content_with_claude(category: str, product_name: str, target: str, additional_notes: str = ""):
+    """Messages APIのストリーミング応答を ("delta" | "done" | "error", data) の順で返す"""
+    api_key = os.environ.get("ANTHROPIC_API_KEY")
+    if not api_key:
+        yield "error", {"error": "NO_API_KEY", "message": "ANTHROPIC_API_KEY not set. Vercelの環境変数に設定してください。"}
+        return
 
-合計8000文字以上の充実した内容を出力してください。""",
+    system, user = build_content_messages(category, product_name, target, additional_notes)
+    payload = _content_payload(system, user, 16384, stream=True)
 
-    "canva": """あなたはCanvaを使ったデザインで多くのクライアントを成功に導いてきたデザイナーです。
-デザイン初心者でもプロ級の成果物が作れるCanvaテンプレートガイドを作成してください。
+    usage = {}
+    stop_reason = None
+    start = time.perf_counter()
+    first_token = True
+    try:
+        with upstream_call("anthropic", "messages.stream"), _post_claude(api_key, payload) as response:
+            for event, data in iter_sse(response):
+                if event == "message_start":
+                    usage.update(data["message"].get("usage", {}))
+                elif event == "content_block_delta" and data["delta"].get("type") == "text_delta":
+                    if first_token:
+                        UPSTREAM_TTFT.observe(time.perf_counter() - start, "anthropic")
+                        first_token = False
+                    yield "delta", {"text": data["delta"]["text"]}
+                elif event == "message_delta":
+                    usage.update(data.get("usage", {}))
+                    stop_reason = data["delta"].get("stop_reason")
+                elif event == "error":
+                    yield "error", {"error": data.get("error", {}).get("type", "api_error"), "message": json.dumps(data, ensure_ascii=False)}
+                    return
+    except HTTPStatusError as e:
+        yield "error", {"error": f"HTTP_{e.code}", "message": e.body.decode("utf-8")}
+        return
+    except Exception as e:
+        yield "error", {"error": "REQUEST_FAILED", "message": str(e)}
+        return
 
-【商品名】{product_name}
-【ターゲット】{target}
-{additional_notes}
-
-【絶対に守るルール】
-・#や*などのマークダウン記号は一切使用禁止
-・見出しは「■」「◆」「◇」を使用
-・箇条書きは「・」を使用
-・区切り線は「━━━━━━━━━━」を使用
-
-【必須の品質基準】
-・Canvaの具体的な操作手順を詳細に
-・デザインの原則（配色、フォント、余白）を解説
-・各テンプレートの活用シーンを具体的に
-・SNSごとの最適サイズも記載
-
-【構成】
-■ テンプレートセット概要
-・含まれるデザイン一覧
-・活用できるシーン
-・デザインの統一コンセプト
-
-■ デザインシステム
-◆ カラーパレット
-・メインカラー（HEX値）
-・サブカラー（HEX値）
-・アクセントカラー（HEX値）
-・使い分けのルール
-
-◆ フォント設定
-・見出し用フォント
-・本文用フォント
-・サイズの目安
-
-◆ デザイン原則
-・余白の取り方
-・要素の配置ルール
-・統一感を出すコツ
-
-■ テンプレート1：[名前]
-◆ サイズと用途
-◆ デザイン解説
-◆ カスタマイズ手順（ステップバイステップ）
-◆ 使用例3パターン
-
-■ テンプレート2：[名前]
-（同様の構成）
-
-■ テンプレート3-10：
-（各テンプレートの詳細）
-
-■ Canva操作ガイド
-・基本操作のおさらい
-・便利なショートカット
-・知っておくと便利な機能
-
-■ 活用アイデア集
-・SNS投稿での活用
-・印刷物での活用
-・プレゼンでの活用
-
-■ よくある質問（10個以上）
-
-合計8000文字以上の充実した内容を出力してください。""",
-
-    "figma": """あなたはFigmaを使ったUIデザインで業界をリードしてきたシニアデザイナーです。
-実務で即活用できるFigmaテンプレートのガイドを作成してください。
-
-【商品名】{product_name}
-【ターゲット】{target}
-{additional_notes}
-
-【絶対に守るルール】
-・#や*などのマークダウン記号は一切使用禁止
-・見出しは「■」「◆」「◇」を使用
-・箇条書きは「・」を使用
-・区切り線は「━━━━━━━━━━」を使用
-
-【必須の品質基準】
-・コンポーネント設計の詳細
-・Auto Layoutの設定を具体的に
-・バリアント機能の活用法
-・デザインシステムとしての拡張性
-
-【構成】
-■ テンプレート概要
-・このテンプレートの特徴
-・想定ユースケース
-・ファイル構成
-
-■ デザイントークン
-◆ カラー
-・Primary（HEX値）
-・Secondary
-・Semantic colors（Success, Error, Warning）
-・Neutral（グレースケール）
-
-◆ タイポグラフィ
-・フォントファミリー
-・Font scale（H1-H6, Body, Caption）
-・Line height設定
-
-◆ スペーシング
-・基準値（4px or 8px）
-・スペーシングスケール
-
-◆ エフェクト
-・Shadow設定
-・Blur設定
-
-■ コンポーネント一覧
-
-◆ Atoms（基本要素）
-・Button（全バリアント解説）
-・Input
-・Icon
-・Badge
-...
-
-◆ Molecules（組み合わせ）
-・Form Field
-・Card
-・List Item
-...
-
-◆ Organisms（複合要素）
-・Header
-・Navigation
-・Footer
-...
-
-■ 各コンポーネントの詳細
-・プロパティ一覧
-・Auto Layout設定
-・バリアントの使い分け
-・実装時の注意点
-
-■ ページテンプレート
-・各ページの構成と使い方
-
-■ 使い方ガイド
-・複製とセットアップ
-・カスタマイズ方法
-・チームでの運用
-
-■ よくある質問
-
-合計8000文字以上の充実した内容を出力してください。""",
-
-    "linestamp": """あなたはLINEスタンプで月収100万円以上を稼いでいるトップクリエイターです。
-売れるLINEスタンプの企画書を作成してください。
-
-【商品名】{product_name}
-【ターゲット】{target}
-{additional_notes}
-
-【絶対に守るルール】
-・#や*などのマークダウン記号は一切使用禁止
-・見出しは「■」「◆」「◇」を使用
-・箇条書きは「・」を使用
-・区切り線は「━━━━━━━━━━」を使用
-
-【必須の品質基準】
-・市場で売れるキャラクター設定
-・実際に使われるシーンを想定したセリフ
-・40個全てのスタンプを具体的に
-・イラストの構図指示も含める
-
-【構成】
-■ コンセプト
-・このスタンプセットのテーマ
-・ターゲット層
-・競合との差別化ポイント
-・想定される利用シーン
-
-■ キャラクター設定
-◆ 基本情報
-・名前
-・年齢/性別
-・性格（3つの特徴）
-・口癖
-
-◆ 外見の詳細
-・頭身（2〜3頭身推奨）
-・顔の特徴
-・体の特徴
-・服装
-・カラーリング
-
-◆ 表情パターン
-・基本表情5種類の詳細
-
-■ スタンプ一覧（40個）
-
-◆ 挨拶系（1-8）
-1. おはよう
-・セリフ：「おはよ〜」
-・表情：にっこり笑顔
-・ポーズ：手を振る
-・背景：朝日マーク
-（以下同様に40個全て詳細に）
-
-◆ 返事系（9-16）
-
-◆ 感情表現系（17-24）
-
-◆ 日常会話系（25-32）
-
-◆ 特殊シーン系（33-40）
-
-■ デザインガイドライン
-・キャンバスサイズ（370×320px推奨）
-・線の太さ
-・色数の目安
-・余白の取り方
-
-■ 制作時の注意点
-・審査に通るためのポイント
-・避けるべき表現
-・ファイル形式と書き出し設定
-
-■ 販売戦略
-・価格設定
-・タイトルとキーワード
-・プロモーション方法
-
-合計8000文字以上の充実した内容を出力してください。""",
-
-    "icon": """あなたは大手IT企業のデザインシステムを手がけてきたアイコンデザインの専門家です。
-実務で使える高品質なアイコンセットの仕様書を作成してください。
-
-【商品名】{product_name}
-【ターゲット】{target}
-{additional_notes}
-
-【絶対に守るルール】
-・#や*などのマークダウン記号は一切使用禁止
-・見出しは「■」「◆」「◇」を使用
-・箇条書きは「・」を使用
-・区切り線は「━━━━━━━━━━」を使用
-
-【必須の品質基準】
-・一貫性のあるデザインルール
-・視認性を考慮したサイズ展開
-・用途ごとの使い分けガイド
-・カスタマイズの余地
-
-【構成】
-■ アイコンセット概要
-・コンセプト
-・スタイル（Line/Solid/Duo-tone等）
-・総数
-・対応フォーマット
-
-■ デザイン仕様
-◆ グリッドシステム
-・基準サイズ（24x24px等）
-・キーライン（円、正方形、横長、縦長）
-・セーフエリア
-
-◆ ストローク設定
-・線の太さ
-・角の処理（Round/Square）
-・端の処理
-
-◆ カラー
-・単色版の推奨色
-・多色版のカラーパレット
-
-■ カテゴリ別アイコン一覧（50個以上）
-
-◆ ナビゲーション（10個）
-・home：ホーム画面への遷移
-・search：検索機能
-・menu：メニュー表示
-（各アイコンの名前、用途、デザインポイント）
-
-◆ アクション（10個）
-・edit
-・delete
-・share
-...
-
-◆ ステータス（10個）
-
-◆ ファイル（10個）
-
-◆ コミュニケーション（10個）
-
-◆ その他（10個以上）
-
-■ サイズバリエーション
-・16px版の調整ポイント
-・24px版（基準）
-・32px版の調整ポイント
-・48px版の調整ポイント
-
-■ 使用ガイドライン
-・推奨される使い方
-・避けるべき使い方
-・アクセシビリティ配慮
-
-■ ファイル構成
-・フォルダ構造
-・命名規則
-・書き出し設定
-
-■ よくある質問
-
-合計8000文字以上の充実した内容を出力してください。""",
-}
+    yield "done", {"filename": content_filename(product_name), "usage": usage, "stopReason": stop_reason}
 
 
-def generate_content_with_claude(category: str, product_name: str, target: str, additional_notes: str = ""):
-    api_key = os.environ.get("ANTHROPIC_API_KEY")
-    if not api_key:
-        return {"content": "[ERROR] ANTHROPIC_API_KEY not set. Vercelの環境変数に設定してください。", "filename": "error.txt", "error": "NO_API_KEY"}
+_job_queue = None
+_job_queue_lock = threading.Lock()
 
-    base_prompt = CONTENT_PROMPTS.get(category, CONTENT_PROMPTS["prompt"])
 
-    additional_text = f"【追加要望】{additional_notes}" if additional_notes else ""
-    prompt = base_prompt.format(
-        product_name=product_name,
-        target=target,
-        additional_notes=additional_text
-    )
+def get_job_queue():
+    """非同期生成（async: true）用のジョブキュー。初回利用時に作成し、未完了のジョブを再開する"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            from _jobs import JobQueue  # 非同期生成を使うときだけ読み込む（コールドスタート短縮）
 
-    url = "https://api.anthropic.com/v1/messages"
+            _job_queue = JobQueue(
+                os.environ.get("CONTENT_JOBS_DB", "/tmp/rakumane-content-jobs.db"),
+                _run_content_job,
+                workers=int(os.environ.get("CONTENT_JOB_WORKERS", "2")),
+            )
+            _job_queue.start()
+        return _job_queue
 
-    payload = {
-        "model": "claude-3-5-sonnet-20241022",
-        "max_tokens": 16384,
-        "messages": [{"role": "user", "content": prompt}]
-    }
 
-    try:
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(payload).encode("utf-8"),
-            headers={
-                "Content-Type": "application/json",
-                "x-api-key": api_key,
-                "anthropic-version": "2023-06-01"
-            },
-            method="POST",
-        )
-        with urllib.request.urlopen(req, timeout=120) as response:
-            result = json.loads(response.read().decode("utf-8"))
-            content = result["content"][0]["text"]
-
-            safe_name = product_name.replace(" ", "_").replace("/", "_")[:50]
-            filename = f"{safe_name}.txt"
-
-            return {"content": content, "filename": filename}
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode("utf-8")
-        return {"content": f"[ERROR] Claude API HTTP {e.code}: {error_body}", "filename": "error.txt", "error": error_body}
-    except Exception as e:
-        error_msg = str(e)
-        return {"content": f"[ERROR] Claude API failed: {error_msg}", "filename": "error.txt", "error": error_msg}
+def _run_content_job(params: dict):
+    deadline = time.monotonic() + JOB_DEADLINE_SECONDS
+    while True:
+        try:
+            return generate_content_with_claude(**params)
+        except Overloaded as e:
+            # 裏で動くジョブなので、混雑で断られたら待って並び直す。期限までに通りそうになければ失敗にする
+            if time.monotonic() + e.retry_after > deadline:
+                message = f"Claude APIが混雑しているため、{JOB_DEADLINE_SECONDS:.0f}秒以内に生成を始められませんでした"
+                return {"content": f"[ERROR] {message}", "filename": "error.txt", "error": "OVERLOADED"}
+            time.sleep(e.retry_after)
 
 
 def generate_mock_content(category: str, product_name: str, target: str):
@@ -947,13 +411,12 @@ A: △△の場合は、□□を試してください。
 ご購入ありがとうございました。
 """
 
-    safe_name = product_name.replace(" ", "_").replace("/", "_")[:50]
-    filename = f"{safe_name}.txt"
+    return {"content": mock_content, "filename": content_filename(product_name)}
 
-    return {"content": mock_content, "filename": filename}
 
+class handler(MetricsHandler):
+    metrics_routes = ("/generate-content/metrics", "/generate-content")
 
-class handler(BaseHTTPRequestHandler):
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header("Access-Control-Allow-Origin", "*")
@@ -961,6 +424,26 @@ class handler(BaseHTTPRequestHandler):
         self.send_header("Access-Control-Allow-Headers", "Content-Type")
         self.end_headers()
 
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.rstrip("/").endswith("/metrics"):
+            self.send_metrics()
+            return
+
+        query = parse_qs(url.query)
+        job_id = query.get("jobId", [""])[0]
+        if not job_id:
+            self._send_json(200, {"singleflight": content_flight.stats()})
+            return
+
+        # wait秒まで完了を待つロングポーリング
+        wait = min(float(query.get("wait", ["0"])[0] or 0), 25.0)
+        job = get_job_queue().get(job_id, wait)
+        if job is None:
+            self._send_json(404, {"error": "job not found"})
+        else:
+            self._send_json(200, job)
+
     def do_POST(self):
         content_length = int(self.headers.get("Content-Length", 0))
         body = self.rfile.read(content_length)
@@ -975,16 +458,107 @@ class handler(BaseHTTPRequestHandler):
             if not product_name:
                 raise ValueError("productName is required")
 
-            result = generate_content_with_claude(category, product_name, target, additional_notes)
-
-            self.send_response(200)
-            self.send_header("Content-type", "application/json")
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.end_headers()
-            self.wfile.write(json.dumps(result).encode())
+            if data.get("format") == "text" or "text/plain" in self.headers.get("Accept", ""):
+                # 本文だけをtext/plainのファイルとして、生成された分から送る
+                system, user = build_content_messages(category, product_name, target, additional_notes)
+                with admit_claude(system, user):
+                    self._send_text_stream(
+                        stream_content_with_claude(category, product_name, target, additional_notes),
+                        content_filename(product_name),
+                    )
+                return
+
+            if data.get("stream") or "text/event-stream" in self.headers.get("Accept", ""):
+                # 順番が来てからストリームを始める（断られたら503を返せるように）
+                system, user = build_content_messages(category, product_name, target, additional_notes)
+                with admit_claude(system, user):
+                    self._send_event_stream(stream_content_with_claude(category, product_name, target, additional_notes))
+                return
+
+            mode = data.get("mode", "single")
+
+            if data.get("async"):
+                job_id = get_job_queue().submit({
+                    "category": category,
+                    "product_name": product_name,
+                    "target": target,
+                    "additional_notes": additional_notes,
+                    "mode": mode,
+                })
+                self._send_json(202, {"jobId": job_id, "status": "queued"})
+                return
+
+            result = generate_content_with_claude(category, product_name, target, additional_notes, mode)
+
+            self._send_json(200, result)
+        except Overloaded as e:
+            self._send_json(503, {"error": "OVERLOADED", "retryAfter": e.retry_after}, {"Retry-After": str(e.retry_after)})
         except Exception as e:
-            self.send_response(400)
-            self.send_header("Content-type", "application/json")
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.end_headers()
-            self.wfile.write(json.dumps({"error": str(e)}).encode())
+            self._send_json(400, {"error": str(e)})
+
+    def _send_json(self, status, body, headers=None):
+        # 日本語を\uXXXX（6バイト）にせずUTF-8（3バイト）のまま送り、対応していれば圧縮する
+        encoded = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        encoding = negotiate(self.headers.get("Accept-Encoding")) if len(encoded) >= MIN_SIZE else None
+        if encoding:
+            encoded = compress(encoded, encoding)
+        self.send_response(status)
+        self.send_header("Content-type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _send_text_stream(self, events, filename):
+        """本文をtext/plainで逐次送る。途中で失敗したら終端を送らずに切る（圧縮時は展開側で不完全と分かる）"""
+        event, data = next(events)
+        if event == "error":
+            # まだ何も送っていないのでステータスで返せる
+            self._send_json(502, data)
+            return
+
+        encoding = negotiate(self.headers.get("Accept-Encoding"))
+        compressor = StreamCompressor(encoding)
+        self.send_response(200)
+        self.send_header("Content-type", "text/plain; charset=utf-8")
+        self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(filename)}")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Accel-Buffering", "no")
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Expose-Headers", "Content-Disposition")
+        self.end_headers()
+        try:
+            while event == "delta":
+                self.wfile.write(compressor.compress(data["text"].encode("utf-8")))
+                self.wfile.flush()
+                event, data = next(events, ("done", {}))
+            if event == "error":
+                print(f"Content stream failed: {data.get('message')}")
+                return
+            self.wfile.write(compressor.finish())
+        except (BrokenPipeError, ConnectionResetError):
+            # クライアントが切断した場合は生成を打ち切る
+            events.close()
+
+    def _send_event_stream(self, events):
+        self.send_response(200)
+        self.send_header("Content-type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Accel-Buffering", "no")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        try:
+            for event, data in events:
+                self.wfile.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # クライアントが切断した場合は生成を打ち切る
+            events.close()
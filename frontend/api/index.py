@@ -1,8 +1,35 @@
 import json
 import os
-import urllib.request
-import urllib.error
-from http.server import BaseHTTPRequestHandler
+import threading
+import time
+
+from _admission import Overloaded, estimate_tokens, get_admission
+from _cache import build_cache
+from _http import get_pool, iter_sse
+from _idea_catalog import idea_catalog
+from _json_extract import ExtractionError, JSONObjectExtractor
+from _metrics import GENERATION_DURATION, UPSTREAM_TTFT, MetricsHandler, upstream_call
+from _providers import Cancelled, Router
+
+GEMINI_MODEL = "gemini-2.5-flash"
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+CLAUDE_MODEL = "claude-haiku-4-5-20241022"
+ANTHROPIC_BASE_URL = os.environ.get("ANTHROPIC_BASE_URL", "https://api.anthropic.com")
+# プロンプトを変更したら更新する（キャッシュキーに含まれる）
+PROMPT_VERSION = "1"
+# 出力がJSONとして解析できなかったときの再試行回数
+GEMINI_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", "1"))
+# APIキーが設定されているものをこの順で使う（直近の速さと失敗率で並べ替える）
+LLM_PROVIDERS = os.environ.get("LLM_PROVIDERS", "gemini,claude")
+# 1つ目の応答がp95を過ぎても返らないとき、次のプロバイダーにも投げる
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "") in ("1", "true")
+
+# 出力を解析できなかったときに再試行のプロンプトへ付け足す
+RETRY_INSTRUCTION = """
+
+前回の出力は「{reason}」のため解析できませんでした。上記の形式のJSONのみを出力し直してください。"""
+
+generation_cache = build_cache("generate")
 
 CATEGORY_LABELS = {
     "prompt": "AIプロンプト集",
@@ -35,15 +62,103 @@ PRICE_RANGES = {
 }
 
 
-def generate_with_gemini(category: str, target: str, additional_notes: str = ""):
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        return generate_mock(category, target)
+def generate_with_gemini(category: str, target: str, additional_notes: str = "", fresh: bool = False):
+    start = time.perf_counter()
+    result, source = _generate(category, target, additional_notes, fresh)
+    GENERATION_DURATION.observe(time.perf_counter() - start, category, source)
+    return result
+
+
+def _generate(category: str, target: str, additional_notes: str, fresh: bool):
+    """(生成結果, 出どころ) を返す。出どころは llm / cache / mock / fallback"""
+    if not get_router().providers:
+        return generate_mock(category, target), "mock"
+
+    cache_key = generation_cache.make_key(
+        f"{GEMINI_MODEL}:{PROMPT_VERSION}",
+        category=category,
+        target=target,
+        additionalNotes=additional_notes,
+    )
+    if not fresh:
+        cached = generation_cache.get(cache_key)
+        if cached is not None:
+            return cached, "cache"
+
+    try:
+        result = _call_llm(category, target, additional_notes)
+    except Overloaded:
+        # 混雑時はモックで埋めずに503で再試行を促す
+        raise
+    except Exception as e:
+        print(f"LLM API error: {e}")
+        return generate_mock(category, target), "fallback"
+
+    generation_cache.set(cache_key, result)
+    return result, "llm"
+
+
+class GeminiProvider:
+    name = "gemini"
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.admission = get_admission(self.name)
+
+    def generate(self, prompt: str, cancelled=None):
+        with self.admission.admit(estimate_tokens(prompt)):
+            return _stream_gemini(self.api_key, prompt, cancelled)
+
+
+class ClaudeProvider:
+    name = "claude"
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.admission = get_admission(self.name)
+
+    def generate(self, prompt: str, cancelled=None):
+        with self.admission.admit(estimate_tokens(prompt)):
+            return _stream_claude(self.api_key, prompt, cancelled)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """APIキーが設定されているプロバイダーを、LLM_PROVIDERSの順で使うルーター"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            available = {}
+            if os.environ.get("GEMINI_API_KEY"):
+                available["gemini"] = GeminiProvider(os.environ["GEMINI_API_KEY"])
+            if os.environ.get("ANTHROPIC_API_KEY"):
+                available["claude"] = ClaudeProvider(os.environ["ANTHROPIC_API_KEY"])
+            names = [name.strip() for name in LLM_PROVIDERS.split(",")]
+            _router = Router([available[name] for name in names if name in available], hedge=LLM_HEDGE)
+        return _router
+
+
+def _call_llm(category: str, target: str, additional_notes: str):
+    """解析できない出力は途中で打ち切り、理由を添えて再試行する"""
+    prompt = build_prompt(category, target, additional_notes)
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        try:
+            return get_router().generate(prompt)
+        except ExtractionError as e:
+            print(f"LLM output could not be parsed (attempt {attempt + 1}): {e}")
+            if attempt == GEMINI_MAX_RETRIES:
+                raise
+            prompt = build_prompt(category, target, additional_notes) + RETRY_INSTRUCTION.format(reason=e)
+
 
+def build_prompt(category: str, target: str, additional_notes: str = ""):
     category_label = CATEGORY_LABELS.get(category, "デジタル商品")
     price_min, price_max = PRICE_RANGES.get(category, (980, 1980))
 
-    prompt = f"""あなたはGumroadで月100万円以上稼ぐトップセラーのデジタル商品クリエイターです。
+    return f"""あなたはGumroadで月100万円以上稼ぐトップセラーのデジタル商品クリエイターです。
 売れる商品を提案してください。
 
 【商品カテゴリ】{category_label}
@@ -64,31 +179,123 @@ def generate_with_gemini(category: str, target: str, additional_notes: str = "")
 - タグはGumroad検索で上位表示されやすいキーワードを選定
 - JSONのみを出力"""
 
-    url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent?key={api_key}"
 
+def _stream_gemini(api_key: str, prompt: str, cancelled=None):
     payload = {
         "contents": [{"parts": [{"text": prompt}]}],
         "generationConfig": {"temperature": 0.9, "maxOutputTokens": 1024},
     }
 
-    try:
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(payload).encode("utf-8"),
-            headers={"Content-Type": "application/json"},
-            method="POST",
-        )
-        with urllib.request.urlopen(req, timeout=30) as response:
-            result = json.loads(response.read().decode("utf-8"))
-            response_text = result["candidates"][0]["content"]["parts"][0]["text"]
-
-            start = response_text.find("{")
-            end = response_text.rfind("}") + 1
-            json_str = response_text[start:end]
-            return json.loads(json_str)
-    except Exception as e:
-        print(f"Gemini API error: {e}")
-        return generate_mock(category, target)
+    extractor = JSONObjectExtractor(PRODUCT_FIELDS)
+    start = time.perf_counter()
+    first_token = True
+    # Geminiへの接続はウォームなインスタンス間で使い回す
+    with upstream_call("gemini", "streamGenerateContent") as call:
+        try:
+            with get_pool(GEMINI_BASE_URL).stream(
+                "POST",
+                f"/v1/models/{GEMINI_MODEL}:streamGenerateContent?alt=sse&key={api_key}",
+                body=json.dumps(payload).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+                timeout=30,
+            ) as response:
+                for raw_line in response:
+                    if cancelled is not None and cancelled.is_set():
+                        raise Cancelled()
+                    line = raw_line.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    if first_token:
+                        UPSTREAM_TTFT.observe(time.perf_counter() - start, "gemini")
+                        first_token = False
+                    chunk = json.loads(line[len("data:"):])
+                    parts = chunk["candidates"][0].get("content", {}).get("parts", [])
+                    # オブジェクトが閉じたら残りの出力は読まずに接続を閉じる
+                    if extractor.feed("".join(part.get("text", "") for part in parts)):
+                        break
+            return extractor.finish()
+        except ExtractionError:
+            call.outcome = "invalid_json"
+            raise
+        except Cancelled:
+            # ヘッジで負けた呼び出し
+            call.outcome = "cancelled"
+            raise
+
+
+def _stream_claude(api_key: str, prompt: str, cancelled=None):
+    payload = {
+        "model": CLAUDE_MODEL,
+        "max_tokens": 1024,
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": True,
+    }
+
+    extractor = JSONObjectExtractor(PRODUCT_FIELDS)
+    start = time.perf_counter()
+    first_token = True
+    with upstream_call("anthropic", "messages.stream") as call:
+        try:
+            with get_pool(ANTHROPIC_BASE_URL).stream(
+                "POST",
+                "/v1/messages",
+                body=json.dumps(payload).encode("utf-8"),
+                headers={
+                    "Content-Type": "application/json",
+                    "x-api-key": api_key,
+                    "anthropic-version": "2023-06-01",
+                },
+                timeout=30,
+            ) as response:
+                for event, data in iter_sse(response):
+                    if cancelled is not None and cancelled.is_set():
+                        raise Cancelled()
+                    if event == "error":
+                        raise RuntimeError(json.dumps(data, ensure_ascii=False))
+                    if event != "content_block_delta" or data["delta"].get("type") != "text_delta":
+                        continue
+                    if first_token:
+                        UPSTREAM_TTFT.observe(time.perf_counter() - start, "anthropic")
+                        first_token = False
+                    if extractor.feed(data["delta"]["text"]):
+                        break
+            return extractor.finish()
+        except ExtractionError:
+            call.outcome = "invalid_json"
+            raise
+        except Cancelled:
+            # ヘッジで負けた呼び出し
+            call.outcome = "cancelled"
+            raise
+
+
+def _string(value):
+    if not isinstance(value, str):
+        raise ValueError("文字列ではありません")
+    return value
+
+
+def _string_list(value):
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError("文字列の配列ではありません")
+    return value
+
+
+def _price(value):
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+        raise ValueError("整数ではありません")
+    return int(value)
+
+
+# 商品案の各項目を、値が閉じた時点で検証する
+PRODUCT_FIELDS = {
+    "productNames": _string_list,
+    "description": _string,
+    "suggestedPrice": _price,
+    "tags": _string_list,
+}
 
 
 def generate_mock(category: str, target: str):
@@ -114,7 +321,9 @@ def generate_mock(category: str, target: str):
     }
 
 
-class handler(BaseHTTPRequestHandler):
+class handler(MetricsHandler):
+    metrics_routes = ("/generate/stats", "/generate/instant", "/generate", "/health", "/sales", "/metrics")
+
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header("Access-Control-Allow-Origin", "*")
@@ -123,11 +332,24 @@ class handler(BaseHTTPRequestHandler):
         self.end_headers()
 
     def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/metrics"):
+            self.send_metrics()
+            return
+        if path.endswith("/generate/stats"):
+            body = {
+                "cache": generation_cache.stats(),
+                "llm": get_router().to_dict(),
+                "catalog": idea_catalog.stats(),
+            }
+        else:
+            body = {"status": "healthy"}
+
         self.send_response(200)
         self.send_header("Content-type", "application/json")
         self.send_header("Access-Control-Allow-Origin", "*")
         self.end_headers()
-        self.wfile.write(json.dumps({"status": "healthy"}).encode())
+        self.wfile.write(json.dumps(body).encode())
 
     def do_POST(self):
         content_length = int(self.headers.get("Content-Length", 0))
@@ -138,17 +360,49 @@ class handler(BaseHTTPRequestHandler):
             category = data.get("category", "prompt")
             target = data.get("target", "")
             additional_notes = data.get("additionalNotes", "")
+            fresh = bool(data.get("fresh", False))
+
+            if self.path.split("?")[0].rstrip("/").endswith("/generate/instant"):
+                self._send_instant(category, target)
+                return
 
-            result = generate_with_gemini(category, target, additional_notes)
+            result = generate_with_gemini(category, target, additional_notes, fresh)
 
             self.send_response(200)
             self.send_header("Content-type", "application/json")
             self.send_header("Access-Control-Allow-Origin", "*")
             self.end_headers()
             self.wfile.write(json.dumps(result).encode())
+        except Overloaded as e:
+            self.send_response(503)
+            self.send_header("Content-type", "application/json")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Retry-After", str(e.retry_after))
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "OVERLOADED", "retryAfter": e.retry_after}).encode())
         except Exception as e:
             self.send_response(400)
             self.send_header("Content-type", "application/json")
             self.send_header("Access-Control-Allow-Origin", "*")
             self.end_headers()
             self.wfile.write(json.dumps({"error": str(e)}).encode())
+
+    def _send_instant(self, category, target):
+        """事前生成したカタログから近い条件の案を即座に返す。画面は並行して /generate で新しく生成する"""
+        match = idea_catalog.lookup(category, target)
+        if match is None:
+            status, body = 404, {"error": "no similar idea in catalog"}
+        else:
+            result, matched_target, similarity, generated_at = match
+            status = 200
+            body = {
+                **result,
+                "matchedTarget": matched_target,
+                "similarity": round(similarity, 3),
+                "generatedAt": generated_at,
+            }
+        self.send_response(status)
+        self.send_header("Content-type", "application/json")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
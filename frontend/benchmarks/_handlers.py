@@ -0,0 +1,15 @@
+import importlib.util
+import os
+import sys
+
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api")
+
+
+def load_handler(name):
+    """api/ 配下のハンドラーモジュールを読み込む（ファイル名にハイフンを含むため）"""
+    if API_DIR not in sys.path:
+        sys.path.insert(0, API_DIR)
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), os.path.join(API_DIR, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
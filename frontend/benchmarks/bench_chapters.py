@@ -0,0 +1,45 @@
+"""長文コンテンツ生成: 一括生成と章ごとの並列生成の所要時間比較
+
+使い方（frontend/ で実行）:
+    python benchmarks/bench_chapters.py --tokens-per-second 80 --total-tokens 6000
+"""
+
+import argparse
+import os
+import time
+
+from fake_llm import FakeLLMServer
+from _handlers import load_handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ttft", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--total-tokens", type=int, default=6000)
+    parser.add_argument("--sections", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with FakeLLMServer(args.ttft, args.tokens_per_second, args.total_tokens, args.sections, args.error_rate) as server:
+        os.environ["ANTHROPIC_API_KEY"] = "bench"
+        os.environ["ANTHROPIC_BASE_URL"] = server.url
+        os.environ["CONTENT_CHAPTER_CONCURRENCY"] = str(args.concurrency)
+        module = load_handler("generate-content")
+
+        for mode in ("single", "chapters"):
+            server.requests = 0
+            start = time.perf_counter()
+            result = module.generate_content_with_claude("ebook", "ベンチマーク用電子書籍", "副業初心者", "", mode)
+            elapsed = time.perf_counter() - start
+            usage = result.get("usage", {})
+            print(
+                f"{mode:<9} {elapsed:7.2f}s  chars={len(result['content']):>6}  "
+                f"upstream_calls={server.requests}  failed={len(result.get('failedChapters', []))}  "
+                f"cache_write={usage.get('cache_creation_input_tokens', 0)}  cache_read={usage.get('cache_read_input_tokens', 0)}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Vercel関数のコールドスタート計測: ハンドラーモジュールの読み込み時間とimport内訳
+
+モジュールごとに新しいPythonプロセスを起動し、`python -X importtime` の出力から
+読み込みに時間のかかったimportを集計する。中央値が予算を超えたら終了コード1を返すので、
+デプロイ前のチェックにも使える。
+
+使い方（frontend/ で実行）:
+    python benchmarks/bench_cold_start.py --runs 5 --budget-ms 60
+    python benchmarks/bench_cold_start.py --report-dir /tmp/importtime  # 生のimporttimeレポートも保存する
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from _handlers import API_DIR
+
+MODULES = ["index", "generate-content"]
+
+# 子プロセスで実行する。インタープリター自体の起動（site等）は除き、ハンドラーの読み込みだけを計る
+LOADER = """
+import importlib.util, os, sys, time
+api_dir, name = sys.argv[1], sys.argv[2]
+sys.path.insert(0, api_dir)
+sys.stderr.write("--- load\\n")
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location(name.replace("-", "_"), os.path.join(api_dir, name + ".py"))
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def load_once(name):
+    """(読み込み時間ms, importtimeの生出力) を返す"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", LOADER, API_DIR, name],
+        capture_output=True, text=True, check=True,
+    )
+    report = result.stderr.split("--- load\n", 1)[-1]
+    return float(result.stdout.strip()), report
+
+
+def top_imports(report, limit):
+    """トップレベルのimportを累積時間（マイクロ秒）の降順で返す"""
+    entries = []
+    for line in report.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        # 入れ子のimportは名前の前にスペースが入る
+        if not cumulative.isdigit() or line.rsplit("|", 1)[1].startswith("  "):
+            continue
+        entries.append((int(cumulative), name))
+    return sorted(entries, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("COLD_START_BUDGET_MS", "60")))
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--report-dir")
+    args = parser.parse_args()
+
+    over_budget = []
+    for name in MODULES:
+        samples = [load_once(name) for _ in range(args.runs)]
+        timings = [ms for ms, _ in samples]
+        median = statistics.median(timings)
+        # 中央値に最も近い回の内訳を表示する
+        _, report = min(samples, key=lambda sample: abs(sample[0] - median))
+
+        status = "ok" if median <= args.budget_ms else "OVER BUDGET"
+        print(f"{name:<18} median={median:6.1f}ms  min={min(timings):6.1f}ms  budget={args.budget_ms:.0f}ms  {status}")
+        for cumulative, module in top_imports(report, args.top):
+            print(f"    {cumulative / 1000:6.1f}ms  {module}")
+
+        if args.report_dir:
+            os.makedirs(args.report_dir, exist_ok=True)
+            with open(os.path.join(args.report_dir, f"{name}.importtime.txt"), "w") as f:
+                f.write(report)
+        if median > args.budget_ms:
+            over_budget.append(name)
+
+    if over_budget:
+        print(f"over budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""ウォーム時の1リクエストあたりの所要時間: 毎回接続するurllibとKeep-Aliveプールの比較
+
+ローカルのTLSスタブ（自己署名証明書。opensslコマンドで生成）に対して計測する。
+
+使い方（frontend/ で実行）:
+    python benchmarks/bench_http_pool.py --requests 200
+"""
+
+import argparse
+import json
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from _handlers import API_DIR
+
+sys.path.insert(0, API_DIR)
+from _http import ConnectionPool  # noqa: E402
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # ヘッダーと本文の書き込みが分かれるため、Nagleを切らないとKeep-Alive時に遅延ACK待ちが入る
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"content": [{"type": "text", "text": "ok"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_tls_stub(directory):
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=127.0.0.1", "-keyout", key, "-out", cert],
+        check=True, capture_output=True,
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(fn, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    client_context = ssl.create_default_context()
+    client_context.check_hostname = False
+    client_context.verify_mode = ssl.CERT_NONE
+    payload = json.dumps({"model": "bench", "messages": []}).encode()
+
+    with tempfile.TemporaryDirectory() as directory:
+        server = start_tls_stub(directory)
+        base_url = f"https://127.0.0.1:{server.server_address[1]}"
+
+        def fresh_connection():
+            request = urllib.request.Request(f"{base_url}/v1/messages", data=payload, method="POST")
+            with urllib.request.urlopen(request, timeout=10, context=client_context) as response:
+                response.read()
+
+        pool = ConnectionPool(base_url, ssl_context=client_context)
+
+        def pooled():
+            pool.request("POST", "/v1/messages", body=payload, timeout=10)
+
+        for label, fn in (("urlopen", fresh_connection), ("pool", pooled)):
+            fn()  # ウォームアップ
+            samples = measure(fn, args.requests)
+            print(
+                f"{label:<8} n={len(samples)}  mean={statistics.mean(samples) * 1000:6.2f}ms  "
+                f"p50={statistics.median(samples) * 1000:6.2f}ms"
+            )
+        print(f"pool connections opened: {pool.connects}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
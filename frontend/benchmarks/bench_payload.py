@@ -0,0 +1,189 @@
+"""長文コンテンツの応答サイズと体感の所要時間: \\uXXXXエスケープの非圧縮JSON（従来）と、
+UTF-8のままのJSON・gzip/br圧縮・text/plainでの逐次ダウンロードの比較
+
+本文はapi/_prompts/の文章から学習した文字の2階マルコフ連鎖で作る（同じ文の繰り返しより
+圧縮が効きにくく、実際の出力に近い）。クライアントは帯域を絞った回線を模して読み、RTTも加える。
+実際の出力で測るときは --corpus に {"category": ..., "content": ...} のJSON Linesを渡す。
+
+使い方（frontend/ で実行）:
+    python benchmarks/bench_payload.py --chars 9000 --mbps 5 --rtt 0.1
+"""
+
+import argparse
+import glob
+import http.client
+import json
+import os
+import random
+import statistics
+import threading
+import time
+import zlib
+from collections import defaultdict
+from http.server import ThreadingHTTPServer
+
+from fake_llm import FakeLLMServer
+from _handlers import API_DIR, load_handler
+
+
+def train(texts):
+    model = defaultdict(list)
+    for text in texts:
+        for i in range(len(text) - 2):
+            model[text[i:i + 2]].append(text[i + 2])
+    return model
+
+
+def sample_text(model, chars, seed):
+    """章見出しと段落の形にそろえた、意味は無いが文字の並びは日本語らしいテキスト"""
+    rng = random.Random(seed)
+    keys = [key for key in model if "\n" not in key]
+    parts = []
+    length = 0
+    chapter = 0
+    while length < chars:
+        chapter += 1
+        parts.append(f"\n■ 第{chapter}章\n\n")
+        for _ in range(rng.randint(3, 6)):
+            state = rng.choice(keys)
+            paragraph = [state]
+            for _ in range(rng.randint(120, 260)):
+                candidates = model.get(state)
+                if not candidates:
+                    state = rng.choice(keys)
+                    candidates = model[state]
+                char = rng.choice(candidates)
+                paragraph.append(char)
+                state = state[1] + char
+            parts.append("".join(paragraph).replace("\n", "") + "\n\n")
+            length += len(parts[-1])
+    return "".join(parts)[:chars]
+
+
+def legacy_handler(module):
+    """変更前の _send_json（ensure_asciiの既定のまま、非圧縮）"""
+
+    class LegacyHandler(module.handler):
+        def _send_json(self, status, body, headers=None):
+            self.send_response(status)
+            self.send_header("Content-type", "application/json")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(json.dumps(body).encode())
+
+    return LegacyHandler
+
+
+def fetch(url, body, accept_encoding, bytes_per_second, rtt):
+    """(本文のバイト数, 所要時間) を返す。帯域を超えないように読み、展開と解析までを含める"""
+    host, port = url.split("//")[1].split(":")
+    start = time.perf_counter()
+    time.sleep(rtt)
+    conn = http.client.HTTPConnection(host, int(port), timeout=60)
+    conn.request(
+        "POST",
+        "/api/generate-content",
+        body=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json", "Accept-Encoding": accept_encoding},
+    )
+    response = conn.getresponse()
+    chunks = []
+    while True:
+        chunk = response.read1(16384)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        time.sleep(len(chunk) / bytes_per_second)
+    conn.close()
+    data = b"".join(chunks)
+    encoding = response.getheader("Content-Encoding")
+    if encoding == "gzip":
+        decoded = zlib.decompress(data, 31)
+    elif encoding == "br":
+        import brotli
+
+        decoded = brotli.decompress(data)
+    else:
+        decoded = data
+    if response.status != 200:
+        raise RuntimeError(f"HTTP {response.status}: {decoded[:200]!r}")
+    if response.getheader("Content-Type", "").startswith("application/json"):
+        json.loads(decoded)
+    else:
+        decoded.decode("utf-8")
+    return len(data), time.perf_counter() - start
+
+
+def serve(handler_class):
+    class QuietHandler(handler_class):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), QuietHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chars", type=int, default=9000)
+    parser.add_argument("--mbps", type=float, default=5.0, help="クライアントの下り帯域")
+    parser.add_argument("--rtt", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--corpus", default="")
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            samples = [json.loads(line) for line in f if line.strip()]
+    else:
+        texts = []
+        for path in sorted(glob.glob(os.path.join(API_DIR, "_prompts", "*.txt"))):
+            with open(path, encoding="utf-8") as f:
+                texts.append(f.read())
+        model = train(texts)
+        samples = [
+            {"category": category, "content": sample_text(model, args.chars, seed)}
+            for seed, category in enumerate(("ebook", "course"))
+        ]
+
+    with FakeLLMServer(ttft=0, tokens_per_second=1e9) as llm:
+        os.environ["ANTHROPIC_API_KEY"] = "bench"
+        os.environ["ANTHROPIC_BASE_URL"] = llm.url
+        os.environ["ANTHROPIC_REQUESTS_PER_MINUTE"] = "0"
+        os.environ["ANTHROPIC_TOKENS_PER_MINUTE"] = "0"
+        module = load_handler("generate-content")
+        current, current_url = serve(module.handler)
+        legacy, legacy_url = serve(legacy_handler(module))
+
+        variants = [
+            ("before (json, \\u escaped)", legacy_url, {}, "identity"),
+            ("json utf-8", current_url, {}, "identity"),
+            ("json utf-8 + gzip", current_url, {}, "gzip"),
+            ("text stream + gzip", current_url, {"format": "text"}, "gzip"),
+        ]
+        if module.negotiate("br"):
+            variants.insert(3, ("json utf-8 + br", current_url, {}, "br"))
+
+        bytes_per_second = args.mbps * 1e6 / 8
+        try:
+            for sample in samples:
+                llm.text = sample["content"]
+                print(f"{sample['category']}: {len(sample['content'])} chars, {len(sample['content'].encode('utf-8'))} bytes utf-8")
+                for name, url, extra, accept_encoding in variants:
+                    body = {"category": sample["category"], "productName": "ベンチマーク", "target": "副業初心者", **extra}
+                    results = [fetch(url, body, accept_encoding, bytes_per_second, args.rtt) for _ in range(args.repeat)]
+                    size = results[0][0]
+                    latency = statistics.median(elapsed for _, elapsed in results)
+                    print(f"  {name:<26} {size:>7} bytes  {latency * 1000:7.1f}ms")
+        finally:
+            current.shutdown()
+            legacy.shutdown()
+
+
+if __name__ == "__main__":
+    main()
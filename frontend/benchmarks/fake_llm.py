@@ -0,0 +1,152 @@
+"""ベンチマーク用のローカルMessages APIモックサーバー
+
+出力トークン数に比例して応答を遅らせ、実際の長文生成の所要時間を再現する。
+stream: true のリクエストにはServer-Sent Eventsで少しずつ返す。
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeLLMServer:
+    def __init__(self, ttft=0.5, tokens_per_second=80.0, total_tokens=6000, sections=8, error_rate=0.0, text=None):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.total_tokens = total_tokens
+        self.sections = sections
+        self.error_rate = error_rate
+        # 本文として返すテキスト（省略時は「本文」の繰り返し）
+        self.text = text
+        self.requests = 0
+        self._cached_prefixes = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, payload):
+        """(出力テキスト, 出力トークン数) を返す"""
+        prompt = _prompt_text(payload)
+        if "JSON配列" in prompt:
+            outline = [f"■ 第{i + 1}章：見出し{i + 1}" for i in range(self.sections)]
+            return json.dumps(outline, ensure_ascii=False), 50
+        if "今回は「" in prompt:
+            tokens = self.total_tokens // self.sections
+        else:
+            tokens = self.total_tokens
+        tokens = min(tokens, payload.get("max_tokens", tokens))
+        if self.text is not None:
+            return self.text, tokens
+        return "本文" * tokens, tokens
+
+    def usage(self, payload, output_tokens):
+        """cache_control付きのsystemブロックを2回目以降はキャッシュ読み込みとして数える"""
+        usage = {"input_tokens": 200, "output_tokens": output_tokens}
+        cached = "".join(
+            block.get("text", "") for block in payload.get("system", []) if isinstance(block, dict) and block.get("cache_control")
+        )
+        if cached:
+            with self._lock:
+                hit = cached in self._cached_prefixes
+                self._cached_prefixes.add(cached)
+            usage["cache_read_input_tokens" if hit else "cache_creation_input_tokens"] = len(cached)
+        return usage
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+
+                if random.random() < server.error_rate:
+                    self._send_json(529, {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+                    return
+
+                text, tokens = server.respond(payload)
+                if payload.get("stream"):
+                    self._send_stream(payload, text, tokens)
+                    return
+                time.sleep(server.ttft + tokens / server.tokens_per_second)
+                self._send_json(200, {
+                    "id": "msg_fake",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": payload.get("model", "fake"),
+                    "content": [{"type": "text", "text": text}],
+                    "stop_reason": "end_turn",
+                    "usage": server.usage(payload, tokens),
+                })
+
+            def _send_stream(self, payload, text, tokens):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                time.sleep(server.ttft)
+                usage = server.usage(payload, 0)
+                self._send_event("message_start", {"type": "message_start", "message": {"usage": usage}})
+                # 100文字ずつ、全体でtokens / tokens_per_second秒かけて送る
+                pieces = [text[i:i + 100] for i in range(0, len(text), 100)]
+                for piece in pieces:
+                    time.sleep(tokens / server.tokens_per_second / len(pieces))
+                    self._send_event("content_block_delta", {
+                        "type": "content_block_delta",
+                        "index": 0,
+                        "delta": {"type": "text_delta", "text": piece},
+                    })
+                self._send_event("message_delta", {
+                    "type": "message_delta",
+                    "delta": {"stop_reason": "end_turn"},
+                    "usage": {"output_tokens": tokens},
+                })
+                self._send_event("message_stop", {"type": "message_stop"})
+
+            def _send_event(self, event, data):
+                self.wfile.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            def _send_json(self, status, data):
+                encoded = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+        return Handler
+
+
+def _prompt_text(payload):
+    parts = []
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(block.get("text", "") for block in content)
+    return "\n".join(parts)
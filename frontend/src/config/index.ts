@@ -1,3 +1,6 @@
 export const config = {
   apiUrl: import.meta.env.VITE_API_URL || '',
+  // 売上ダッシュボードのテナント（X-Tenant-Id）。空なら既定のテナント
+  // テナントのAPIキーはビルドに含めず、ダッシュボードの設定画面で入力する（ブラウザに保存）
+  tenantId: import.meta.env.VITE_TENANT_ID || '',
 } as const;
@@ -1,4 +1,4 @@
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 import {
   Box,
   Button,
@@ -26,15 +26,49 @@ import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from 'recharts';
 import axios from 'axios';
 import { config } from '../config';
-import type { DashboardSummary, Settings } from '../types';
+import type { DashboardDelta, DashboardSummary, Settings } from '../types';
+
+const TENANT_KEY_STORAGE = 'tenantKey';
+
+// 既定以外のテナントはAPIキー（scripts/create_tenant.pyで発行）を付ける。
+// 既定のテナントは設定の保存にだけ管理者キー（バックエンドのADMIN_API_KEY）が要る
+const tenantHeaders = (): Record<string, string> => {
+  const key = localStorage.getItem(TENANT_KEY_STORAGE) || '';
+  if (config.tenantId) return { 'X-Tenant-Id': config.tenantId, Authorization: `Bearer ${key}` };
+  return key ? { Authorization: `Bearer ${key}` } : {};
+};
 
 const fetchDashboard = async (): Promise<DashboardSummary> => {
-  const response = await axios.get(`${config.apiUrl}/api/sales`);
+  const response = await axios.get(`${config.apiUrl}/api/sales`, { headers: tenantHeaders() });
   return response.data;
 };
 
+// EventSourceはヘッダーを付けられないので、APIキーの代わりに短い期間だけ使えるトークンをクエリで渡す
+const streamUrl = async (): Promise<string> => {
+  if (!config.tenantId) return `${config.apiUrl}/api/sales/stream`;
+  const response = await axios.post(`${config.apiUrl}/api/sales/stream-token`, null, { headers: tenantHeaders() });
+  const query = new URLSearchParams({ tenant: config.tenantId, token: response.data.token });
+  return `${config.apiUrl}/api/sales/stream?${query}`;
+};
+
+// 差分の商品・日付を置き換える（商品は売上金額の降順、日付は昇順に並べ直す）
+const applyDelta = (summary: DashboardSummary, delta: DashboardDelta): DashboardSummary => {
+  const products = new Map(summary.salesByProduct.map((product) => [product.productName, product]));
+  delta.products.forEach((product) => products.set(product.productName, product));
+  const days = new Map(summary.dailySales.map((day) => [day.date, day]));
+  delta.days.forEach((day) => days.set(day.date, day));
+  return {
+    ...summary,
+    totalSales: delta.totalSales,
+    totalRevenue: delta.totalRevenue,
+    salesByProduct: [...products.values()].sort((a, b) => b.revenue - a.revenue),
+    dailySales: [...days.values()].sort((a, b) => a.date.localeCompare(b.date)),
+    asOf: delta.asOf,
+  };
+};
+
 const saveSettings = async (settings: Settings): Promise<void> => {
-  await axios.post(`${config.apiUrl}/api/settings`, settings);
+  await axios.post(`${config.apiUrl}/api/settings`, settings, { headers: tenantHeaders() });
 };
 
 export const Dashboard = () => {
@@ -42,22 +76,60 @@ export const Dashboard = () => {
   const [settingsOpen, setSettingsOpen] = useState(false);
   const [gumroadToken, setGumroadToken] = useState('');
   const [monthlyGoal, setMonthlyGoal] = useState(100000);
+  const [tenantKey, setTenantKey] = useState(() => localStorage.getItem(TENANT_KEY_STORAGE) || '');
+  const [live, setLive] = useState(false);
+  // 設定を保存したらストリームをつなぎ直す（トークンと目標が変わるため）
+  const [streamVersion, setStreamVersion] = useState(0);
 
   const { data, isLoading, error } = useQuery({
     queryKey: ['dashboard'],
     queryFn: fetchDashboard,
-    refetchInterval: 5 * 60 * 1000,
+    // ストリームで受信している間は再取得しない
+    refetchInterval: live ? false : 5 * 60 * 1000,
   });
 
+  // 売上の変化をServer-Sent Eventsで受け取り、表示中のデータに反映する
+  useEffect(() => {
+    let source: EventSource | undefined;
+    let closed = false;
+    streamUrl()
+      .then((url) => {
+        if (closed) return;
+        source = new EventSource(url);
+        source.addEventListener('snapshot', (event) => {
+          queryClient.setQueryData<DashboardSummary>(['dashboard'], JSON.parse(event.data));
+          setLive(true);
+        });
+        source.addEventListener('delta', (event) => {
+          const delta: DashboardDelta = JSON.parse(event.data);
+          queryClient.setQueryData<DashboardSummary>(['dashboard'], (summary) => summary && applyDelta(summary, delta));
+        });
+        // 再接続できない（ストリーム非対応のAPIやトークンの期限切れなど）ときはポーリングに戻る
+        const current = source;
+        current.onerror = () => {
+          if (current.readyState === EventSource.CLOSED) setLive(false);
+        };
+      })
+      // トークンを取得できない（APIキーが違うなど）ときもポーリングのまま
+      .catch(() => setLive(false));
+    return () => {
+      closed = true;
+      source?.close();
+      setLive(false);
+    };
+  }, [queryClient, streamVersion]);
+
   const settingsMutation = useMutation({
     mutationFn: saveSettings,
     onSuccess: () => {
       queryClient.invalidateQueries({ queryKey: ['dashboard'] });
+      setStreamVersion((version) => version + 1);
       setSettingsOpen(false);
     },
   });
 
   const handleSaveSettings = () => {
+    localStorage.setItem(TENANT_KEY_STORAGE, tenantKey);
     settingsMutation.mutate({ gumroadToken, monthlyGoal });
   };
 
@@ -77,6 +149,11 @@ export const Dashboard = () => {
           <Typography variant="body2" color="text.secondary">
             Gumroadの売上をリアルタイムで確認
           </Typography>
+          {data?.asOf && (
+            <Typography variant="caption" color="text.secondary">
+              最終更新: {new Date(data.asOf).toLocaleString('ja-JP')}
+            </Typography>
+          )}
         </Box>
         <Button startIcon={<SettingsIcon />} onClick={() => setSettingsOpen(true)}>
           設定
@@ -85,7 +162,7 @@ export const Dashboard = () => {
 
       {error && (
         <Alert severity="warning" sx={{ mb: 3 }}>
-          データを取得できません。設定からGumroadトークンを入力してください。
+          データを取得できません。設定から{config.tenantId && 'テナントのAPIキーと'}Gumroadトークンを入力してください。
         </Alert>
       )}
 
@@ -227,6 +304,19 @@ export const Dashboard = () => {
       <Dialog open={settingsOpen} onClose={() => setSettingsOpen(false)} maxWidth="sm" fullWidth>
         <DialogTitle>設定</DialogTitle>
         <DialogContent>
+          <TextField
+            fullWidth
+            label={config.tenantId ? 'テナントのAPIキー' : '管理者キー'}
+            type="password"
+            value={tenantKey}
+            onChange={(e) => setTenantKey(e.target.value)}
+            sx={{ mt: 2 }}
+            helperText={
+              config.tenantId
+                ? `テナント「${config.tenantId}」の管理者から受け取ったキー`
+                : 'サーバーのADMIN_API_KEY（設定の保存に必要）'
+            }
+          />
           <TextField
             fullWidth
             label="Gumroadアクセストークン"
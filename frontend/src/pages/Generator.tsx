@@ -30,7 +30,7 @@ import {
 import { useMutation } from '@tanstack/react-query';
 import axios from 'axios';
 import { config } from '../config';
-import type { GenerateRequest, GenerateResponse, GenerateContentRequest, GenerateContentResponse, ProductCategory } from '../types';
+import type { GenerateRequest, GenerateResponse, InstantGenerateResponse, GenerateContentRequest, GenerateContentResponse, ProductCategory } from '../types';
 import { CATEGORY_LABELS } from '../types';
 
 const generateProduct = async (request: GenerateRequest): Promise<GenerateResponse> => {
@@ -38,17 +38,63 @@ const generateProduct = async (request: GenerateRequest): Promise<GenerateRespon
   return response.data;
 };
 
-const generateContent = async (request: GenerateContentRequest): Promise<GenerateContentResponse> => {
-  const response = await axios.post(`${config.apiUrl}/api/generate-content`, request);
+// 事前生成したカタログの近い案。無ければ404
+const generateInstant = async (request: GenerateRequest): Promise<InstantGenerateResponse> => {
+  const response = await axios.post(`${config.apiUrl}/api/generate/instant`, request);
   return response.data;
 };
 
+// Server-Sent Eventsで受信し、届いた分から表示する
+const generateContent = async (
+  request: GenerateContentRequest,
+  onDelta: (content: string) => void,
+): Promise<GenerateContentResponse> => {
+  const response = await fetch(`${config.apiUrl}/api/generate-content`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify({ ...request, stream: true }),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`HTTP ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let content = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      const event = block.match(/^event: (.*)$/m)?.[1];
+      const data = JSON.parse(block.match(/^data: (.*)$/m)?.[1] ?? '{}');
+      if (event === 'delta') {
+        content += data.text;
+        onDelta(content);
+      } else if (event === 'done') {
+        return { content, filename: data.filename };
+      } else if (event === 'error') {
+        throw new Error(data.message);
+      }
+    }
+  }
+  throw new Error('stream closed before completion');
+};
+
 export const Generator = () => {
   const [category, setCategory] = useState<ProductCategory>('prompt');
   const [target, setTarget] = useState('');
   const [additionalNotes, setAdditionalNotes] = useState('');
   const [snackbar, setSnackbar] = useState({ open: false, message: '', severity: 'success' as 'success' | 'error' });
   const [selectedProductName, setSelectedProductName] = useState<string>('');
+  const [streamingContent, setStreamingContent] = useState('');
 
   const mutation = useMutation({
     mutationFn: generateProduct,
@@ -62,8 +108,23 @@ export const Generator = () => {
     },
   });
 
+  // 生成を待つ間だけ表示する（見つからなければ何もしない）
+  const instantMutation = useMutation({
+    mutationFn: generateInstant,
+    onSuccess: (data) => {
+      if (data.productNames.length > 0 && !mutation.data) {
+        setSelectedProductName(data.productNames[0]);
+      }
+    },
+  });
+  const instant = mutation.isPending ? instantMutation.data : undefined;
+  const result = instant ?? mutation.data;
+
   const contentMutation = useMutation({
-    mutationFn: generateContent,
+    mutationFn: (request: GenerateContentRequest) => {
+      setStreamingContent('');
+      return generateContent(request, setStreamingContent);
+    },
     onError: () => {
       setSnackbar({ open: true, message: 'コンテンツ生成に失敗しました。', severity: 'error' });
     },
@@ -72,12 +133,17 @@ export const Generator = () => {
     },
   });
 
-  const handleGenerate = () => {
+  const handleGenerate = (fresh = false) => {
     if (!target.trim()) {
       setSnackbar({ open: true, message: 'ターゲットを入力してください', severity: 'error' });
       return;
     }
-    mutation.mutate({ category, target, additionalNotes: additionalNotes || undefined });
+    const request = { category, target, additionalNotes: additionalNotes || undefined, fresh };
+    mutation.mutate(request);
+    instantMutation.reset();
+    if (!fresh && !additionalNotes) {
+      instantMutation.mutate(request);
+    }
   };
 
   const handleCopy = (text: string, label: string) => {
@@ -100,7 +166,7 @@ export const Generator = () => {
 
   const handleDownload = () => {
     if (!contentMutation.data) return;
-    const blob = new Blob([contentMutation.data.content], { type: 'text/markdown' });
+    const blob = new Blob([contentMutation.data.content], { type: 'text/plain;charset=utf-8' });
     const url = URL.createObjectURL(blob);
     const a = document.createElement('a');
     a.href = url;
@@ -193,7 +259,7 @@ ${mutation.data.description}
                 size="large"
                 fullWidth
                 startIcon={mutation.isPending ? <CircularProgress size={20} color="inherit" /> : <GenerateIcon />}
-                onClick={handleGenerate}
+                onClick={() => handleGenerate()}
                 disabled={mutation.isPending}
               >
                 {mutation.isPending ? '生成中...' : '生成する'}
@@ -208,7 +274,7 @@ ${mutation.data.description}
               <Box sx={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', mb: 2 }}>
                 <Typography variant="h6">生成結果</Typography>
                 {mutation.data && (
-                  <IconButton onClick={() => handleGenerate()} size="small" title="再生成">
+                  <IconButton onClick={() => handleGenerate(true)} size="small" title="再生成">
                     <RefreshIcon />
                   </IconButton>
                 )}
@@ -220,22 +286,28 @@ ${mutation.data.description}
                 </Box>
               )}
 
-              {mutation.isPending && (
+              {mutation.isPending && !instant && (
                 <Box sx={{ display: 'flex', alignItems: 'center', justifyContent: 'center', height: 300 }}>
                   <CircularProgress />
                 </Box>
               )}
 
-              {mutation.data && (
+              {instant && (
+                <Alert severity="info" icon={<CircularProgress size={18} />} sx={{ mb: 2 }}>
+                  「{instant.matchedTarget}」向けに作成済みの案を表示しています。新しい案を生成中...
+                </Alert>
+              )}
+
+              {result && (
                 <Box>
                   <Box sx={{ mb: 3 }}>
                     <Box sx={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}>
                       <Typography variant="subtitle2" color="text.secondary">商品名（3案）</Typography>
-                      <IconButton size="small" onClick={() => handleCopy(mutation.data.productNames.join('\n'), '商品名')}>
+                      <IconButton size="small" onClick={() => handleCopy(result.productNames.join('\n'), '商品名')}>
                         <CopyIcon fontSize="small" />
                       </IconButton>
                     </Box>
-                    {mutation.data.productNames.map((name, i) => (
+                    {result.productNames.map((name, i) => (
                       <Typography key={i} variant="body1" sx={{ fontWeight: 600, mb: 0.5 }}>
                         {i + 1}. {name}
                       </Typography>
@@ -245,31 +317,31 @@ ${mutation.data.description}
                   <Box sx={{ mb: 3 }}>
                     <Box sx={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}>
                       <Typography variant="subtitle2" color="text.secondary">商品説明文</Typography>
-                      <IconButton size="small" onClick={() => handleCopy(mutation.data.description, '説明文')}>
+                      <IconButton size="small" onClick={() => handleCopy(result.description, '説明文')}>
                         <CopyIcon fontSize="small" />
                       </IconButton>
                     </Box>
                     <Typography variant="body2" sx={{ whiteSpace: 'pre-wrap' }}>
-                      {mutation.data.description}
+                      {result.description}
                     </Typography>
                   </Box>
 
                   <Box sx={{ mb: 3 }}>
                     <Typography variant="subtitle2" color="text.secondary">推奨価格</Typography>
                     <Typography variant="h5" color="primary.main" sx={{ fontWeight: 700 }}>
-                      ¥{mutation.data.suggestedPrice.toLocaleString()}
+                      ¥{result.suggestedPrice.toLocaleString()}
                     </Typography>
                   </Box>
 
                   <Box>
                     <Box sx={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}>
                       <Typography variant="subtitle2" color="text.secondary">タグ</Typography>
-                      <IconButton size="small" onClick={() => handleCopy(mutation.data.tags.join(', '), 'タグ')}>
+                      <IconButton size="small" onClick={() => handleCopy(result.tags.join(', '), 'タグ')}>
                         <CopyIcon fontSize="small" />
                       </IconButton>
                     </Box>
                     <Box sx={{ display: 'flex', flexWrap: 'wrap', gap: 1, mt: 1 }}>
-                      {mutation.data.tags.map((tag) => (
+                      {result.tags.map((tag) => (
                         <Chip key={tag} label={tag} size="small" />
                       ))}
                     </Box>
@@ -286,7 +358,7 @@ ${mutation.data.description}
                         label="生成する商品名を選択"
                         onChange={(e) => setSelectedProductName(e.target.value)}
                       >
-                        {mutation.data.productNames.map((name, i) => (
+                        {result.productNames.map((name, i) => (
                           <MenuItem key={i} value={name}>{name}</MenuItem>
                         ))}
                       </Select>
@@ -296,7 +368,7 @@ ${mutation.data.description}
                       fullWidth
                       startIcon={contentMutation.isPending ? <CircularProgress size={20} color="inherit" /> : <ContentIcon />}
                       onClick={handleGenerateContent}
-                      disabled={contentMutation.isPending || !selectedProductName}
+                      disabled={contentMutation.isPending || mutation.isPending || !selectedProductName}
                       sx={{
                         background: 'linear-gradient(135deg, #667eea 0%, #764ba2 100%)',
                         '&:hover': { opacity: 0.9 },
@@ -308,13 +380,17 @@ ${mutation.data.description}
                   </Box>
 
                   {/* コンテンツプレビュー */}
-                  {contentMutation.data && (
+                  {(contentMutation.data || (contentMutation.isPending && streamingContent)) && (
                     <Box sx={{ mt: 3 }}>
                       <Box sx={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', mb: 2 }}>
                         <Typography variant="subtitle1" sx={{ color: '#667eea', fontWeight: 500 }}>
                           生成されたコンテンツ
                         </Typography>
-                        <Chip label="生成完了" size="small" color="success" />
+                        {contentMutation.isPending ? (
+                          <Chip label="生成中" size="small" color="info" />
+                        ) : (
+                          <Chip label="生成完了" size="small" color="success" />
+                        )}
                       </Box>
                       <Paper
                         variant="outlined"
@@ -329,7 +405,7 @@ ${mutation.data.description}
                           whiteSpace: 'pre-wrap',
                         }}
                       >
-                        {contentMutation.data.content}
+                        {contentMutation.isPending ? streamingContent : contentMutation.data?.content}
                       </Paper>
                       <Box sx={{ display: 'flex', gap: 1, mt: 2, flexWrap: 'wrap' }}>
                         <Button
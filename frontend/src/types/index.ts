@@ -3,6 +3,7 @@ export interface GenerateRequest {
   category: ProductCategory;
   target: string;
   additionalNotes?: string;
+  fresh?: boolean;  // trueならキャッシュを使わず新しく生成
 }
 
 // 商品生成レスポンス
@@ -13,6 +14,13 @@ export interface GenerateResponse {
   tags: string[];
 }
 
+// 事前生成したカタログから返す近い条件の商品案
+export interface InstantGenerateResponse extends GenerateResponse {
+  matchedTarget: string;  // 案を生成したときのターゲット
+  similarity: number;     // ターゲットの類似度（0〜1）
+  generatedAt: string;
+}
+
 // 商品カテゴリ
 export type ProductCategory =
   | 'prompt'        // プロンプト集
@@ -60,6 +68,37 @@ export interface DashboardSummary {
   monthlyGoal: number;
   salesByProduct: { productName: string; count: number; revenue: number }[];
   dailySales: { date: string; revenue: number }[];
+  asOf?: string;  // 集計時点（ISO 8601）
+}
+
+// /api/sales/stream の差分（変わった商品・日付の最新の値）
+export interface DashboardDelta {
+  month: string;
+  totalSales: number;
+  totalRevenue: number;
+  products: DashboardSummary['salesByProduct'];
+  days: DashboardSummary['dailySales'];
+  added: number;  // 新しい売上の件数
+  asOf: string;
+}
+
+// /api/sales/analytics（from〜toの集計と比較期間）
+export interface SalesPeriodSummary {
+  start: string;
+  end: string;  // この日を含む
+  totalSales: number;
+  totalRevenue: number;
+  series: { start: string; count: number; revenue: number }[];  // 売上の無い期間も0で含む
+  salesByProduct: DashboardSummary['salesByProduct'];
+}
+
+export interface SalesAnalytics {
+  granularity: 'day' | 'week' | 'month';
+  current: SalesPeriodSummary;
+  compareTo: 'previous_period' | 'previous_year' | null;
+  comparison: SalesPeriodSummary | null;
+  salesChange: number | null;  // 比較期間からの増減率
+  revenueChange: number | null;
 }
 
 // 設定
@@ -74,10 +113,12 @@ export interface GenerateContentRequest {
   productName: string;
   target: string;
   additionalNotes?: string;
+  mode?: 'single' | 'chapters';  // chapters: 見出し生成後に章ごとに並列生成
 }
 
 // コンテンツ生成レスポンス
 export interface GenerateContentResponse {
   content: string;
   filename: string;
+  usage?: Record<string, number>;  // cache_read_input_tokens などのトークン使用量
 }
@@ -0,0 +1,23 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api")
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+
+@pytest.fixture
+def load_handler(monkeypatch):
+    """api/ 配下のハンドラーモジュールを読み込む（ファイル名にハイフンを含むため）。環境変数は呼ぶ前に設定する"""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+
+    def load(name):
+        spec = importlib.util.spec_from_file_location(name.replace("-", "_"), os.path.join(API_DIR, f"{name}.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    return load
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+from _admission import AdmissionController, Overloaded
+
+
+def test_limits_concurrency_across_threads():
+    admission = AdmissionController("test", max_concurrency=2, max_queue=10, queue_timeout=5)
+    lock = threading.Lock()
+    running, peak = 0, 0
+
+    def one():
+        nonlocal running, peak
+        with admission.admit(1):
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+
+    threads = [threading.Thread(target=one) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak == 2
+    assert admission.to_dict() == {"inFlight": 0, "queued": 0, "rejected": 0}
+
+
+def test_rejects_after_the_queue_timeout():
+    admission = AdmissionController("test", max_concurrency=1, max_queue=10, queue_timeout=0.05)
+    started, release = threading.Event(), threading.Event()
+
+    def hold():
+        with admission.admit(1):
+            started.set()
+            release.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    started.wait()
+    try:
+        with pytest.raises(Overloaded) as rejected:
+            with admission.admit(1):
+                pass
+    finally:
+        release.set()
+        holder.join()
+    assert rejected.value.reason == "timeout"
+    assert admission.rejected == 1
+
+
+def test_rejects_at_once_when_tokens_cannot_refill_in_time():
+    admission = AdmissionController("test", max_concurrency=10, max_queue=10, queue_timeout=1, tokens_per_minute=600)
+    with admission.admit(600):
+        pass
+    started = time.monotonic()
+    with pytest.raises(Overloaded) as rejected:
+        with admission.admit(600):
+            pass
+    assert rejected.value.reason == "rate_limited"
+    assert time.monotonic() - started < 0.5
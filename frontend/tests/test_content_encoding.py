@@ -0,0 +1,46 @@
+import zlib
+
+import pytest
+
+import _content_encoding
+from _content_encoding import StreamCompressor, compress, negotiate
+
+
+@pytest.fixture
+def no_brotli(monkeypatch):
+    monkeypatch.setattr(_content_encoding, "brotli", None)
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip, deflate", "gzip"),
+        ("GZIP;q=0.5", "gzip"),
+        ("gzip;q=0", None),
+        ("*", "gzip"),
+        ("*, gzip;q=0", None),
+        ("identity", None),
+        ("gzip;q=abc", None),
+        (None, None),
+    ],
+)
+def test_negotiate_without_brotli(no_brotli, header, expected):
+    assert negotiate(header) == expected
+
+
+def test_gzip_round_trip(no_brotli):
+    body = "日本語の商品説明".encode("utf-8") * 200
+    compressed = compress(body, "gzip")
+    assert len(compressed) < len(body)
+    assert zlib.decompress(compressed, 31) == body
+    assert compress(body, None) is body
+
+
+def test_stream_compressor_flushes_each_chunk():
+    compressor = StreamCompressor("gzip")
+    decompressor = zlib.decompressobj(31)
+    # 書き出すたびにflushするので、それまでの分はすぐに展開できる
+    assert decompressor.decompress(compressor.compress("見出し\n".encode("utf-8"))) == "見出し\n".encode("utf-8")
+    assert decompressor.decompress(compressor.compress("本文".encode("utf-8"))) == "本文".encode("utf-8")
+    decompressor.decompress(compressor.finish())
+    assert decompressor.eof
@@ -0,0 +1,57 @@
+import pytest
+
+
+@pytest.fixture
+def module(load_handler):
+    return load_handler("generate-content")
+
+
+def test_system_block_is_the_same_for_every_product(module):
+    system_a, user_a = module.build_content_messages("ebook", "時短術", "会社員", "図解を多めに")
+    system_b, user_b = module.build_content_messages("ebook", "節約術", "主婦")
+
+    # 商品ごとに変わるとプロンプトキャッシュに当たらない
+    assert system_a == system_b
+    assert system_a[0]["cache_control"] == {"type": "ephemeral"}
+    assert "時短術" not in system_a[0]["text"]
+    for text in ("時短術", "会社員", "図解を多めに"):
+        assert text in user_a
+    assert "図解を多めに" not in user_b
+    assert len(user_a) < len(system_a[0]["text"]) // 10
+
+
+def test_categories_have_their_own_system_block(module):
+    assert module.build_content_messages("ebook", "時短術", "会社員")[0] != module.build_content_messages(
+        "notion", "時短術", "会社員"
+    )[0]
+
+
+def test_payload_sends_the_cached_system_block(module):
+    system, user = module.build_content_messages("ebook", "時短術", "会社員")
+    payload = module._content_payload(system, user, 100, stream=True)
+
+    assert payload["system"] is system
+    assert payload["messages"] == [{"role": "user", "content": user}]
+    assert payload["stream"] is True
+
+
+def test_prompts_are_read_on_first_use(module, monkeypatch, tmp_path):
+    # 読み込んだ時点ではプロンプトのファイルを開かない（コールドスタート短縮）
+    (tmp_path / "ebook.txt").write_text("電子書籍のプロンプト", encoding="utf-8")
+    monkeypatch.setattr(module, "PROMPTS_DIR", str(tmp_path))
+    assert module.content_system_prompt("ebook") == "電子書籍のプロンプト"
+
+    # 2回目以降は読み直さない
+    (tmp_path / "ebook.txt").unlink()
+    assert module.content_system_prompt("ebook") == "電子書籍のプロンプト"
+
+
+def test_every_category_has_a_prompt_file(module):
+    for category in module.CATEGORY_LABELS:
+        text = module.content_system_prompt(category)
+        # 商品の情報はuserメッセージで渡すので、テンプレートの差し込み口は残っていない
+        assert text and "{product_name}" not in text and "{target}" not in text
+
+
+def test_unknown_category_uses_the_prompt_collection(module):
+    assert module.content_system_prompt("unknown") == module.content_system_prompt("prompt")
@@ -0,0 +1,88 @@
+import http.client
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+TEXT = "■ はじめに\n\n" + "本文" * 120
+
+
+class FakeMessages(BaseHTTPRequestHandler):
+    """Messages APIのストリーミング応答を100文字ずつ返す"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        events = [("message_start", {"type": "message_start", "message": {"usage": {"input_tokens": 10}}})]
+        events += [
+            ("content_block_delta", {"type": "content_block_delta", "delta": {"type": "text_delta", "text": piece}})
+            for piece in (TEXT[i : i + 100] for i in range(0, len(TEXT), 100))
+        ]
+        events += [
+            (
+                "message_delta",
+                {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": 40}},
+            ),
+            ("message_stop", {"type": "message_stop"}),
+        ]
+        body = "".join(f"event: {event}\ndata: {json.dumps(data)}\n\n" for event, data in events).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(handler_class) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def module(load_handler, monkeypatch):
+    llm = serve(FakeMessages)
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", "http://%s:%d" % llm.server_address[:2])
+    yield load_handler("generate-content")
+    llm.shutdown()
+    llm.server_close()
+
+
+def test_stream_yields_deltas_then_done(module):
+    events = list(module.stream_content_with_claude("ebook", "時短術", "会社員"))
+
+    assert {event for event, _ in events[:-1]} == {"delta"}
+    # 100文字ずつ届いた順に連結すると本文になる
+    assert len(events) > 2 and "".join(data["text"] for _, data in events[:-1]) == TEXT
+    event, data = events[-1]
+    assert event == "done"
+    assert (data["filename"], data["stopReason"], data["usage"]["output_tokens"]) == ("時短術.txt", "end_turn", 40)
+
+
+def test_stream_reports_missing_api_key(module, monkeypatch):
+    monkeypatch.delenv("ANTHROPIC_API_KEY")
+    assert [event for event, _ in module.stream_content_with_claude("ebook", "時短術", "会社員")] == ["error"]
+
+
+def test_handler_sends_server_sent_events(module):
+    server = serve(module.handler)
+    try:
+        conn = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+        body = json.dumps({"productName": "時短術", "target": "会社員", "category": "ebook", "stream": True})
+        conn.request("POST", "/api/generate-content", body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        assert response.status == 200
+        assert response.getheader("Content-Type").startswith("text/event-stream")
+        events = [
+            (block.split("\n")[0].removeprefix("event: "), json.loads(block.split("\n")[1].removeprefix("data: ")))
+            for block in response.read().decode("utf-8").strip().split("\n\n")
+        ]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert events[-1][0] == "done"
+    assert "".join(data["text"] for event, data in events if event == "delta") == TEXT
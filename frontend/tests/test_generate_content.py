@@ -0,0 +1,151 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from _admission import Overloaded
+
+OUTLINE = ["■ 第1章", "■ 第2章", "■ 第3章"]
+
+
+class FakeChapters(BaseHTTPRequestHandler):
+    """見出しの依頼には見出しを、章の依頼には後ろの章ほど早く章の本文を返す。失敗させる章には500を返す"""
+
+    failing = ""
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = json.dumps(payload, ensure_ascii=False)
+        chapter = re.search(r"今回は「(.+?)」の部分", prompt)
+        if chapter is None:
+            text = json.dumps(OUTLINE, ensure_ascii=False)
+        elif chapter.group(1) == self.failing:
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        else:
+            time.sleep(0.05 * (len(OUTLINE) - OUTLINE.index(chapter.group(1))))
+            text = f"{chapter.group(1)}\n\n本文"
+        body = json.dumps({"content": [{"type": "text", "text": text}], "usage": {"output_tokens": 1}}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def module(load_handler, monkeypatch):
+    llm = ThreadingHTTPServer(("127.0.0.1", 0), FakeChapters)
+    threading.Thread(target=llm.serve_forever, daemon=True).start()
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", "http://%s:%d" % llm.server_address[:2])
+    module = load_handler("generate-content")
+    monkeypatch.setattr(module, "CHAPTER_MAX_RETRIES", 0)
+    yield module
+    llm.shutdown()
+    llm.server_close()
+
+
+def test_chapters_are_joined_in_outline_order(module):
+    result = module.generate_content_with_claude("ebook", "時短術", "会社員", mode="chapters")
+    # 後ろの章から先に届いても、見出しの順に連結する
+    assert result["content"] == "\n\n".join(f"{title}\n\n本文" for title in OUTLINE)
+    assert result["chapters"] == OUTLINE
+    assert "failedChapters" not in result
+
+
+def test_failed_chapter_is_marked_in_place(module, monkeypatch):
+    monkeypatch.setattr(FakeChapters, "failing", "■ 第2章")
+    result = module.generate_content_with_claude("ebook", "時短術", "会社員", mode="chapters")
+    assert result["failedChapters"] == ["■ 第2章"]
+    parts = result["content"].split("\n\n")
+    assert parts[:2] == ["■ 第1章", "本文"] and parts[-2:] == ["■ 第3章", "本文"]
+    assert "[ERROR]" in parts[3]
+
+
+def test_chapters_mode_returns_overloaded_instead_of_falling_back(load_handler, monkeypatch):
+    module = load_handler("generate-content")
+    calls = []
+
+    def overloaded(api_key, system, user, max_tokens):
+        calls.append(max_tokens)
+        raise Overloaded("claude", "queue_full", 3)
+
+    monkeypatch.setattr(module, "_claude_message", overloaded)
+
+    with pytest.raises(Overloaded):
+        module._generate_content("test", "ebook", "商品", "初心者", "", "chapters")
+    # 見出しの1回だけで、再試行も1回で生成する経路への切り替えもしない
+    assert calls == [1024]
+
+
+def test_chapters_mode_falls_back_when_outline_is_broken(load_handler, monkeypatch):
+    module = load_handler("generate-content")
+    calls = []
+
+    def message(api_key, system, user, max_tokens):
+        calls.append(max_tokens)
+        return ("見出しではない出力" if max_tokens == 1024 else "本文"), {}
+
+    monkeypatch.setattr(module, "_claude_message", message)
+    monkeypatch.setattr(module, "CHAPTER_MAX_RETRIES", 0)
+
+    result = module._generate_content("test", "ebook", "商品", "初心者", "", "chapters")
+    assert result["content"] == "本文"
+    assert calls == [1024, 16384]
+
+
+def test_overloaded_chapter_is_not_written_as_a_failed_chapter(load_handler, monkeypatch):
+    module = load_handler("generate-content")
+
+    def message(api_key, system, user, max_tokens):
+        if max_tokens == 1024:
+            return '["第1章", "第2章"]', {}
+        raise Overloaded("claude", "timeout", 5)
+
+    monkeypatch.setattr(module, "_claude_message", message)
+
+    with pytest.raises(Overloaded):
+        module.generate_content_in_chapters("test", "ebook", "商品", "初心者")
+
+
+def test_content_job_gives_up_when_overloaded_past_the_deadline(load_handler, monkeypatch):
+    module = load_handler("generate-content")
+    monkeypatch.setattr(module, "JOB_DEADLINE_SECONDS", 10)
+    clock = [0.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(module.time, "sleep", lambda seconds: clock.__setitem__(0, clock[0] + seconds))
+    attempts = []
+
+    def overloaded(**params):
+        attempts.append(clock[0])
+        raise Overloaded("claude", "queue_full", 4)
+
+    monkeypatch.setattr(module, "generate_content_with_claude", overloaded)
+
+    result = module._run_content_job({"category": "ebook", "product_name": "商品", "target": "初心者"})
+    # 0秒・4秒・8秒に試し、次の12秒は期限（10秒）を過ぎるので失敗にする（ジョブはfailedになる）
+    assert attempts == [0.0, 4.0, 8.0]
+    assert result["error"] == "OVERLOADED"
+
+
+def test_content_job_retries_until_admitted(load_handler, monkeypatch):
+    module = load_handler("generate-content")
+    monkeypatch.setattr(module.time, "sleep", lambda seconds: None)
+    responses = [Overloaded("claude", "queue_full", 1), {"content": "本文", "filename": "a.txt"}]
+
+    def generate(**params):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(module, "generate_content_with_claude", generate)
+    assert module._run_content_job({})["content"] == "本文"
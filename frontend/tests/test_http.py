@@ -0,0 +1,80 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from _http import ConnectionPool, HTTPStatusError, get_pool
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """Keep-Aliveで応答する。/closeは応答後に黙って接続を切る（アイドル中に切られた接続の再現）"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status = 500 if self.path.endswith("/error") else 200
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.path.endswith("/close"):
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://%s:%d/v1" % server.server_address[:2]
+    server.shutdown()
+    server.server_close()
+
+
+def test_sequential_requests_reuse_one_connection(server):
+    pool = ConnectionPool(server)
+    for i in range(5):
+        assert pool.request("POST", "/messages", body=str(i).encode()) == (200, str(i).encode())
+    assert pool.connects == 1
+
+
+def test_error_responses_are_raised_and_keep_the_connection(server):
+    pool = ConnectionPool(server)
+    with pytest.raises(HTTPStatusError) as raised:
+        pool.request("POST", "/error", body=b"overloaded")
+    assert (raised.value.code, raised.value.body) == (500, b"overloaded")
+    pool.request("POST", "/messages", body=b"ok")
+    assert pool.connects == 1
+
+
+def test_connection_closed_while_idle_is_retried_once(server):
+    pool = ConnectionPool(server)
+    pool.request("POST", "/close", body=b"first")
+    # 再利用した接続は切られているので、新しい接続でやり直す
+    assert pool.request("POST", "/messages", body=b"second") == (200, b"second")
+    assert pool.connects == 2
+
+
+def test_partly_read_stream_is_not_reused(server):
+    pool = ConnectionPool(server)
+    with pool.stream("POST", "/messages", body=b"0123456789") as response:
+        assert response.read(3) == b"012"
+    pool.request("POST", "/messages", body=b"ok")
+    assert pool.connects == 2
+
+
+def test_idle_connections_are_capped(server):
+    pool = ConnectionPool(server, max_idle=1)
+    with pool.stream("POST", "/messages", body=b"a") as first, pool.stream("POST", "/messages", body=b"b") as second:
+        first.read(), second.read()
+    assert len(pool._idle) == 1
+    pool.close()
+    assert pool._idle == []
+
+
+def test_pools_are_shared_per_base_url():
+    assert get_pool("https://api.anthropic.com") is get_pool("https://api.anthropic.com")
+    assert get_pool("https://api.anthropic.com") is not get_pool("https://example.com")
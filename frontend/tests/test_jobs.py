@@ -0,0 +1,68 @@
+import json
+import sqlite3
+import threading
+import time
+
+from _jobs import JobQueue
+
+
+def test_wait_returns_when_the_job_completes(tmp_path):
+    release = threading.Event()
+
+    def runner(params):
+        release.wait(5)
+        return {"content": params["productName"]}
+
+    jobs = JobQueue(str(tmp_path / "jobs.db"), runner)
+    job_id = jobs.submit({"productName": "時短術"})
+
+    assert jobs.get(job_id)["status"] in ("queued", "running")
+    threading.Timer(0.05, release.set).start()
+    job = jobs.get(job_id, wait=5)
+    assert (job["status"], job["result"]) == ("completed", {"content": "時短術"})
+
+
+def test_wait_gives_up_after_the_timeout(tmp_path):
+    release = threading.Event()
+    jobs = JobQueue(str(tmp_path / "jobs.db"), lambda params: release.wait(5) and {})
+    job_id = jobs.submit({})
+
+    started = time.monotonic()
+    assert jobs.get(job_id, wait=0.1)["status"] in ("queued", "running")
+    assert time.monotonic() - started < 1
+    release.set()
+
+
+def test_error_results_and_exceptions_fail_the_job(tmp_path):
+    def runner(params):
+        if params["raise"]:
+            raise RuntimeError("boom")
+        return {"content": "[ERROR] 混雑", "error": "OVERLOADED"}
+
+    jobs = JobQueue(str(tmp_path / "jobs.db"), runner)
+    returned, raised = jobs.submit({"raise": False}), jobs.submit({"raise": True})
+
+    assert jobs.get(returned, wait=5)["status"] == "failed"
+    job = jobs.get(raised, wait=5)
+    assert (job["status"], job["result"]) == ("failed", {"error": "boom"})
+
+
+def test_unfinished_jobs_run_again_after_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    now = time.time()
+    with sqlite3.connect(path) as conn:
+        JobQueue(path, lambda params: {})
+        # 前のプロセスが実行途中で止まったジョブと、まだ始まっていなかったジョブ
+        for job_id, status in (("running-job", "running"), ("queued-job", "queued"), ("done-job", "completed")):
+            conn.execute(
+                "INSERT INTO jobs (id, status, params, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, status, json.dumps({"id": job_id}), now, now),
+            )
+    ran = []
+
+    jobs = JobQueue(path, lambda params: ran.append(params["id"]) or {"content": params["id"]})
+    jobs.start()
+
+    assert jobs.get("running-job", wait=5)["status"] == "completed"
+    assert jobs.get("queued-job", wait=5)["status"] == "completed"
+    assert sorted(ran) == ["queued-job", "running-job"]
@@ -0,0 +1,48 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from _singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return len(calls)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        leader = executor.submit(flight.do, "key", fetch)
+        started.wait()
+        followers = [executor.submit(flight.do, "key", fetch) for _ in range(3)]
+        results = [leader.result(), *(future.result() for future in followers)]
+
+    assert results == [1, 1, 1, 1]
+    assert (flight.calls, flight.coalesced) == (1, 3)
+
+
+def test_error_reaches_every_waiter_and_is_not_kept():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.05)
+        raise RuntimeError("upstream")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(flight.do, "key", fail)
+        started.wait()
+        follower = executor.submit(flight.do, "key", fail)
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError, match="upstream"):
+                future.result()
+
+    assert flight.do("key", lambda: "ok") == "ok"